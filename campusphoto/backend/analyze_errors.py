@@ -3,14 +3,15 @@
 分析错误分类：区分AI误判 vs 数据集污染
 基于用户提供的样本统计，估算各类别的真实错误率
 """
-import json
+import sys
 from pathlib import Path
-from collections import defaultdict, Counter
-import re
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
 ERROR_JSON = BACKEND_DIR / "error_cases.json"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.error_case_store import open_store  # noqa: E402
 
 # 用户提供的样本统计（AI误判 vs 数据集错误）
 SAMPLE_STATS = {
@@ -23,43 +24,21 @@ SAMPLE_STATS = {
     "人像->街景": {"ai_error": 48, "dataset_error": 50, "total": 98},
 }
 
-def load_error_cases():
-    """加载错误案例数据"""
-    if not ERROR_JSON.exists():
+def load_error_store():
+    """打开错误案例存储（error_cases.json 变化时自动重新导入）"""
+    store = open_store(ERROR_JSON)
+    if store is None:
         print(f"❌ 文件不存在: {ERROR_JSON}")
-        return []
-    
-    with open(ERROR_JSON, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    return data if isinstance(data, list) else []
+    return store
 
 def analyze_by_category():
-    """按类别分析错误分布"""
-    cases = load_error_cases()
-    if not cases:
+    """按类别统计错误数 {"期望->预测": 数量}"""
+    store = load_error_store()
+    if store is None:
         return {}
     
-    category_stats = defaultdict(list)
-    
-    for case in cases:
-        if not isinstance(case, dict):
-            continue
-            
-        expected = case.get("expected_theme", "")
-        predicted = case.get("predicted_theme", "")
-        file_path = case.get("file_path", "")
-        
-        if expected and predicted and expected != predicted:
-            key = f"{expected}->{predicted}"
-            category_stats[key].append({
-                "file_path": file_path,
-                "expected": expected,
-                "predicted": predicted,
-                "confidence": case.get("confidence", 0)
-            })
-    
-    return dict(category_stats)
+    with store:
+        return store.confusion_counts()
 
 def calculate_error_rates():
     """基于样本统计计算各类别的错误率"""
@@ -73,8 +52,7 @@ def calculate_error_rates():
     total_dataset_errors = 0
     total_cases = 0
     
-    for category, cases in category_stats.items():
-        case_count = len(cases)
+    for category, case_count in category_stats.items():
         
         if category in SAMPLE_STATS:
             sample = SAMPLE_STATS[category]
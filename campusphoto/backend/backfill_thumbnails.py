@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+为已有作品重新生成多尺寸缩略图
+
+早期版本的缩略图只是原图的拷贝，这里按 image_processing.thumbnail_sizes
+重新生成 JPEG/WebP 派生图，并把 thumbnail_url 指向 300px 的 JPEG 版本。
+
+用法:
+    python backfill_thumbnails.py              # 只处理缺失或不合规的缩略图
+    python backfill_thumbnails.py --force      # 全部重新生成
+    python backfill_thumbnails.py --dry-run    # 只统计，不写文件
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models.database import SessionLocal
+from models.models import Photo
+from utils.analysis_queue import local_path_from_url
+from utils.thumbnails import generate_derivatives, derivative_name, get_thumbnail_sizes, is_derivative_current
+
+THUMBNAIL_DIR = "static/thumbnails"
+DEFAULT_THUMBNAIL_SIZE = 300
+
+
+def needs_backfill(stem: str, sizes, formats) -> bool:
+    """检查某张原图的派生图是否需要重新生成"""
+    for size in sizes:
+        for fmt in formats:
+            if not is_derivative_current(os.path.join(THUMBNAIL_DIR, derivative_name(stem, size, fmt)), size):
+                return True
+    return False
+
+
+def process_photo(photo_id: int, image_url: str, sizes, formats, force: bool, dry_run: bool):
+    """处理单张作品，返回 (作品ID, 状态, 新缩略图URL)"""
+    image_path = local_path_from_url(image_url)
+    if not os.path.exists(image_path):
+        return photo_id, "missing", None
+
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    thumbnail_url = f"/static/thumbnails/{derivative_name(stem, DEFAULT_THUMBNAIL_SIZE)}"
+    if not force and not needs_backfill(stem, sizes, formats):
+        return photo_id, "skipped", thumbnail_url
+    if dry_run:
+        return photo_id, "pending", thumbnail_url
+
+    try:
+        generate_derivatives(image_path, THUMBNAIL_DIR, sizes=sizes, formats=formats, stem=stem)
+        return photo_id, "generated", thumbnail_url
+    except Exception as e:
+        print(f"   ⚠️ 作品 {photo_id} 生成失败: {e}")
+        return photo_id, "failed", None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为已有作品回填多尺寸缩略图")
+    parser.add_argument("--force", action="store_true", help="忽略已有缩略图，全部重新生成")
+    parser.add_argument("--dry-run", action="store_true", help="只统计需要处理的作品")
+    parser.add_argument("--workers", type=int, default=2, help="并发线程数（每个线程同时只解码一张图）")
+    parser.add_argument("--limit", type=int, default=None, help="最多处理的作品数")
+    parser.add_argument("--no-webp", action="store_true", help="不生成 WebP 版本")
+    args = parser.parse_args()
+
+    sizes = sorted(set(get_thumbnail_sizes()) | {DEFAULT_THUMBNAIL_SIZE})
+    formats = ("jpeg",) if args.no_webp else ("jpeg", "webp")
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+
+    db = SessionLocal()
+    try:
+        query = db.query(Photo.id, Photo.image_url, Photo.thumbnail_url).order_by(Photo.id)
+        if args.limit:
+            query = query.limit(args.limit)
+        photos = query.all()
+        print(f"📊 共 {len(photos)} 张作品，尺寸 {sizes}，格式 {list(formats)}")
+
+        counts = {}
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            futures = [
+                executor.submit(process_photo, p.id, p.image_url, sizes, formats, args.force, args.dry_run)
+                for p in photos
+            ]
+            current_urls = {p.id: p.thumbnail_url for p in photos}
+            for done, future in enumerate(futures, 1):
+                photo_id, state, thumbnail_url = future.result()
+                counts[state] = counts.get(state, 0) + 1
+                if not args.dry_run and state in ("generated", "skipped") and thumbnail_url != current_urls[photo_id]:
+                    db.query(Photo).filter(Photo.id == photo_id).update(
+                        {Photo.thumbnail_url: thumbnail_url}, synchronize_session=False
+                    )
+                if done % 100 == 0:
+                    if not args.dry_run:
+                        db.commit()
+                    print(f"进度: {done}/{len(photos)}  用时 {time.time() - start:.1f}s")
+        if not args.dry_run:
+            db.commit()
+
+        print(f"✅ 完成: {counts}  用时 {time.time() - start:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
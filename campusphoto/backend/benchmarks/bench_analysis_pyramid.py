@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+分析金字塔基准测试
+
+对比全分辨率与按 analysis_max_edge 缩小后的图像分析：
+耗时、峰值内存（tracemalloc，含numpy/OpenCV数组），以及主题、主色调、质量分的偏差。
+
+用法:
+    python benchmarks/bench_analysis_pyramid.py                      # 使用 ai/*.jpg
+    python benchmarks/bench_analysis_pyramid.py --upscale 6000       # 放大到约24MP模拟手机原图
+    python benchmarks/bench_analysis_pyramid.py img1.jpg img2.jpg --repeat 3
+"""
+import argparse
+import glob
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+AI_DIR = REPO_ROOT / "campusphoto" / "ai"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.image_analyzer import image_analyzer  # noqa: E402
+from utils.image_pipeline import DecodedImage, get_analysis_max_edges  # noqa: E402
+
+
+def load_image(path: str, upscale: int) -> DecodedImage:
+    """解码图像，需要时放大到指定长边以模拟高分辨率原图"""
+    image = DecodedImage.open(path)
+    if upscale and max(image.width, image.height) < upscale:
+        scale = upscale / max(image.width, image.height)
+        size = (round(image.width * scale), round(image.height * scale))
+        image = DecodedImage(cv2.resize(image.rgb, size, interpolation=cv2.INTER_CUBIC), path=path)
+    return image
+
+
+def run_once(image: DecodedImage, max_edges):
+    """运行一次分析，返回 (结果, 耗时秒, 峰值内存MB)"""
+    # 每次使用全新对象，避免金字塔和灰度图缓存影响测量
+    fresh = DecodedImage(image.rgb, path=image.path)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = image_analyzer.analyze_decoded(fresh, max_edges=max_edges)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def color_drift(full, reduced) -> float:
+    """主色调（第一位）RGB欧氏距离"""
+    if not full or not reduced or "rgb" not in full[0] or "rgb" not in reduced[0]:
+        return float("nan")
+    return float(np.linalg.norm(np.array(full[0]["rgb"]) - np.array(reduced[0]["rgb"])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析金字塔基准测试")
+    parser.add_argument("images", nargs="*", help="测试图像，默认使用 ai/*.jpg")
+    parser.add_argument("--upscale", type=int, default=0, help="将图像放大到该长边（像素）")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图重复次数，取最小耗时")
+    args = parser.parse_args()
+
+    paths = args.images or sorted(glob.glob(str(AI_DIR / "*.jpg")))
+    if not paths:
+        print("没有找到测试图像")
+        return
+
+    full_edges = {family: 0 for family in get_analysis_max_edges()}
+    reduced_edges = get_analysis_max_edges()
+    print(f"长边上限: {reduced_edges}")
+    print(f"{'图像':<24}{'尺寸':>12}{'全分辨率(s)':>12}{'金字塔(s)':>12}{'内存全(MB)':>12}{'内存金字塔(MB)':>14}"
+          f"{'主题一致':>8}{'主色一致':>8}{'主色ΔRGB':>10}{'质量Δ':>8}")
+
+    totals = {"full": 0.0, "reduced": 0.0, "same_theme": 0, "same_color": 0}
+    for path in paths:
+        image = load_image(path, args.upscale)
+        full_runs = [run_once(image, full_edges) for _ in range(args.repeat)]
+        reduced_runs = [run_once(image, reduced_edges) for _ in range(args.repeat)]
+        full, full_time, full_mem = min(full_runs, key=lambda r: r[1])
+        reduced, reduced_time, reduced_mem = min(reduced_runs, key=lambda r: r[1])
+
+        same_theme = full["theme"] == reduced["theme"]
+        full_colors, reduced_colors = full["dominant_colors"], reduced["dominant_colors"]
+        same_color = bool(full_colors and reduced_colors and full_colors[0]["name"] == reduced_colors[0]["name"])
+        quality_delta = abs(full["quality_score"] - reduced["quality_score"])
+
+        totals["full"] += full_time
+        totals["reduced"] += reduced_time
+        totals["same_theme"] += same_theme
+        totals["same_color"] += same_color
+
+        print(f"{Path(path).name:<24}{f'{image.width}x{image.height}':>12}{full_time:>12.2f}{reduced_time:>12.2f}"
+              f"{full_mem:>12.1f}{reduced_mem:>14.1f}{'是' if same_theme else '否':>8}{'是' if same_color else '否':>8}"
+              f"{color_drift(full_colors, reduced_colors):>10.1f}{quality_delta:>8.3f}")
+
+    n = len(paths)
+    speedup = totals["full"] / totals["reduced"] if totals["reduced"] else float("nan")
+    print(f"\n总耗时: 全分辨率 {totals['full']:.2f}s, 金字塔 {totals['reduced']:.2f}s, 加速 {speedup:.1f}x")
+    print(f"主题一致 {totals['same_theme']}/{n}, 主色一致 {totals['same_color']}/{n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+调色板基准测试
+
+对比原先的两次全像素 KMeans（n_init=10，外加 np.unique 估计颜色数）
+与 utils.color_palette 的单次量化直方图 + MiniBatchKMeans：CPU 时间及主色调差异。
+
+用法:
+    python benchmarks/bench_color_palette.py                  # ai/*.jpg，长边缩到 256（与默认配置一致）
+    python benchmarks/bench_color_palette.py --max-edge 0     # 原始分辨率（旧实现非常慢）
+"""
+import argparse
+import glob
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+AI_DIR = REPO_ROOT / "campusphoto" / "ai"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.color_palette import compute_palette  # noqa: E402
+from utils.image_analyzer import image_analyzer  # noqa: E402
+from utils.image_pipeline import DecodedImage  # noqa: E402
+
+
+def legacy_colors(rgb: np.ndarray):
+    """原 _calculate_color_features + _extract_dominant_colors_ai 的计算量"""
+    pixels = rgb.reshape(-1, 3)
+    unique_colors = len(np.unique(pixels.view(np.dtype((np.void, pixels.dtype.itemsize * pixels.shape[1])))))
+    n_clusters = min(5, max(2, unique_colors))
+    KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit(pixels)
+
+    kmeans = KMeans(n_clusters=5, random_state=42, n_init=10).fit(pixels)
+    percentages = np.bincount(kmeans.labels_) / len(kmeans.labels_)
+    order = np.argsort(percentages)[::-1]
+    return kmeans.cluster_centers_[order], percentages[order]
+
+
+def cpu_timed(func, *args, **kwargs):
+    start = time.process_time()
+    result = func(*args, **kwargs)
+    return result, time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="调色板基准测试")
+    parser.add_argument("images", nargs="*", help="测试图像，默认使用 ai/*.jpg")
+    parser.add_argument("--max-edge", type=int, default=256, help="计算前将长边缩小到该值，0 为原始分辨率")
+    args = parser.parse_args()
+
+    paths = args.images or sorted(glob.glob(str(AI_DIR / "*.jpg")))
+    print(f"{'图像':<24}{'尺寸':>12}{'旧CPU(s)':>10}{'新CPU(s)':>10}{'加速':>8}{'主色一致':>8}{'主色ΔRGB':>10}{'主色占比Δ':>10}")
+
+    legacy_total = palette_total = 0.0
+    for path in paths:
+        image = DecodedImage.open(path).level(args.max_edge)
+        (legacy_centers, legacy_pct), legacy_time = cpu_timed(legacy_colors, image.rgb)
+        palette, palette_time = cpu_timed(compute_palette, image.rgb)
+        legacy_total += legacy_time
+        palette_total += palette_time
+
+        same_name = image_analyzer._rgb_to_color_name(legacy_centers[0]) == image_analyzer._rgb_to_color_name(palette.colors[0])
+        delta_rgb = float(np.linalg.norm(legacy_centers[0] - palette.colors[0]))
+        delta_pct = abs(float(legacy_pct[0]) - float(palette.percentages[0]))
+        speedup = legacy_time / palette_time if palette_time > 0 else float("inf")
+        print(f"{Path(path).name:<24}{f'{image.width}x{image.height}':>12}{legacy_time:>10.3f}{palette_time:>10.3f}"
+              f"{speedup:>7.0f}x{'是' if same_name else '否':>8}{delta_rgb:>10.1f}{delta_pct:>10.3f}")
+
+    if palette_total > 0:
+        print(f"\n总CPU时间: 旧 {legacy_total:.2f}s, 新 {palette_total:.2f}s, 加速 {legacy_total / palette_total:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
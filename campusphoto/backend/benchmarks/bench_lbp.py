@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+LBP 微基准测试
+
+将 utils.texture_features.calculate_lbp 与原先的逐像素实现逐元素比对，
+并测量两者耗时。逐像素实现很慢，默认只在缩小到 --reference-edge 的图像上运行。
+
+用法:
+    python benchmarks/bench_lbp.py                       # 随机图 + ai/*.jpg
+    python benchmarks/bench_lbp.py --reference-edge 512
+"""
+import argparse
+import glob
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+AI_DIR = REPO_ROOT / "campusphoto" / "ai"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.texture_features import calculate_lbp, lbp_histogram  # noqa: E402
+
+
+def reference_lbp(image: np.ndarray) -> np.ndarray:
+    """原 ImageAnalyzer._calculate_lbp 的逐像素实现"""
+    rows, cols = image.shape
+    lbp = np.zeros_like(image)
+
+    for i in range(1, rows - 1):
+        for j in range(1, cols - 1):
+            center = image[i, j]
+            binary_string = ""
+
+            # 8邻域
+            neighbors = [
+                image[i-1, j-1], image[i-1, j], image[i-1, j+1],
+                image[i, j+1], image[i+1, j+1], image[i+1, j],
+                image[i+1, j-1], image[i, j-1]
+            ]
+
+            for neighbor in neighbors:
+                binary_string += "1" if neighbor >= center else "0"
+
+            lbp[i, j] = int(binary_string, 2)
+
+    return lbp
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def resize_long_edge(gray: np.ndarray, max_edge: int) -> np.ndarray:
+    scale = max_edge / max(gray.shape)
+    if scale >= 1:
+        return gray
+    size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LBP 微基准测试")
+    parser.add_argument("images", nargs="*", help="测试图像，默认使用 ai/*.jpg")
+    parser.add_argument("--reference-edge", type=int, default=256, help="逐像素实现使用的长边上限")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    cases = [
+        ("random 1x1", rng.integers(0, 256, (1, 1), dtype=np.uint8)),
+        ("random 2x9", rng.integers(0, 256, (2, 9), dtype=np.uint8)),
+        ("random 3x3", rng.integers(0, 256, (3, 3), dtype=np.uint8)),
+        ("random 64x97", rng.integers(0, 256, (64, 97), dtype=np.uint8)),
+        ("flat 50x50", np.full((50, 50), 128, dtype=np.uint8)),
+        ("low range 80x60", rng.integers(100, 140, (80, 60), dtype=np.uint8)),
+    ]
+    for path in args.images or sorted(glob.glob(str(AI_DIR / "*.jpg"))):
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is not None:
+            cases.append((Path(path).name, gray))
+
+    all_match = True
+    print(f"{'用例':<22}{'尺寸':>12}{'一致':>6}{'逐像素(s)':>12}{'向量化(s)':>12}{'加速':>10}{'全尺寸向量化(s)':>22}")
+    for name, gray in cases:
+        small = resize_long_edge(gray, args.reference_edge)
+        expected, ref_time = timed(reference_lbp, small)
+        actual, vec_time = timed(calculate_lbp, small)
+        match = (
+            actual.dtype == expected.dtype
+            and np.array_equal(actual, expected)
+            and np.array_equal(lbp_histogram(actual), np.histogram(expected, bins=256)[0])
+        )
+        all_match &= match
+
+        _, full_time = timed(calculate_lbp, gray)
+        speedup = ref_time / vec_time if vec_time > 0 else float("inf")
+        print(f"{name:<22}{f'{small.shape[1]}x{small.shape[0]}':>12}{'是' if match else '否':>6}"
+              f"{ref_time:>12.4f}{vec_time:>12.5f}{speedup:>9.0f}x"
+              f"{f'{full_time:.4f} ({gray.shape[1]}x{gray.shape[0]})':>22}")
+
+    print("\n全部一致" if all_match else "\n存在不一致的结果")
+    sys.exit(0 if all_match else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+相似检索索引基准测试
+
+用聚簇分布的随机单位向量（维度与 image_embedding 一致）构建索引，
+比较全量计算与 IVF 在不同 nprobe 下的查询延迟和 recall@k（以全量计算结果为准）。
+
+用法:
+    python benchmarks/bench_similarity_index.py
+    python benchmarks/bench_similarity_index.py --size 100000 --nprobe 4 8 16
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.image_embedding import EMBEDDING_DIM  # noqa: E402
+from utils.similarity_index import VectorIndex  # noqa: E402
+
+
+def clustered_vectors(size: int, clusters: int, noise: float, rng) -> np.ndarray:
+    centers = rng.normal(size=(clusters, EMBEDDING_DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size)]
+    vectors += noise * rng.normal(size=vectors.shape).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float16)
+
+
+def percentiles(times):
+    ms = np.array(times) * 1000
+    return f"p50 {np.median(ms):7.2f} ms  p99 {np.percentile(ms, 99):7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相似检索索引基准测试")
+    parser.add_argument("--size", type=int, default=50_000, help="向量数")
+    parser.add_argument("--clusters", type=int, default=200, help="生成数据的簇数")
+    parser.add_argument("--noise", type=float, default=0.6, help="簇内噪声")
+    parser.add_argument("--queries", type=int, default=200, help="查询次数")
+    parser.add_argument("--k", type=int, default=12, help="每次返回的结果数")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(args.size, args.clusters, args.noise, rng)
+    index = VectorIndex()
+    for item_id, vector in enumerate(vectors):
+        index.add(item_id, vector)
+    print(f"向量数 {args.size}，维度 {EMBEDDING_DIM}，float16 占用 {vectors.nbytes / 1e6:.1f} MB")
+
+    queries = rng.integers(0, args.size, args.queries)
+
+    # 全量计算，同时作为 recall 的参照
+    truth, times = [], []
+    for q in queries:
+        start = time.perf_counter()
+        result = index.search(vectors[q], args.k, nprobe=1, exclude=int(q))
+        times.append(time.perf_counter() - start)
+        truth.append({item_id for item_id, _ in result})
+    print(f"全量计算            {percentiles(times)}")
+
+    start = time.perf_counter()
+    index.train()
+    print(f"建簇 {len(index.centroids)} 个，用时 {time.perf_counter() - start:.2f}s")
+
+    for nprobe in args.nprobe:
+        times, recall = [], 0.0
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            result = index.search(vectors[q], args.k, nprobe=nprobe, exclude=int(q))
+            times.append(time.perf_counter() - start)
+            recall += len(expected & {item_id for item_id, _ in result}) / args.k
+        print(f"IVF nprobe={nprobe:<3}      {percentiles(times)}  recall@{args.k} {recall / len(queries):.3f}")
+
+
+if __name__ == "__main__":
+    main()
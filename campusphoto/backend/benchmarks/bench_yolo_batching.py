@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+YOLO 动态批处理基准测试（CPU）
+
+用若干线程模拟并发请求，对比逐张推理与不同 max_batch_size / max_wait_ms 组合下的
+吞吐量（张/秒）和单次请求延迟（p50/p95）。
+
+用法:
+    python benchmarks/bench_yolo_batching.py                       # 使用已加载的 YOLO 模型
+    python benchmarks/bench_yolo_batching.py --concurrency 1 4 8 16 --requests 64
+    python benchmarks/bench_yolo_batching.py --simulate            # 无模型时用固定开销模拟
+"""
+import argparse
+import glob
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+AI_DIR = REPO_ROOT / "campusphoto" / "ai"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.dynamic_batcher import DynamicBatcher  # noqa: E402
+
+
+class SimulatedModel:
+    """模拟模型：每次调用有固定开销，每张图有额外耗时；sleep 期间释放 GIL，与 torch 推理相似"""
+
+    def __init__(self, call_overhead_ms: float, per_image_ms: float):
+        self.call_overhead = call_overhead_ms / 1000
+        self.per_image = per_image_ms / 1000
+        self._lock = threading.Lock()
+
+    def __call__(self, images):
+        with self._lock:  # 单个模型实例同一时刻只做一次前向计算
+            time.sleep(self.call_overhead + self.per_image * len(images))
+        return [[] for _ in images]
+
+
+def load_inference(simulate: bool, overhead_ms: float, per_image_ms: float):
+    """返回 (批量推理函数, 说明)"""
+    if simulate:
+        model = SimulatedModel(overhead_ms, per_image_ms)
+        return model, f"模拟模型（每次调用 {overhead_ms}ms + 每张 {per_image_ms}ms）"
+
+    from utils.yolo_image_classifier import yolo_classifier
+    if yolo_classifier.model is None:
+        print("YOLO 模型不可用，请检查模型路径或使用 --simulate")
+        sys.exit(1)
+    lock = threading.Lock()
+
+    def infer(images):
+        # 逐张模式下多个线程不能同时使用同一个模型实例
+        with lock:
+            return yolo_classifier._infer_batch(images)
+    return infer, f"YOLO {yolo_classifier.model_path}"
+
+
+def load_images(count: int):
+    images = [cv2.imread(p) for p in sorted(glob.glob(str(AI_DIR / "*.jpg")))]
+    images = [img for img in images if img is not None]
+    if not images:
+        images = [np.random.default_rng(0).integers(0, 256, (640, 640, 3), dtype=np.uint8)]
+    return [images[i % len(images)] for i in range(count)]
+
+
+def run(call, images, concurrency: int):
+    """并发发送请求，返回 (吞吐量, 各请求延迟列表)"""
+    latencies = []
+
+    def one(image):
+        start = time.perf_counter()
+        call(image)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, images))
+    elapsed = time.perf_counter() - start
+    return len(images) / elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO 动态批处理基准测试")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=48, help="每组测试的请求数")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--waits", type=float, nargs="+", default=[5.0, 10.0, 20.0], help="max_wait_ms 取值")
+    parser.add_argument("--simulate", action="store_true", help="使用模拟模型")
+    parser.add_argument("--overhead-ms", type=float, default=40.0, help="模拟模型每次调用的固定开销")
+    parser.add_argument("--per-image-ms", type=float, default=8.0, help="模拟模型每张图的耗时")
+    args = parser.parse_args()
+
+    infer, description = load_inference(args.simulate, args.overhead_ms, args.per_image_ms)
+    images = load_images(args.requests)
+    infer(images[:1])  # 预热
+    print(f"模型: {description}, 每组 {args.requests} 个请求\n")
+    print(f"{'并发':>4}  {'配置':<22}{'吞吐(张/s)':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'平均批大小':>12}")
+
+    for concurrency in args.concurrency:
+        throughput, latencies = run(lambda image: infer([image])[0], images, concurrency)
+        print(f"{concurrency:>4}  {'逐张推理':<22}{throughput:>12.1f}"
+              f"{np.percentile(latencies, 50) * 1000:>10.1f}{np.percentile(latencies, 95) * 1000:>10.1f}{1.0:>12.2f}")
+
+        for batch_size in args.batch_sizes:
+            for wait_ms in args.waits:
+                batcher = DynamicBatcher(infer, max_batch_size=batch_size, max_wait_ms=wait_ms, name="bench-batcher")
+                throughput, latencies = run(batcher.run, images, concurrency)
+                stats = batcher.get_stats()
+                batcher.shutdown()
+                label = f"batch={batch_size} wait={wait_ms:g}ms"
+                print(f"{concurrency:>4}  {label:<22}{throughput:>12.1f}"
+                      f"{np.percentile(latencies, 50) * 1000:>10.1f}{np.percentile(latencies, 95) * 1000:>10.1f}"
+                      f"{stats['avg_batch_size']:>12.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+YOLO 推理后端对比（CPU）
+
+在 campusphoto/ai 下的样例图上对比 ultralytics (PyTorch)、ONNX Runtime fp32 和 int8
+三种后端：单张 / 批量推理延迟，以及与 ultralytics 结果的一致性
+（主题分类一致率、检测类别集合 Jaccard、最高置信度差）。
+
+用法:
+    python export_yolo_onnx.py --quantize               # 先导出 ONNX 模型
+    python benchmarks/bench_yolo_onnx.py
+    python benchmarks/bench_yolo_onnx.py --weights path/to/yolov8n.pt --threads 4 --batch 8
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+AI_DIR = REPO_ROOT / "campusphoto" / "ai"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from config import settings  # noqa: E402
+from utils.yolo_image_classifier import yolo_classifier  # noqa: E402
+from utils.yolo_onnx_backend import OnnxYoloBackend, default_onnx_path  # noqa: E402
+
+
+def load_images(limit: int):
+    images = [cv2.imread(p) for p in sorted(glob.glob(str(AI_DIR / "*.jpg")))[:limit]]
+    return [img for img in images if img is not None]
+
+
+def ultralytics_infer(weights: str):
+    from ultralytics import YOLO
+    model = YOLO(weights)
+
+    def infer(images):
+        return [yolo_classifier._parse_detections(r) for r in model(images, verbose=False)]
+    return infer
+
+
+def timed(infer, images, batch: int, repeat: int):
+    """返回 (单张推理每张耗时ms, 批量推理每张耗时ms, 检测结果)"""
+    infer(images[:1])  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        detections = [infer([image])[0] for image in images]
+    single = (time.perf_counter() - start) / (repeat * len(images)) * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(images), batch):
+            infer(images[i:i + batch])
+    batched = (time.perf_counter() - start) / (repeat * len(images)) * 1000
+    return single, batched, detections
+
+
+def agreement(reference, detections):
+    """与参考结果的一致性：(主题一致率, 类别集合平均 Jaccard, 最高置信度平均差)"""
+    themes, jaccards, conf_diffs = [], [], []
+    for ref, det in zip(reference, detections):
+        themes.append(yolo_classifier._classify_from_detections(ref)['theme']
+                      == yolo_classifier._classify_from_detections(det)['theme'])
+        ref_classes, det_classes = {d['class_name'] for d in ref}, {d['class_name'] for d in det}
+        union = ref_classes | det_classes
+        jaccards.append(len(ref_classes & det_classes) / len(union) if union else 1.0)
+        conf_diffs.append(abs(max((d['confidence'] for d in ref), default=0.0)
+                              - max((d['confidence'] for d in det), default=0.0)))
+    return np.mean(themes), np.mean(jaccards), np.mean(conf_diffs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO 推理后端对比")
+    parser.add_argument("--weights", default=settings.yolo_model_path, help="YOLO .pt 权重路径")
+    parser.add_argument("--images", type=int, default=24, help="最多使用的样例图数量")
+    parser.add_argument("--batch", type=int, default=8, help="批量推理的批大小")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime 算子内线程数")
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"未找到样例图: {AI_DIR}")
+        sys.exit(1)
+
+    backends = [("ultralytics", ultralytics_infer(args.weights))]
+    for label, quantized in (("onnx fp32", False), ("onnx int8", True)):
+        path = default_onnx_path(args.weights, quantized)
+        if os.path.exists(path):
+            backends.append((label, OnnxYoloBackend(path, intra_op_threads=args.threads)))
+        else:
+            print(f"跳过 {label}: 未找到 {path}，请先运行 export_yolo_onnx.py --quantize")
+
+    print(f"{len(images)} 张图, 批大小 {args.batch}\n")
+    print(f"{'后端':<14}{'单张(ms)':>10}{'批量(ms/张)':>14}{'主题一致':>10}{'类别Jaccard':>14}{'置信度差':>10}")
+    reference = None
+    for label, infer in backends:
+        single, batched, detections = timed(infer, images, args.batch, args.repeat)
+        if reference is None:
+            reference = detections
+        theme, jaccard, conf_diff = agreement(reference, detections)
+        print(f"{label:<14}{single:>10.1f}{batched:>14.1f}{theme:>10.1%}{jaccard:>14.3f}{conf_diff:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,8 @@
 2. 过滤掉包含 bdd100k_seg 的记录
 3. 删除 result/ 中相关的目录
 """
-import json
 import shutil
+import sys
 from pathlib import Path
 from datetime import datetime
 
@@ -14,6 +14,9 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
 ERROR_JSON = BACKEND_DIR / "error_cases.json"
 RESULT_DIR = REPO_ROOT / "campusphoto" / "ai" / "exp" / "result"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.error_case_store import open_store  # noqa: E402
 
 def backup_file(file_path: Path) -> Path:
     """创建带时间戳的备份文件"""
@@ -32,37 +35,21 @@ def filter_error_cases():
     # 备份原文件
     backup_path = backup_file(ERROR_JSON)
     
-    # 读取数据
+    # 读取数据（error_cases.json 变化时自动重新导入）
     print("📖 读取 error_cases.json...")
-    with open(ERROR_JSON, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    if not isinstance(data, list):
-        print("❌ JSON 格式错误，期望列表")
-        return False
-    
-    original_count = len(data)
-    print(f"📊 原始记录数: {original_count}")
-    
-    # 过滤掉包含 bdd100k_seg 的记录
-    filtered_data = []
-    bdd_count = 0
-    
-    for item in data:
-        if isinstance(item, dict):
-            file_path = item.get("file_path", "")
-            if "bdd100k_seg" in file_path:
-                bdd_count += 1
-                continue
-        filtered_data.append(item)
-    
-    print(f"🗑️ 过滤掉 bdd100k_seg 记录: {bdd_count}")
-    print(f"📊 剩余记录数: {len(filtered_data)}")
-    
-    # 保存过滤后的数据
-    print("💾 保存过滤后的数据...")
-    with open(ERROR_JSON, 'w', encoding='utf-8') as f:
-        json.dump(filtered_data, f, ensure_ascii=False, indent=2)
+    with open_store(ERROR_JSON) as store:
+        original_count = store.count()
+        print(f"📊 原始记录数: {original_count}")
+        
+        # 过滤掉包含 bdd100k_seg 的记录
+        bdd_count = store.delete_cases("bdd100k_seg")
+        
+        print(f"🗑️ 过滤掉 bdd100k_seg 记录: {bdd_count}")
+        print(f"📊 剩余记录数: {original_count - bdd_count}")
+        
+        # 保存过滤后的数据
+        print("💾 保存过滤后的数据...")
+        store.export_json()
     
     print(f"✅ 已更新 {ERROR_JSON}")
     return True
@@ -23,11 +23,53 @@ class Settings(BaseSettings):
     
     # Redis 配置
     redis_url: str = "redis://localhost:6379"
+    redis_max_connections: int = 50  # 连接池大小，连接用尽时请求最多等待 redis_pool_timeout 秒
+    redis_pool_timeout: float = 2.0
+    redis_socket_timeout: float = 1.0  # 单个命令的读写超时秒数，超时按缓存未命中处理
+    redis_connect_timeout: float = 1.0
+    redis_health_check_interval: int = 30  # 连接空闲超过该秒数后，复用前先发送 PING 检查
+    cache_l1_max_entries: int = 10000  # 进程内一级缓存条目上限，0 表示不使用一级缓存
+    cache_l1_ttl: float = 30.0  # 一级缓存条目最长存活秒数
+    cache_invalidation_channel: str = "cache:invalidate"  # 跨进程一级缓存失效的发布/订阅频道
+    cache_sweep_interval: float = 300.0  # 后台 SCAN 清理已失效缓存条目的间隔秒数，0 表示不清理
+    cache_stale_ttl: int = 60  # 条目逻辑过期后仍返回旧值并后台刷新的秒数，0 表示过期即回源
+    cache_xfetch_beta: float = 1.0  # XFetch 提前刷新系数，越大越早刷新，0 表示不提前刷新
+    cache_lock_ttl: float = 5.0  # 跨进程缓存重建锁的过期秒数，未取得锁的请求最多等待这么久
+    counter_flush_interval: float = 1.0  # 浏览、点赞等计数增量批量写回数据库的间隔秒数
+    counter_max_pending: int = 1000  # 待写回的作品数达到该值时立即写回
     
     # 文件上传配置
     max_file_size: int = 10485760  # 10MB
     allowed_extensions: List[str] = ["jpg", "jpeg", "png", "webp"]
     
+    # 图像分析队列配置
+    analysis_workers: int = 2  # 后台分析线程数
+    
+    # 推理进程池配置
+    inference_workers: int = 2  # 执行图像分析的工作进程数，0 表示在主进程内分析
+    inference_threads_per_worker: int = 0  # 每个进程的 OpenCV/torch/BLAS 线程数，0 表示按 CPU 核数均分
+    inference_task_timeout: float = 120.0  # 单个分析任务的超时秒数，超时后重建进程池（同时在执行的其他任务重新提交一次）
+    inference_health_interval: float = 30.0  # 健康检查间隔秒数
+    
+    # YOLO 动态批处理配置：只在主进程内分析（inference_workers=0）或离线评估时生效，
+    # 推理进程池的每个工作进程同一时刻只分析一张图，不做凑批
+    yolo_max_batch_size: int = 8  # 单次前向计算最多合并的图像数，1 表示不合并
+    yolo_max_batch_wait_ms: float = 10.0  # 凑批最多等待的毫秒数
+    
+    # 模型配置
+    yolo_model_path: str = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai", "yolov8n.pt"))
+    preload_models: bool = True  # 启动时加载并预热模型，否则在首次使用时加载
+    
+    # YOLO 推理后端配置
+    yolo_backend: str = "ultralytics"  # ultralytics 或 onnx（CPU 上使用 ONNX Runtime）
+    yolo_onnx_path: str = ""  # 为空时使用与 .pt 权重同目录的 .onnx / .int8.onnx 文件
+    yolo_onnx_quantized: bool = False  # 使用 int8 动态量化模型
+    yolo_onnx_threads: int = 0  # ONNX Runtime 算子内线程数，0 表示由运行时决定
+    
+    # 相似作品检索配置
+    similarity_index_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "similarity_index.npz")
+    similarity_nprobe: int = 8  # 每次查询计算的簇数，越大召回越高、查询越慢
+    
     # 系统配置
     debug: bool = True
     cors_origins: List[str] = ["http://localhost:3000"]
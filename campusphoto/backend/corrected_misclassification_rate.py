@@ -4,13 +4,15 @@
 总测试图片: 332,532 张
 错误案例: 49,417 张 (来自 error_cases.json)
 """
-import json
+import sys
 from pathlib import Path
-from collections import Counter
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
 ERROR_JSON = BACKEND_DIR / "error_cases.json"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.error_case_store import open_store  # noqa: E402
 
 # 从 complete_test_report.md 获取的总图片数
 TOTAL_TEST_IMAGES = 332532
@@ -26,47 +28,30 @@ SAMPLE_STATS = {
     "人像->街景": {"ai_error": 48, "dataset_error": 50, "total": 98},
 }
 
-def load_error_cases():
-    """加载错误案例数据"""
-    if not ERROR_JSON.exists():
+def load_error_store():
+    """打开错误案例存储（error_cases.json 变化时自动重新导入）"""
+    store = open_store(ERROR_JSON)
+    if store is None:
         print(f"❌ 文件不存在: {ERROR_JSON}")
-        return []
-    
-    with open(ERROR_JSON, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    return data if isinstance(data, list) else []
+    return store
 
 def calculate_corrected_misclassification_rates():
     """基于总测试图片数计算误判率"""
-    cases = load_error_cases()
-    if not cases:
+    store = load_error_store()
+    if store is None:
         return
     
     # 分析错误分类
-    category_stats = {}
-    theme_counts = Counter()
-    
-    for case in cases:
-        if not isinstance(case, dict):
-            continue
-            
-        expected = case.get("expected_theme", "")
-        predicted = case.get("predicted_theme", "")
-        
-        if expected:
-            theme_counts[expected] += 1
-            
-        if expected and predicted and expected != predicted:
-            key = f"{expected}->{predicted}"
-            if key not in category_stats:
-                category_stats[key] = []
-            category_stats[key].append(case)
+    with store:
+        case_total = store.count()
+        category_stats = store.confusion_counts()
+    if not case_total:
+        return
     
     print(f"📊 基于 complete_test_report.md 的误判率分析:")
     print(f"总测试图片数: {TOTAL_TEST_IMAGES:,} 张")
-    print(f"错误案例数: {len(cases):,} 张")
-    print(f"总体错误率: {len(cases)/TOTAL_TEST_IMAGES:.1%}")
+    print(f"错误案例数: {case_total:,} 张")
+    print(f"总体错误率: {case_total/TOTAL_TEST_IMAGES:.1%}")
     print("=" * 100)
     print(f"{'错误类别':25} | {'错误数':6} | {'AI误判':8} | {'数据集错误':10} | {'总误判率':8} | {'AI误判率':8} | {'样本数':6}")
     print("-" * 100)
@@ -74,11 +59,8 @@ def calculate_corrected_misclassification_rates():
     total_ai_errors = 0
     total_dataset_errors = 0
     
-    # 按错误数排序
-    sorted_categories = sorted(category_stats.items(), key=lambda x: len(x[1]), reverse=True)
-    
-    for category, cases in sorted_categories:
-        error_count = len(cases)
+    # 按错误数排序（已按数量降序）
+    for category, error_count in category_stats.items():
         
         if category in SAMPLE_STATS:
             sample = SAMPLE_STATS[category]
@@ -110,18 +92,18 @@ def calculate_corrected_misclassification_rates():
             print(f"{category:25} | {error_count:6} | {estimated_ai_errors:8} | {estimated_dataset_errors:10} | {total_misclassification_rate:7.1%} | {ai_misclassification_rate:7.1%} | {'无':6}")
     
     print("-" * 100)
-    total_misclassification_rate = len(cases) / TOTAL_TEST_IMAGES
+    total_misclassification_rate = case_total / TOTAL_TEST_IMAGES
     ai_misclassification_rate = total_ai_errors / TOTAL_TEST_IMAGES
     dataset_misclassification_rate = total_dataset_errors / TOTAL_TEST_IMAGES
     
-    print(f"{'总计':25} | {len(cases):6} | {total_ai_errors:8} | {total_dataset_errors:10} | {total_misclassification_rate:7.1%} | {ai_misclassification_rate:7.1%} | {'':6}")
+    print(f"{'总计':25} | {case_total:6} | {total_ai_errors:8} | {total_dataset_errors:10} | {total_misclassification_rate:7.1%} | {ai_misclassification_rate:7.1%} | {'':6}")
     
     print(f"\n📊 总结:")
     print(f"  总测试图片数: {TOTAL_TEST_IMAGES:,}")
-    print(f"  总错误数: {len(cases):,} ({len(cases)/TOTAL_TEST_IMAGES:.1%})")
+    print(f"  总错误数: {case_total:,} ({case_total/TOTAL_TEST_IMAGES:.1%})")
     print(f"  AI误判数: {total_ai_errors:,} ({ai_misclassification_rate:.1%})")
     print(f"  数据集错误: {total_dataset_errors:,} ({dataset_misclassification_rate:.1%})")
-    print(f"  正确预测数: {TOTAL_TEST_IMAGES - len(cases):,} ({(TOTAL_TEST_IMAGES - len(cases))/TOTAL_TEST_IMAGES:.1%})")
+    print(f"  正确预测数: {TOTAL_TEST_IMAGES - case_total:,} ({(TOTAL_TEST_IMAGES - case_total)/TOTAL_TEST_IMAGES:.1%})")
 
 if __name__ == "__main__":
     calculate_corrected_misclassification_rates()
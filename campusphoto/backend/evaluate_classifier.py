@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+离线评估主题分类器
+
+遍历已标注的目录树（每个一级子目录为一个标签，如 人像测试/、街景测试/），
+在多个工作进程中对每张图运行与线上相同的混合分类器，结果逐条追加到 JSONL 文件：
+每个进程内多个线程并发分类，YOLO 推理由动态批处理器合并为批量前向计算。
+
+结果文件只追加不改写，每处理 --checkpoint-every 张落盘一次，中断后重新运行即从断点继续。
+重新运行时只评估内容哈希或分析器版本（模型、级联阈值等）发生变化的图像，
+文件大小和修改时间都未变化的图像直接沿用上次的内容哈希，不再重新读取。
+
+用法:
+    python evaluate_classifier.py /data/exp
+    python evaluate_classifier.py /data/exp --workers 4 --chunk-size 16
+    python evaluate_classifier.py /data/exp --export-errors error_cases.json
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+RESULTS_JSONL = BACKEND_DIR / "evaluation_results.jsonl"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from config import settings  # noqa: E402
+from utils.inference_pool import THREAD_ENV_VARS, _init_worker, _worker_ping  # noqa: E402
+
+# 数据集标签与当前分类体系的对应关系，无法对应的标签不计入准确率
+LABEL_ALIASES = {
+    "动物": "动物与植物",
+    "植物": "动物与植物",
+    "街景": "城市与建筑",
+    "建筑": "城市与建筑",
+}
+
+# 标签目录名的后缀，如 "人像测试" -> "人像"
+LABEL_DIR_SUFFIX = "测试"
+
+
+def label_from_dir(name: str) -> str:
+    return name[:-len(LABEL_DIR_SUFFIX)] if name.endswith(LABEL_DIR_SUFFIX) and name != LABEL_DIR_SUFFIX else name
+
+
+def scan_dataset(root: Path):
+    """遍历数据集，返回 [(绝对路径, 标签, 文件大小, 修改时间)]"""
+    extensions = {f".{ext}" for ext in settings.allowed_extensions}
+    samples = []
+    for label_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        label = label_from_dir(label_dir.name)
+        for dirpath, _, filenames in os.walk(label_dir):
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() not in extensions:
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                samples.append((os.path.abspath(path), label, stat.st_size, stat.st_mtime_ns))
+    return samples
+
+
+def load_results(path: Path):
+    """读取已有结果，同一图像以最后一条记录为准；中断时写了一半的行直接忽略"""
+    results = {}
+    if not path.exists():
+        return results
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get("path"):
+                results[record["path"]] = record
+    return results
+
+
+def open_results(path: Path):
+    """以追加方式打开结果文件，上次中断留下的残行先补上换行"""
+    if path.exists() and path.stat().st_size > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+    output = open(path, 'a', encoding='utf-8')
+    if needs_newline:
+        output.write("\n")
+    return output
+
+
+def file_hash(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _classify_one(path: str) -> dict:
+    """读取、哈希并分类一张图（在工作进程的线程中运行）"""
+    from utils.hybrid_image_classifier import hybrid_classifier
+    from utils.image_pipeline import DecodedImage, get_analysis_max_edges
+
+    start = time.perf_counter()
+    record = {"path": path}
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        record["content_hash"] = hashlib.sha256(data).hexdigest()
+        image = DecodedImage.open(io.BytesIO(data)).level(get_analysis_max_edges().get("classification"))
+        result = hybrid_classifier.classify_decoded(image)
+        detections = sorted(result.get("detections") or [], key=lambda d: d["confidence"], reverse=True)
+        record.update({
+            "predicted_theme": result.get("theme"),
+            "subcategory": result.get("subcategory"),
+            "confidence": round(float(result.get("confidence", 0.0)), 4),
+            "method": result.get("method"),
+            "decided_by": (result.get("cascade") or {}).get("decided_by"),
+            "detections": [
+                {"class_name": d["class_name"], "confidence": round(float(d["confidence"]), 4)}
+                for d in detections[:5]
+            ],
+            "error": None
+        })
+    except Exception as e:
+        record["error"] = str(e)
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+def _classify_chunk(paths: list) -> list:
+    """在同一进程内并发分类一组图像，YOLO 调用由批处理器合并"""
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        return list(executor.map(_classify_one, paths))
+
+
+def analyzer_version(executor) -> str:
+    """工作进程中实际使用的分析器版本，同时把全部工作进程启动起来"""
+    from utils.image_analyzer import image_analyzer
+    if executor is None:
+        return image_analyzer.get_version()
+    futures = [executor.submit(_worker_ping) for _ in range(executor._max_workers)]
+    pings = [future.result() for future in futures]
+    return image_analyzer.get_version(pings[0]["model_name"])
+
+
+def plan(samples, previous, version):
+    """
+    找出需要评估的图像
+
+    文件未变化时沿用上次的内容哈希；文件变化但内容哈希相同时只更新文件信息。
+    返回 (待评估的样本, 仅需刷新文件信息的记录)
+    """
+    pending, refreshed = [], []
+    for path, label, size, mtime_ns in samples:
+        record = previous.get(path)
+        if record is None or record.get("error"):
+            pending.append((path, label, size, mtime_ns))
+            continue
+        if record.get("size") != size or record.get("mtime_ns") != mtime_ns:
+            try:
+                content_hash = file_hash(path)
+            except OSError:
+                continue
+            if content_hash != record.get("content_hash"):
+                pending.append((path, label, size, mtime_ns))
+                continue
+            record = dict(record, size=size, mtime_ns=mtime_ns, label=label)
+            refreshed.append(record)
+        if record.get("version") != version:
+            pending.append((path, label, size, mtime_ns))
+    return pending, refreshed
+
+
+def finish_record(record: dict, label: str, size: int, mtime_ns: int, version: str) -> dict:
+    """补全标签、文件信息和是否正确"""
+    from utils.hybrid_image_classifier import LEGACY_THEME_ALIASES, hybrid_classifier
+
+    expected = LABEL_ALIASES.get(label, label)
+    predicted = record.get("predicted_theme")
+    predicted = LEGACY_THEME_ALIASES.get(predicted, predicted)
+    scored = expected in hybrid_classifier.subcategory_mapping and not record.get("error")
+    record.update({
+        "label": label,
+        "expected_theme": label,
+        "correct": predicted == expected if scored else None,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "version": version,
+        "evaluated_at": datetime.utcnow().isoformat()
+    })
+    return record
+
+
+def evaluate(root: Path, output_path: Path, workers: int, threads: int, chunk_size: int, checkpoint_every: int):
+    samples = scan_dataset(root)
+    previous = load_results(output_path)
+    print(f"📁 数据集 {root}: {len(samples):,} 张图片，已有结果 {len(previous):,} 条")
+
+    executor = None
+    if workers > 0:
+        for var in THREAD_ENV_VARS:
+            os.environ.setdefault(var, str(threads))
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads, chunk_size)
+        )
+    try:
+        version = analyzer_version(executor)
+        pending, refreshed = plan(samples, previous, version)
+        print(f"🔖 分析器版本 {version}: 需要评估 {len(pending):,} 张，"
+              f"跳过 {len(samples) - len(pending):,} 张")
+
+        output = open_results(output_path)
+        try:
+            for record in refreshed:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                previous[record["path"]] = record
+
+            info = {path: (label, size, mtime_ns) for path, label, size, mtime_ns in pending}
+            chunks = [[p[0] for p in pending[i:i + chunk_size]] for i in range(0, len(pending), chunk_size)]
+            done = since_checkpoint = 0
+            start = time.perf_counter()
+
+            def write(records):
+                nonlocal done, since_checkpoint
+                for record in records:
+                    record = finish_record(record, *info[record["path"]], version)
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    previous[record["path"]] = record
+                done += len(records)
+                since_checkpoint += len(records)
+                if since_checkpoint >= checkpoint_every or done == len(pending):
+                    output.flush()
+                    os.fsync(output.fileno())
+                    since_checkpoint = 0
+                    elapsed = time.perf_counter() - start
+                    rate = done / elapsed if elapsed else 0.0
+                    eta = (len(pending) - done) / rate if rate else 0.0
+                    print(f"  {done:,}/{len(pending):,} ({rate:.1f} 张/秒，剩余约 {eta / 60:.1f} 分钟)")
+
+            if executor is None:
+                for chunk in chunks:
+                    write(_classify_chunk(chunk))
+            else:
+                # 限制排队的任务数，避免一次提交全部数据集
+                remaining = iter(chunks)
+                in_flight = set()
+                while True:
+                    while len(in_flight) < workers * 2:
+                        chunk = next(remaining, None)
+                        if chunk is None:
+                            break
+                        in_flight.add(executor.submit(_classify_chunk, chunk))
+                    if not in_flight:
+                        break
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(future.result())
+        finally:
+            output.flush()
+            os.fsync(output.fileno())
+            output.close()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    return [previous[path] for path, *_ in samples if path in previous], version
+
+
+def print_summary(records, version: str):
+    totals, scored, correct, errors = Counter(), Counter(), Counter(), 0
+    confusion = defaultdict(Counter)
+    for record in records:
+        if record.get("error"):
+            errors += 1
+            continue
+        label = record["label"]
+        totals[label] += 1
+        if record.get("correct") is None:
+            continue
+        scored[label] += 1
+        if record["correct"]:
+            correct[label] += 1
+        else:
+            confusion[label][record.get("predicted_theme")] += 1
+
+    print(f"\n📊 评估结果 (分析器版本 {version}):")
+    print("=" * 80)
+    print(f"{'标签':12} | {'图片数':8} | {'正确数':8} | {'准确率':8} | 主要误判")
+    print("-" * 80)
+    for label in sorted(totals, key=totals.get, reverse=True):
+        # 无法对应到当前分类体系的标签不计入准确率
+        accuracy = f"{correct[label] / scored[label]:7.1%}" if scored[label] else f"{'不计入':>5}"
+        mistakes = ", ".join(f"{theme}({count})" for theme, count in confusion[label].most_common(3))
+        print(f"{label:12} | {totals[label]:8,} | {correct[label]:8,} | {accuracy} | {mistakes}")
+    print("-" * 80)
+    print(f"  已评估: {sum(totals.values()):,} 张，读取/解码失败 {errors:,} 张")
+    if scored:
+        total_scored, total_correct = sum(scored.values()), sum(correct.values())
+        print(f"  总体准确率: {total_correct / total_scored:.1%} ({total_correct:,}/{total_scored:,})")
+
+
+def export_errors(records, path: Path):
+    """导出错误案例，格式与 error_cases.json 相同"""
+    cases = [
+        {
+            "file_path": record["path"],
+            "expected_theme": record["expected_theme"],
+            "predicted_theme": record["predicted_theme"],
+            "confidence": record["confidence"],
+            "detections": record.get("detections", [])
+        }
+        for record in records if record.get("correct") is False
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cases, f, ensure_ascii=False, indent=2)
+    print(f"💾 已导出 {len(cases):,} 个错误案例到 {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线评估主题分类器")
+    parser.add_argument("root", type=Path, help="数据集目录，每个一级子目录为一个标签")
+    parser.add_argument("--output", type=Path, default=RESULTS_JSONL, help="结果文件 (JSONL，只追加)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="工作进程数，0 表示在当前进程内运行")
+    parser.add_argument("--threads", type=int, default=0, help="每个工作进程的计算线程数，默认平分CPU核心")
+    parser.add_argument("--chunk-size", type=int, default=8, help="每个任务包含的图片数，也是YOLO的最大批大小")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="每处理多少张落盘一次")
+    parser.add_argument("--export-errors", type=Path, help="导出错误案例 JSON")
+    args = parser.parse_args()
+
+    if not args.root.is_dir():
+        print(f"❌ 目录不存在: {args.root}")
+        sys.exit(1)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(1, args.workers))
+
+    records, version = evaluate(args.root.resolve(), args.output, args.workers, threads,
+                                max(1, args.chunk_size), max(1, args.checkpoint_every))
+    print_summary(records, version)
+    if args.export_errors:
+        export_errors(records, args.export_errors)
+
+
+if __name__ == "__main__":
+    main()
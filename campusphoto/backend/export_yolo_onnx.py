@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+把 YOLO 权重导出为 ONNX 模型，供 yolo_backend=onnx 时使用
+
+导出为动态 batch 的 640x640 输入，可选再生成 int8 动态量化版本。
+默认输出到权重同目录的 <name>.onnx 和 <name>.int8.onnx。
+
+用法:
+    python export_yolo_onnx.py                     # 导出当前配置的模型
+    python export_yolo_onnx.py --quantize          # 同时生成 int8 量化模型
+    python export_yolo_onnx.py --weights path/to/yolov8n.pt
+"""
+import argparse
+import os
+import shutil
+import sys
+
+from config import settings
+from utils.yolo_onnx_backend import default_onnx_path
+
+
+def export(weights: str, imgsz: int) -> str:
+    """导出 fp32 ONNX 模型，返回输出路径"""
+    from ultralytics import YOLO
+
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    target = default_onnx_path(weights)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        shutil.move(exported, target)
+    return target
+
+
+def quantize(onnx_path: str, output_path: str):
+    """int8 动态量化（权重量化，激活在运行时量化）"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QUInt8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 YOLO ONNX 模型")
+    parser.add_argument("--weights", default=settings.yolo_model_path, help="YOLO .pt 权重路径，默认使用配置的模型")
+    parser.add_argument("--imgsz", type=int, default=640, help="输入尺寸")
+    parser.add_argument("--quantize", action="store_true", help="同时生成 int8 量化模型")
+    args = parser.parse_args()
+
+    weights = args.weights
+    if not os.path.exists(weights):
+        print(f"权重文件不存在: {weights}")
+        sys.exit(1)
+
+    onnx_path = export(weights, args.imgsz)
+    print(f"已导出: {onnx_path} ({os.path.getsize(onnx_path) / 1024 / 1024:.1f}MB)")
+
+    if args.quantize:
+        int8_path = default_onnx_path(weights, quantized=True)
+        quantize(onnx_path, int8_path)
+        print(f"已量化: {int8_path} ({os.path.getsize(int8_path) / 1024 / 1024:.1f}MB)")
+
+
+if __name__ == "__main__":
+    main()
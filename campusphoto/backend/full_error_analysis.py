@@ -2,13 +2,15 @@
 """
 全面分析错误分类：先统计所有类别，再基于样本估算AI误判数量
 """
-import json
+import sys
 from pathlib import Path
-from collections import defaultdict, Counter
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
 ERROR_JSON = BACKEND_DIR / "error_cases.json"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.error_case_store import open_store  # noqa: E402
 
 # 用户提供的样本统计（AI误判 vs 数据集错误）
 SAMPLE_STATS = {
@@ -21,40 +23,21 @@ SAMPLE_STATS = {
     "人像->街景": {"ai_error": 48, "dataset_error": 50, "total": 98},
 }
 
-def load_error_cases():
-    """加载错误案例数据"""
-    if not ERROR_JSON.exists():
+def load_error_store():
+    """打开错误案例存储（error_cases.json 变化时自动重新导入）"""
+    store = open_store(ERROR_JSON)
+    if store is None:
         print(f"❌ 文件不存在: {ERROR_JSON}")
-        return []
-    
-    with open(ERROR_JSON, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    return data if isinstance(data, list) else []
+    return store
 
 def analyze_all_categories():
-    """分析所有错误类别"""
-    cases = load_error_cases()
-    if not cases:
-        return {}
-    
-    category_stats = defaultdict(list)
-    theme_counts = Counter()
+    """统计所有错误类别，返回 ({"期望->预测": 数量}, {期望主题: 数量})"""
+    store = load_error_store()
+    if store is None:
+        return {}, {}
     
-    for case in cases:
-        if not isinstance(case, dict):
-            continue
-            
-        expected = case.get("expected_theme", "")
-        predicted = case.get("predicted_theme", "")
-        
-        if expected and predicted:
-            theme_counts[expected] += 1
-            if expected != predicted:
-                key = f"{expected}->{predicted}"
-                category_stats[key].append(case)
-    
-    return dict(category_stats), dict(theme_counts)
+    with store:
+        return store.confusion_counts(), dict(store.theme_counts())
 
 def estimate_ai_errors():
     """基于样本统计估算AI误判数量"""
@@ -69,11 +52,8 @@ def estimate_ai_errors():
     total_ai_errors = 0
     total_dataset_errors = 0
     
-    # 按总数排序显示
-    sorted_categories = sorted(category_stats.items(), key=lambda x: len(x[1]), reverse=True)
-    
-    for category, cases in sorted_categories:
-        case_count = len(cases)
+    # 按总数排序显示（已按数量降序）
+    for category, case_count in category_stats.items():
         total_cases += case_count
         
         if category in SAMPLE_STATS:
@@ -105,14 +85,12 @@ def estimate_ai_errors():
 
 def show_theme_distribution():
     """显示各主题的分布情况"""
-    cases = load_error_cases()
-    theme_counts = Counter()
+    store = load_error_store()
+    if store is None:
+        return
     
-    for case in cases:
-        if isinstance(case, dict):
-            expected = case.get("expected_theme", "")
-            if expected:
-                theme_counts[expected] += 1
+    with store:
+        theme_counts = store.theme_counts()
     
     print("\n📈 各主题分布:")
     print("=" * 40)
@@ -138,7 +116,7 @@ def generate_detailed_report():
     
     for category, sample in SAMPLE_STATS.items():
         if category in category_stats:
-            total = len(category_stats[category])
+            total = category_stats[category]
             ai_rate = sample["ai_error"] / sample["total"]
             dataset_rate = sample["dataset_error"] / sample["total"]
             
@@ -7,12 +7,21 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from fastapi.responses import JSONResponse
+import asyncio
 import logging
 import os
 
 from config import settings
 from models.database import create_tables, get_db
 from utils.config_manager import init_config_manager
+from utils.analysis_queue import analysis_queue
+from utils.model_registry import model_registry
+from utils.inference_pool import inference_pool
+from utils.similarity_index import similarity_index
+from utils.loop_monitor import loop_monitor
+from utils.cache_strategies import cache_manager
+from utils.counter_buffer import counter_buffer
+from utils.upload_storage import fix_permissions
 from routers import auth, users, photos, competitions, appointments, admin, analytics, rankings, analysis, experiment
 
 # 配置日志
@@ -24,6 +33,13 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def fix_upload_permissions():
+    """修复此前以 0600 权限保存的原图，使 nginx 可以读取"""
+    fixed = fix_permissions("static/uploads")
+    if fixed:
+        logger.info(f"已修复 {fixed} 个上传文件的读取权限")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
@@ -48,6 +64,32 @@ async def lifespan(app: FastAPI):
     os.makedirs("uploads", exist_ok=True)
     os.makedirs("static", exist_ok=True)
     os.makedirs("static/thumbnails", exist_ok=True)
+    asyncio.get_running_loop().run_in_executor(None, fix_upload_permissions)
+    
+    # 启动后台分析队列
+    analysis_queue.start()
+    logger.info("图像分析队列已启动")
+    
+    # 后台加载并预热模型，加载完成前 /ready 返回 503
+    # 启用推理进程池时模型只在工作进程中加载
+    if inference_pool.enabled:
+        asyncio.get_running_loop().run_in_executor(None, inference_pool.start)
+        logger.info("推理进程池开始启动")
+    elif settings.preload_models:
+        asyncio.get_running_loop().run_in_executor(None, model_registry.load_all)
+        logger.info("模型开始后台加载")
+    
+    # 后台加载相似检索索引并补齐缺失的作品
+    asyncio.get_running_loop().run_in_executor(None, similarity_index.start)
+    
+    # 监测事件循环延迟（async 接口中的阻塞调用）
+    loop_monitor.start()
+    
+    # 订阅一级缓存失效消息（订阅成功后才启用进程内缓存），定期清理已失效的缓存条目
+    cache_manager.start()
+    
+    # 浏览、点赞等计数增量定期批量写回数据库
+    counter_buffer.start()
     
     logger.info("高校摄影系统启动完成")
     
@@ -55,6 +97,13 @@ async def lifespan(app: FastAPI):
     
     # 关闭时
     logger.info("高校摄影系统正在关闭...")
+    await loop_monitor.stop()
+    # 先写回剩余的计数增量（写回后会使缓存失效，需在关闭 Redis 连接之前）
+    await counter_buffer.stop()
+    await cache_manager.close()
+    analysis_queue.shutdown(wait=True)
+    similarity_index.shutdown()
+    inference_pool.shutdown()
 
 
 # 创建FastAPI应用
@@ -131,6 +180,26 @@ async def health_check(response: Response):
     }
 
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """就绪检查：启动时预加载的模型（或推理进程池）加载并预热完成后才返回 200"""
+    if inference_pool.enabled:
+        # 工作进程最近一次健康检查时上报的模型状态
+        ready = inference_pool.ready
+        models = inference_pool.last_health.get("models", {})
+    else:
+        ready = model_registry.is_ready(require_loaded=settings.preload_models)
+        models = model_registry.get_status()
+    if not ready:
+        response.status_code = 503
+    response.headers["Content-Type"] = "application/json; charset=utf-8"
+    return {
+        "status": "ready" if ready else "loading",
+        "models": models,
+        "inference_pool": inference_pool.get_stats()
+    }
+
+
 @app.get("/api/config/public")
 async def get_public_config():
     """获取公开配置"""
@@ -1,7 +1,7 @@
 """
 数据库模型定义
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, DECIMAL, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, DECIMAL, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -61,6 +61,55 @@ class Photo(Base):
     interactions = relationship("Interaction", back_populates="photo")
     rankings = relationship("Ranking", back_populates="photo")
     approver = relationship("User", foreign_keys=[approved_by])
+    analysis = relationship("PhotoAnalysis", back_populates="photo", uselist=False, cascade="all, delete-orphan")
+
+
+class PhotoAnalysis(Base):
+    """作品AI分析任务表"""
+    __tablename__ = "photo_analyses"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), unique=True, nullable=False)
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, processing, completed, failed
+    theme_locked = Column(Boolean, default=False)  # 用户已选择主题时不覆盖
+    tags = Column(JSON)  # 智能标签
+    result = Column(JSON)  # 完整分析结果
+    error = Column(Text)  # 失败原因
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    
+    # 关系
+    photo = relationship("Photo", back_populates="analysis")
+
+
+class StoredImage(Base):
+    """按内容哈希存储的原图（相同内容只保存一份）"""
+    __tablename__ = "stored_images"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256
+    file_ext = Column(String(10), nullable=False)
+    storage_path = Column(Text, nullable=False)  # 本地文件路径
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用该内容的作品数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class AnalysisResult(Base):
+    """图像分析结果缓存（按内容哈希和分析器版本区分）"""
+    __tablename__ = "analysis_results"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "analyzer_version", name="uq_analysis_results_hash_version"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False, index=True)  # SHA-256
+    analyzer_version = Column(String(100), nullable=False)  # 分析流程、模型及参数版本
+    result = Column(JSON, nullable=False)  # 完整分析结果（主色调、质量、构图、标签等）
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class Competition(Base):
@@ -96,6 +96,10 @@ class PhotoInDB(PhotoBase):
     updated_at: Optional[datetime] = None
 
 
+class SimilarPhoto(PhotoInDB):
+    similarity: float
+
+
 class PhotoDetail(PhotoInDB):
     user: UserInDB
     competition: Optional['CompetitionInDB'] = None
@@ -342,6 +346,17 @@ class ImageAnalysisResult(BaseModel):
     confidence: float
     tags: List[str] = []
     colors: List[str] = []
+
+
+class PhotoAnalysisStatus(BaseSchema):
+    photo_id: int
+    status: str
+    theme: Optional[str] = None
+    confidence: Optional[Decimal] = None
+    tags: List[str] = []
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
     
     
 # 热度分析相关模式
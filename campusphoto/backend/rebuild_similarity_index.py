@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+离线重建相似作品检索索引
+
+为数据库中所有已审核通过的作品重新计算特征向量，在多个进程中并行计算，
+重新训练 IVF 簇中心后原子替换索引文件。修改 image_embedding 的特征或权重之后、
+或索引文件损坏时使用；平时的增量更新由服务进程在审核时完成。
+
+服务运行期间重建也可以：服务发现索引文件被替换后不再写回，重启后加载新索引。
+
+用法（与服务相同，在 backend 目录下运行，作品路径相对于当前目录）:
+    python rebuild_similarity_index.py
+    python rebuild_similarity_index.py --workers 4 --output /tmp/similarity_index.npz
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from config import settings  # noqa: E402
+
+
+def _init_embed_worker():
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def _embed_chunk(items):
+    """在工作进程中计算一组作品的向量，返回 (作品ID, 向量或 None, 错误信息)"""
+    from utils.image_embedding import embed_image
+
+    results = []
+    for photo_id, image_path in items:
+        try:
+            results.append((photo_id, embed_image(image_path), None))
+        except Exception as e:
+            results.append((photo_id, None, str(e)))
+    return results
+
+
+def load_approved_photos():
+    """已审核通过作品的 (ID, 本地路径)"""
+    from models.database import SessionLocal
+    from models.models import Photo
+    from utils.analysis_queue import local_path_from_url
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Photo.id, Photo.image_url).filter(Photo.is_approved == True).order_by(Photo.id).all()
+    finally:
+        db.close()
+    return [(photo_id, local_path_from_url(url)) for photo_id, url in rows]
+
+
+def rebuild(output: Path, workers: int, chunk_size: int):
+    from utils.similarity_index import VectorIndex
+
+    photos = load_approved_photos()
+    print(f"📊 已审核作品: {len(photos)}")
+    chunks = [photos[i:i + chunk_size] for i in range(0, len(photos), chunk_size)]
+
+    index = VectorIndex()
+    failed = 0
+    started = time.perf_counter()
+
+    def collect(results):
+        nonlocal failed
+        for photo_id, vector, error in results:
+            if vector is None:
+                failed += 1
+                print(f"\n⚠️ 作品 {photo_id} 计算失败: {error}")
+            else:
+                index.add(photo_id, vector)
+
+    if workers > 0 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                 initializer=_init_embed_worker) as executor:
+            for done, results in enumerate(executor.map(_embed_chunk, chunks), 1):
+                collect(results)
+                print(f"\r⏳ {min(done * chunk_size, len(photos))}/{len(photos)}", end="", flush=True)
+    else:
+        for done, chunk in enumerate(chunks, 1):
+            collect(_embed_chunk(chunk))
+            print(f"\r⏳ {min(done * chunk_size, len(photos))}/{len(photos)}", end="", flush=True)
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ 计算完成: {len(index)} 个向量，失败 {failed} 个，用时 {elapsed:.1f}s")
+
+    if index.needs_training():
+        index.train()
+        print(f"🧭 IVF 簇数: {len(index.centroids)}")
+    else:
+        print("ℹ️ 作品数较少，不建簇，查询时全量计算")
+
+    index.save(str(output))
+    print(f"💾 已保存: {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线重建相似作品检索索引")
+    parser.add_argument("--output", type=Path, default=Path(settings.similarity_index_path), help="索引文件 (npz)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) - 1),
+                        help="工作进程数，0 表示在当前进程内计算")
+    parser.add_argument("--chunk-size", type=int, default=32, help="每个任务包含的作品数")
+    args = parser.parse_args()
+    rebuild(args.output, args.workers, max(1, args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
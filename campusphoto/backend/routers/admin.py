@@ -17,6 +17,14 @@ from models.schemas import (
 )
 from utils.auth import get_current_active_user, require_admin
 from utils.config_manager import get_config_manager
+from utils import content_store
+from utils.analysis_queue import analysis_queue, local_path_from_url
+from utils.analysis_cache import analysis_cache
+from utils.yolo_image_classifier import yolo_classifier
+from utils.inference_pool import inference_pool
+from utils.classifier_cascade import cascade_stats
+from utils.similarity_index import similarity_index
+from utils.cache_strategies import invalidate_photo_cache
 
 router = APIRouter()
 
@@ -226,6 +234,12 @@ async def bulk_approve_photos(
     
     db.commit()
     
+    approved = db.query(Photo.id, Photo.image_url).filter(Photo.id.in_(photo_ids)).all()
+    similarity_index.submit_many(
+        (photo_id, local_path_from_url(image_url)) for photo_id, image_url in approved
+    )
+    await invalidate_photo_cache(photo_ids)
+    
     # 记录操作日志
     log_entry = SystemLog(
         user_id=current_user.id,
@@ -253,6 +267,8 @@ async def bulk_reject_photos(
     ).update({Photo.is_approved: False}, synchronize_session=False)
     
     db.commit()
+    similarity_index.remove(photo_ids)
+    await invalidate_photo_cache(photo_ids)
     
     # 记录操作日志
     log_entry = SystemLog(
@@ -296,9 +312,15 @@ async def admin_delete_photo(
     from models.models import Interaction
     db.query(Interaction).filter(Interaction.photo_id == photo_id).delete()
     
+    # 释放原图引用
+    orphaned_path = content_store.release(db, photo.image_url)
+    
     # 删除作品
     db.delete(photo)
     db.commit()
+    similarity_index.remove([photo_id])
+    await invalidate_photo_cache([photo_id])
+    content_store.remove_stored_files(orphaned_path)
     
     # 记录操作日志
     log_entry = SystemLog(
@@ -353,9 +375,16 @@ async def bulk_delete_photos(
     from models.models import Interaction
     db.query(Interaction).filter(Interaction.photo_id.in_(photo_ids)).delete()
     
+    # 释放原图引用
+    orphaned_paths = [content_store.release(db, photo.image_url) for photo in photos]
+    
     # 删除作品
     deleted_count = db.query(Photo).filter(Photo.id.in_(photo_ids)).delete(synchronize_session=False)
     db.commit()
+    similarity_index.remove(photo_ids)
+    await invalidate_photo_cache(photo_ids)
+    for path in orphaned_paths:
+        content_store.remove_stored_files(path)
     
     # 记录操作日志
     log_entry = SystemLog(
@@ -500,6 +529,7 @@ async def update_photo_analysis(
         photo.updated_at = datetime.utcnow()
         
         db.commit()
+        await invalidate_photo_cache([photo_id])
         
         return {
             "message": "分析结果更新成功",
@@ -605,6 +635,12 @@ async def approve_photo(
         db.commit()
         db.refresh(photo)
         
+        if photo.is_approved:
+            similarity_index.submit(photo.id, local_path_from_url(photo.image_url))
+        else:
+            similarity_index.remove([photo.id])
+        await invalidate_photo_cache([photo.id])
+        
         return PhotoApprovalResponse(
             id=photo.id,
             approval_status=photo.approval_status,
@@ -627,6 +663,22 @@ async def approve_photo(
         )
 
 
+@router.get("/analysis/stats")
+async def get_analysis_statistics(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """获取图像分析队列和结果缓存的统计信息"""
+    return {
+        "queue": analysis_queue.get_stats(),
+        "cache": analysis_cache.get_stats(db),
+        "yolo_batching": yolo_classifier.get_batching_stats(),
+        "inference_pool": inference_pool.get_stats(),
+        "cascade": cascade_stats.get_stats(),
+        "similarity": similarity_index.get_stats()
+    }
+
+
 @router.get("/photos/approval-stats")
 async def get_approval_statistics(
     current_user: User = Depends(require_admin),
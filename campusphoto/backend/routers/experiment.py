@@ -2,6 +2,7 @@
 实验用API路由 - 支持6种缓存策略对比测试
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -15,8 +16,14 @@ from utils.cache_strategies import (
     CacheStrategy, 
     cache_manager, 
     invalidate_cache, 
-    clear_all_cache
+    clear_all_cache,
+    load_photo_detail,
+    cache_key,
+    RANKINGS_TAG,
+    MISS
 )
+from utils.loop_monitor import loop_monitor
+from utils.counter_buffer import counter_buffer
 
 router = APIRouter()
 
@@ -30,10 +37,13 @@ CACHE_STRATEGIES = {
     "hybrid": "混合策略"
 }
 
+# 排行榜缓存秒数
+RANKINGS_TTL = 60
+
 @router.get("/status")
 async def get_experiment_status():
     """获取实验状态"""
-    stats = cache_manager.get_stats()
+    stats = await cache_manager.get_stats()
     return {
         "current_strategy": "未设置",
         "cache_stats": stats,
@@ -49,8 +59,8 @@ async def set_cache_strategy(strategy_name: str):
             detail=f"不支持的策略: {strategy_name}"
         )
     
-    # 清空现有缓存
-    clear_all_cache()
+    # 清空现有缓存（递增全局代数，O(1)）
+    await clear_all_cache()
     
     return {
         "message": f"已切换到策略: {CACHE_STRATEGIES[strategy_name]}",
@@ -121,25 +131,7 @@ async def get_photo_experiment(
 
 async def _get_photo_baseline(photo_id: int, db: Session):
     """策略1: 无缓存基准 - 直接查询数据库"""
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if not photo:
-        return None
-    
-    return {
-        "id": photo.id,
-        "title": photo.title,
-        "description": photo.description,
-        "image_url": photo.image_url,
-        "theme": photo.theme,
-        "likes": photo.likes,
-        "views": photo.views,
-        "heat_score": float(photo.heat_score or 0),
-        "user": {
-            "id": photo.user.id,
-            "username": photo.user.username,
-            "avatar_url": photo.user.avatar_url
-        }
-    }
+    return await run_in_threadpool(load_photo_detail, photo_id, db)
 
 @router.get("/rankings/photos")
 async def get_photo_rankings_experiment(
@@ -179,6 +171,10 @@ async def get_photo_rankings_experiment(
 
 async def _get_rankings_baseline(period: str, limit: int, db: Session):
     """策略1: 无缓存基准 - 直接查询数据库"""
+    return await run_in_threadpool(_query_rankings, period, limit, db)
+
+def _query_rankings(period: str, limit: int, db: Session):
+    """按热度查询排行榜（同步，在线程池中执行）"""
     # 计算时间范围
     now = datetime.utcnow()
     if period == "week":
@@ -237,24 +233,50 @@ async def _get_rankings_baseline(period: str, limit: int, db: Session):
     return result
 
 async def _get_rankings_cached(strategy: str, period: str, limit: int, db: Session):
-    """缓存策略排行榜查询"""
-    # 这里可以实现不同的缓存策略
-    # 为了简化，先使用基础查询
-    return await _get_rankings_baseline(period, limit, db)
+    """缓存策略排行榜查询（各策略共用 L1 + Redis 两级缓存，排行榜允许 1 分钟延迟）"""
+    async def loader(session: Session):
+        return await _get_rankings_baseline(period, limit, session)
+    
+    result, source = await cache_manager.get_or_load(
+        cache_key("rankings", period, limit), loader, RANKINGS_TTL, [RANKINGS_TAG]
+    )
+    if source == MISS:
+        cache_manager.cache_stats['misses'] += 1
+    else:
+        cache_manager.cache_stats['hits'] += 1
+    return result
 
 @router.post("/cache/invalidate")
-async def invalidate_experiment_cache(pattern: str = Query("*", description="缓存键模式")):
-    """手动失效缓存"""
-    invalidate_cache(pattern)
+async def invalidate_experiment_cache(
+    tag: List[str] = Query(..., description="缓存标签，如 photo:1、rankings、all")
+):
+    """手动失效带有指定标签的缓存"""
+    generations = await invalidate_cache(*tag)
     return {
-        "message": f"缓存已失效: {pattern}",
+        "message": f"缓存已失效: {', '.join(tag)}",
+        "generations": generations,
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@router.post("/cache/sweep")
+async def sweep_experiment_cache():
+    """立即用 SCAN 清理已失效的缓存条目"""
+    try:
+        result = await cache_manager.sweep_stale_entries()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"缓存清理失败: {str(e)}"
+        )
+    return {
+        "message": "已失效的缓存条目清理完成",
+        **result
+    }
+
 @router.post("/cache/clear")
 async def clear_experiment_cache():
     """清空所有缓存"""
-    clear_all_cache()
+    await clear_all_cache()
     return {
         "message": "所有缓存已清空",
         "timestamp": datetime.utcnow().isoformat()
@@ -263,11 +285,22 @@ async def clear_experiment_cache():
 @router.get("/metrics")
 async def get_experiment_metrics():
     """获取实验指标"""
-    stats = cache_manager.get_stats()
+    stats = await cache_manager.get_stats()
     return {
         "cache_stats": stats,
+        "event_loop": loop_monitor.get_stats(),
+        "counters": counter_buffer.get_stats(),
         "system_info": {
             "timestamp": datetime.utcnow().isoformat(),
             "available_strategies": list(CACHE_STRATEGIES.keys())
         }
     }
+
+@router.post("/metrics/reset")
+async def reset_experiment_metrics():
+    """清空事件循环延迟采样，压测开始前调用"""
+    loop_monitor.reset()
+    return {
+        "message": "事件循环延迟采样已清空",
+        "timestamp": datetime.utcnow().isoformat()
+    }
@@ -2,27 +2,46 @@
 作品相关路由
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func
 from typing import List, Optional
 import os
-import tempfile
-import shutil
-import time
 from datetime import datetime
 
 from models.database import get_db
-from models.models import User, Photo, Interaction, Competition
+from models.models import User, Photo, PhotoAnalysis, Interaction, Competition
 from models.schemas import (
     PhotoCreate, PhotoInDB, PhotoDetail, PhotoUpdate, InteractionCreate,
-    MessageResponse, PaginationParams, PaginatedResponse
+    MessageResponse, PaginationParams, PaginatedResponse, PhotoAnalysisStatus, SimilarPhoto
 )
 from utils.auth import get_current_active_user, get_current_user, require_photographer, check_resource_owner
 from utils.image_analyzer import image_analyzer
+from utils.analysis_queue import analysis_queue, local_path_from_url
+from utils.analysis_cache import analysis_cache
+from utils.inference_pool import inference_pool
+from utils.upload_storage import remove_quietly, FileTooLargeError
+from utils.content_store import stage_upload
+from utils import content_store
+from utils.thumbnails import generate_derivatives, derivative_name, get_thumbnail_sizes
 from utils.config_manager import get_config_manager
+from utils.similarity_index import similarity_index
+from utils.cache_strategies import invalidate_photo_cache
+from utils.counter_buffer import counter_buffer
 
 router = APIRouter()
 
+# 交互类型对应的作品计数字段
+INTERACTION_COUNTERS = {
+    "like": "likes",
+    "favorite": "favorites",
+    "vote": "votes",
+    "view": "views"
+}
+
+# 作品列表等页面使用的缩略图尺寸
+DEFAULT_THUMBNAIL_SIZE = 300
+
 
 @router.post("/upload", response_model=List[PhotoInDB])
 async def upload_photos(
@@ -83,8 +102,8 @@ async def upload_photos(
     allowed_extensions = config_manager.get_allowed_extensions()
     
     for file in files:
-        # 检查文件大小
-        if file.size > max_size:
+        # 检查声明的文件大小（实际大小在流式保存时再次校验）
+        if file.size is not None and file.size > max_size:
             raise HTTPException(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                 detail=f"文件 {file.filename} 大小超过限制 ({max_size} bytes)"
@@ -122,44 +141,43 @@ async def upload_photos(
     
     # 处理每个文件
     uploaded_photos = []
-    temp_files = []
+    pending_jobs = []
+    saved_files = []
+    
+    thumbnail_dir = "static/thumbnails"
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    thumbnail_sizes = sorted(set(get_thumbnail_sizes()) | {DEFAULT_THUMBNAIL_SIZE})
+    # 模型尚未就绪时版本未知（None），不查询分析缓存，直接排队由后台任务分析
+    analyzer_version = inference_pool.get_version()
     
     try:
         for i, file in enumerate(files):
-            # 保存临时文件
             file_ext = file.filename.split('.')[-1].lower()
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_ext}")
-            contents = await file.read()
-            temp_file.write(contents)
-            temp_file.close()
-            temp_files.append(temp_file.name)
             
-            # 图像分析
-            analysis_result = image_analyzer.analyze_image(temp_file.name)
+            # 流式写入暂存区，边写边校验大小并计算内容哈希
+            try:
+                staging_path, content_hash, size = await stage_upload(file, max_size)
+            except FileTooLargeError:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"文件 {file.filename} 大小超过限制 ({max_size} bytes)"
+                )
             
-            # 创建缩略图
-            thumbnail_path = image_analyzer.create_thumbnail(temp_file.name)
+            # 相同内容只保存一份，已存在时仅增加引用计数
+            stored, is_new = content_store.commit_staged(db, staging_path, content_hash, file_ext, size)
+            if is_new:
+                saved_files.append(stored.storage_path)
             
-            # 保存文件到本地
-            upload_dir = "static/uploads"
-            thumbnail_dir = "static/thumbnails"
-            os.makedirs(upload_dir, exist_ok=True)
-            os.makedirs(thumbnail_dir, exist_ok=True)
-            
-            # 生成唯一文件名
-            file_ext = file.filename.split('.')[-1].lower()
-            unique_filename = f"{os.path.splitext(file.filename)[0]}_{i}_{int(time.time())}.{file_ext}"
-            
-            # 保存原图
-            final_image_path = os.path.join(upload_dir, unique_filename)
-            shutil.copy2(temp_file.name, final_image_path)
-            
-            # 保存缩略图
-            final_thumbnail_path = os.path.join(thumbnail_dir, f"{os.path.splitext(unique_filename)[0]}_thumb_300x300.jpg")
-            shutil.copy2(thumbnail_path, final_thumbnail_path)
+            # 生成多尺寸缩略图（同一内容共用缩略图）
+            final_thumbnail_path = os.path.join(thumbnail_dir, derivative_name(content_hash, DEFAULT_THUMBNAIL_SIZE))
+            if not os.path.exists(final_thumbnail_path):
+                derivatives = await run_in_threadpool(
+                    generate_derivatives, stored.storage_path, thumbnail_dir, thumbnail_sizes
+                )
+                saved_files.extend(path for paths in derivatives.values() for path in paths.values())
             
             # 设置URL
-            image_url = f"/static/uploads/{unique_filename}"
+            image_url = content_store.url_for(stored)
             thumbnail_url = f"/static/thumbnails/{os.path.basename(final_thumbnail_path)}"
             
             # 为每张图片创建单独的作品记录
@@ -172,13 +190,29 @@ async def upload_photos(
                 description=description,
                 image_url=image_url,
                 thumbnail_url=thumbnail_url,
-                theme=theme or analysis_result.get("theme"),  # 优先使用用户选择的主题
-                confidence=analysis_result.get("confidence"),
+                theme=theme,  # 优先使用用户选择的主题
                 competition_id=competition_id,
                 is_approved=False,  # 新上传的照片需要审核
                 approval_status="pending"  # 默认为待审核状态
             )
             
+            cached_analysis = analysis_cache.get(db, content_hash, analyzer_version) if analyzer_version else None
+            if cached_analysis:
+                # 相同内容已分析过（包括上传前的 analyze-for-upload），直接复用结果
+                photo.theme = theme or cached_analysis.get("theme")
+                photo.confidence = cached_analysis.get("confidence")
+                photo.analysis = PhotoAnalysis(
+                    status="completed",
+                    theme_locked=bool(theme),
+                    tags=cached_analysis.get("tags", []),
+                    result=cached_analysis,
+                    completed_at=datetime.utcnow()
+                )
+            else:
+                # 主题和置信度由后台分析任务补全
+                photo.analysis = PhotoAnalysis(status="queued", theme_locked=bool(theme))
+                pending_jobs.append((photo, stored.storage_path))
+            
             db.add(photo)
             uploaded_photos.append(photo)
         
@@ -188,20 +222,68 @@ async def upload_photos(
         for photo in uploaded_photos:
             db.refresh(photo)
         
+        # 提交后台分析任务
+        for photo, image_path in pending_jobs:
+            analysis_queue.submit(photo.id, image_path)
+        
         return [PhotoInDB.model_validate(photo) for photo in uploaded_photos]
         
+    except HTTPException:
+        db.rollback()
+        for path in saved_files:
+            remove_quietly(path)
+        raise
     except Exception as e:
-        # 如果出错，回滚数据库事务
+        # 如果出错，回滚数据库事务并清理已保存的文件
         db.rollback()
+        for path in saved_files:
+            remove_quietly(path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"图片处理失败: {str(e)}"
         )
-    finally:
-        # 清理临时文件
-        for temp_file_path in temp_files:
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+
+
+@router.get("/{photo_id}/analysis", response_model=PhotoAnalysisStatus)
+async def get_photo_analysis_status(
+    photo_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """查询作品的后台分析状态 - 供上传页面轮询"""
+    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    if not photo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="作品不存在"
+        )
+    
+    if not check_resource_owner(current_user, photo.user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限查看此作品的分析状态"
+        )
+    
+    record = photo.analysis
+    if record is None:
+        # 早期上传的作品在上传时已同步完成分析
+        return PhotoAnalysisStatus(
+            photo_id=photo.id,
+            status="completed" if photo.theme else "unknown",
+            theme=photo.theme,
+            confidence=photo.confidence
+        )
+    
+    return PhotoAnalysisStatus(
+        photo_id=photo.id,
+        status=record.status,
+        theme=photo.theme,
+        confidence=photo.confidence,
+        tags=record.tags or [],
+        error=record.error,
+        created_at=record.created_at,
+        completed_at=record.completed_at
+    )
 
 
 @router.get("/my-uploads", response_model=PaginatedResponse)
@@ -238,7 +320,7 @@ async def get_my_uploads(
     # 转换为响应模型
     photo_list = []
     for photo in photos:
-        photo_dict = PhotoInDB.model_validate(photo).model_dump()
+        photo_dict = counter_buffer.apply(photo.id, PhotoInDB.model_validate(photo).model_dump())
         photo_list.append(photo_dict)
     
     return PaginatedResponse.create(
@@ -289,7 +371,7 @@ async def get_photos(
     # 转换为响应模型，包含用户信息
     photo_list = []
     for photo in photos:
-        photo_dict = PhotoInDB.model_validate(photo).model_dump()
+        photo_dict = counter_buffer.apply(photo.id, PhotoInDB.model_validate(photo).model_dump())
         # 添加用户信息
         if photo.user:
             photo_dict['user'] = {
@@ -327,14 +409,14 @@ async def get_photo_detail(
             detail="作品不存在"
         )
     
-    # 增加浏览量
-    photo.views += 1
-    db.commit()
+    # 增加浏览量（批量写回数据库）
+    counter_buffer.add(photo.id, "views")
     
-    # 构建详细信息
+    # 构建详细信息，计数叠加尚未写回的增量
     photo_detail = PhotoDetail.model_validate(photo)
     photo_detail.user = photo.user
     photo_detail.competition = photo.competition
+    counter_buffer.apply(photo.id, photo_detail)
     
     # 设置默认的交互状态（未登录用户）
     photo_detail.is_liked = False
@@ -344,6 +426,49 @@ async def get_photo_detail(
     return photo_detail
 
 
+@router.get("/{photo_id}/similar", response_model=List[SimilarPhoto])
+async def get_similar_photos(
+    photo_id: int,
+    limit: int = Query(12, ge=1, le=50, description="返回的作品数"),
+    db: Session = Depends(get_db)
+):
+    """获取视觉上相似的作品（颜色、纹理和构图接近）"""
+    photo = db.query(Photo).filter(
+        Photo.id == photo_id,
+        Photo.is_approved == True
+    ).first()
+    
+    if not photo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="作品不存在"
+        )
+    
+    try:
+        # 多取一些，索引里可能还留有刚被拒绝或删除的作品
+        matches = await run_in_threadpool(
+            similarity_index.similar_to, photo.id, local_path_from_url(photo.image_url), limit * 2
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"相似作品检索失败: {str(e)}"
+        )
+    
+    scores = dict(matches)
+    photos = {
+        p.id: p for p in db.query(Photo).filter(
+            Photo.id.in_(list(scores)),
+            Photo.is_approved == True
+        ).all()
+    } if scores else {}
+    
+    return [
+        SimilarPhoto(**PhotoInDB.model_validate(photos[similar_id]).model_dump(), similarity=round(score, 4))
+        for similar_id, score in matches if similar_id in photos
+    ][:limit]
+
+
 @router.put("/{photo_id}", response_model=PhotoInDB)
 async def update_photo(
     photo_id: int,
@@ -381,6 +506,7 @@ async def update_photo(
     
     db.commit()
     db.refresh(photo)
+    await invalidate_photo_cache([photo_id])
     
     return PhotoInDB.model_validate(photo)
 
@@ -417,9 +543,17 @@ async def delete_photo(
     # 删除相关交互记录
     db.query(Interaction).filter(Interaction.photo_id == photo_id).delete()
     
+    # 释放原图引用
+    orphaned_path = content_store.release(db, photo.image_url)
+    
     # 删除作品
     db.delete(photo)
     db.commit()
+    similarity_index.remove([photo_id])
+    await invalidate_photo_cache([photo_id])
+    
+    # 已无作品引用的原图在提交后删除
+    content_store.remove_stored_files(orphaned_path)
     
     return MessageResponse(message="作品删除成功")
 
@@ -453,16 +587,11 @@ async def interact_with_photo(
         else:
             # 取消交互
             db.delete(existing_interaction)
-            
-            # 更新计数
-            if interaction.type == "like":
-                photo.likes = max(0, photo.likes - 1)
-            elif interaction.type == "favorite":
-                photo.favorites = max(0, photo.favorites - 1)
-            elif interaction.type == "vote":
-                photo.votes = max(0, photo.votes - 1)
-            
             db.commit()
+            
+            # 更新计数（批量写回数据库，浏览量不随取消减少）
+            if interaction.type != "view":
+                counter_buffer.add(photo_id, INTERACTION_COUNTERS[interaction.type], -1)
             return MessageResponse(message=f"已取消{interaction.type}")
     else:
         # 创建新交互
@@ -472,18 +601,10 @@ async def interact_with_photo(
             type=interaction.type
         )
         db.add(new_interaction)
-        
-        # 更新计数
-        if interaction.type == "like":
-            photo.likes += 1
-        elif interaction.type == "favorite":
-            photo.favorites += 1
-        elif interaction.type == "vote":
-            photo.votes += 1
-        elif interaction.type == "view":
-            photo.views += 1
-        
         db.commit()
+        
+        # 更新计数（批量写回数据库）
+        counter_buffer.add(photo_id, INTERACTION_COUNTERS[interaction.type])
         return MessageResponse(message=f"已{interaction.type}")
 
 
@@ -503,6 +624,8 @@ async def approve_photo(
     
     photo.is_approved = True
     db.commit()
+    similarity_index.submit(photo.id, local_path_from_url(photo.image_url))
+    await invalidate_photo_cache([photo.id])
     
     return MessageResponse(message="作品审核通过")
 
@@ -523,6 +646,8 @@ async def reject_photo(
     
     photo.is_approved = False
     db.commit()
+    similarity_index.remove([photo.id])
+    await invalidate_photo_cache([photo.id])
     
     return MessageResponse(message="作品审核拒绝")
 
@@ -554,7 +679,8 @@ async def get_theme_categories():
 @router.post("/analyze-for-upload")
 async def analyze_image_for_upload(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ):
     """分析图片并提供智能推荐分类"""
     try:
@@ -565,34 +691,43 @@ async def analyze_image_for_upload(
                 detail="请上传图片文件"
             )
         
-        # 保存临时文件
-        file_ext = file.filename.split('.')[-1].lower()
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_ext}")
-        contents = await file.read()
-        temp_file.write(contents)
-        temp_file.close()
+        # 上传内容已由框架暂存，直接在内存中解码，不再另存临时文件
+        max_size = get_config_manager().get_max_file_size()
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
+        if file_size > max_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"文件大小超过限制 ({max_size} bytes)"
+            )
         
-        try:
-            # 使用混合分类器进行分析
-            analysis_result = image_analyzer.analyze_image(temp_file.name)
-            
-            # 返回推荐结果
-            return {
-                "recommended_theme": analysis_result.get("theme", "人像"),
-                "confidence": analysis_result.get("confidence", 0.6),
-                "available_themes": list(image_analyzer.theme_mapping.values()),
-                "smart_tags": analysis_result.get("tags", []),
-                "analysis_details": {
-                    "dominant_colors": analysis_result.get("dominant_colors", []),
-                    "quality_score": analysis_result.get("quality_score", 0.5),
-                    "composition": analysis_result.get("composition", {})
-                }
+        # 按内容哈希查询缓存，随后上传同一文件时也会命中
+        content_hash = await run_in_threadpool(content_store.hash_stream, file.file)
+        # 模型尚未就绪时版本未知，不查询也不写入缓存，直接分析
+        analyzer_version = inference_pool.get_version()
+        analysis_result = analysis_cache.get(db, content_hash, analyzer_version) if analyzer_version else None
+        if analysis_result is None:
+            # 使用混合分类器进行分析（在推理进程池中执行，避免阻塞事件循环）
+            analysis_result = await run_in_threadpool(inference_pool.analyze_image, file.file)
+            if analyzer_version:
+                analysis_cache.put(db, content_hash, analyzer_version, analysis_result)
+                db.commit()
+        
+        # 返回推荐结果
+        return {
+            "recommended_theme": analysis_result.get("theme", "人像"),
+            "confidence": analysis_result.get("confidence", 0.6),
+            "available_themes": list(image_analyzer.theme_mapping.values()),
+            "smart_tags": analysis_result.get("tags", []),
+            "analysis_details": {
+                "dominant_colors": analysis_result.get("dominant_colors", []),
+                "quality_score": analysis_result.get("quality_score", 0.5),
+                "composition": analysis_result.get("composition", {})
             }
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
+        }
                 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"图片分析失败: {str(e)}")
         raise HTTPException(
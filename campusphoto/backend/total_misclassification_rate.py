@@ -2,46 +2,36 @@
 """
 计算相对于总图片数的误判率
 """
-import json
+import sys
 from pathlib import Path
-from collections import Counter
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
 ERROR_JSON = BACKEND_DIR / "error_cases.json"
+sys.path.insert(0, str(BACKEND_DIR))
 
-def get_total_image_count():
-    """统计总图片数量"""
-    cases = load_error_cases()
-    if not cases:
-        return 0, {}
-    
-    # 统计各主题的总图片数（包括正确和错误的）
-    theme_counts = Counter()
-    total_images = len(cases)
-    
-    for case in cases:
-        if isinstance(case, dict):
-            expected = case.get("expected_theme", "")
-            if expected:
-                theme_counts[expected] += 1
-    
-    return total_images, dict(theme_counts)
+from utils.error_case_store import open_store  # noqa: E402
 
-def load_error_cases():
-    """加载所有案例数据"""
-    if not ERROR_JSON.exists():
+def load_error_store():
+    """打开错误案例存储（error_cases.json 变化时自动重新导入）"""
+    store = open_store(ERROR_JSON)
+    if store is None:
         print(f"❌ 文件不存在: {ERROR_JSON}")
-        return []
-    
-    with open(ERROR_JSON, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    return data if isinstance(data, list) else []
+    return store
 
 def calculate_misclassification_rates():
     """计算相对于总图片数的误判率"""
-    total_images, theme_counts = get_total_image_count()
+    store = load_error_store()
+    if store is None:
+        return
+    
+    # 统计总图片数和各主题的图片数（包括正确和错误的）
+    with store:
+        total_images = store.count()
+        theme_counts = dict(store.theme_counts())
+        category_stats = store.confusion_counts()
+    if not total_images:
+        return
     
     # 用户提供的样本统计
     SAMPLE_STATS = {
@@ -54,23 +44,6 @@ def calculate_misclassification_rates():
         "人像->街景": {"ai_error": 48, "dataset_error": 50, "total": 98},
     }
     
-    # 分析错误分类
-    cases = load_error_cases()
-    category_stats = {}
-    
-    for case in cases:
-        if not isinstance(case, dict):
-            continue
-            
-        expected = case.get("expected_theme", "")
-        predicted = case.get("predicted_theme", "")
-        
-        if expected and predicted and expected != predicted:
-            key = f"{expected}->{predicted}"
-            if key not in category_stats:
-                category_stats[key] = []
-            category_stats[key].append(case)
-    
     print(f"📊 总图片数量: {total_images}")
     print(f"📈 各主题图片分布:")
     for theme, count in sorted(theme_counts.items(), key=lambda x: x[1], reverse=True):
@@ -85,11 +58,8 @@ def calculate_misclassification_rates():
     total_ai_errors = 0
     total_dataset_errors = 0
     
-    # 按错误数排序
-    sorted_categories = sorted(category_stats.items(), key=lambda x: len(x[1]), reverse=True)
-    
-    for category, cases in sorted_categories:
-        error_count = len(cases)
+    # 按错误数排序（已按数量降序）
+    for category, error_count in category_stats.items():
         total_errors += error_count
         
         if category in SAMPLE_STATS:
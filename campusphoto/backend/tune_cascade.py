@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+用已标注的错误样例调整分类器级联阈值
+
+对 error_cases.json 中的样例（file_path + expected_theme）各运行一次传统特征投票和 YOLO，
+然后离线枚举阈值组合，模拟级联的决策：报告每组阈值下的准确率、由传统特征直接决定的比例
+（即省下的 YOLO 调用）以及平均耗时，结果可写入 image_processing.classifier_cascade。
+
+用法:
+    python tune_cascade.py                     # 随机抽取 300 个样例
+    python tune_cascade.py --limit 1000 --seed 1
+    python tune_cascade.py --cases other_cases.json
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / "campusphoto" / "backend"
+ERROR_JSON = BACKEND_DIR / "error_cases.json"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from evaluate_classifier import LABEL_ALIASES  # noqa: E402
+from utils.hybrid_image_classifier import hybrid_classifier, LEGACY_THEME_ALIASES  # noqa: E402
+from utils.image_pipeline import DecodedImage, get_analysis_max_edges  # noqa: E402
+from utils.model_registry import model_registry  # noqa: E402
+from utils.yolo_image_classifier import yolo_classifier  # noqa: E402
+
+
+FEATURES_THRESHOLDS = [0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9]
+MIN_AGREEMENTS = [2, 3]
+YOLO_THRESHOLDS = [0.0, 0.3, 0.5]
+
+
+def load_samples(cases_path: Path, limit: int, seed: int):
+    """读取可用的样例 [(路径, 期望主题)]"""
+    with open(cases_path, 'r', encoding='utf-8') as f:
+        cases = json.load(f)
+    samples = []
+    for case in cases if isinstance(cases, list) else []:
+        path = case.get("file_path") or case.get("path")
+        expected = case.get("expected_theme", "")
+        expected = LABEL_ALIASES.get(expected, expected)
+        if path and expected in hybrid_classifier.subcategory_mapping and Path(path).exists():
+            samples.append((path, expected))
+    random.Random(seed).shuffle(samples)
+    return samples[:limit]
+
+
+def run_stages(path: str) -> dict:
+    """对一张图分别运行各阶段，记录结果和耗时"""
+    image = DecodedImage.open(path).level(get_analysis_max_edges().get("classification"))
+
+    start = time.perf_counter()
+    vote = hybrid_classifier._features_vote(image)
+    features_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    yolo = yolo_classifier.classify_array(image.bgr)
+    yolo_ms = (time.perf_counter() - start) * 1000
+
+    traditional = hybrid_classifier._traditional_classification(image.features)
+    return {
+        "vote": vote,
+        "yolo": yolo if yolo['method'] == 'yolo' and yolo.get('detections') else None,
+        "traditional_theme": LEGACY_THEME_ALIASES.get(traditional["theme"], traditional["theme"]),
+        "features_ms": features_ms,
+        "yolo_ms": yolo_ms
+    }
+
+
+def simulate(record: dict, features_threshold: float, min_agreement: int, yolo_threshold: float):
+    """按给定阈值模拟级联，返回 (最终主题, 决定阶段)"""
+    vote = record["vote"]
+    if vote and len(vote["methods_used"]) >= min_agreement and vote["confidence"] >= features_threshold:
+        return vote["theme"], "features"
+    yolo = record["yolo"]
+    if yolo and yolo["confidence"] >= yolo_threshold:
+        return yolo["theme"], "yolo"
+    return (yolo["theme"] if yolo else record["traditional_theme"]), "fallback"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分类器级联阈值调整")
+    parser.add_argument("--cases", type=Path, default=ERROR_JSON, help="标注样例 JSON")
+    parser.add_argument("--limit", type=int, default=300, help="最多使用的样例数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--top", type=int, default=15, help="输出的阈值组合数")
+    args = parser.parse_args()
+
+    if not args.cases.exists():
+        print(f"文件不存在: {args.cases}")
+        sys.exit(1)
+    samples = load_samples(args.cases, args.limit, args.seed)
+    if not samples:
+        print("没有可用的样例（文件不存在或标签无法对应到当前分类体系）")
+        sys.exit(1)
+
+    # 先加载并预热模型，避免计入首个样例的耗时
+    model_registry.load_all()
+    print(f"运行 {len(samples)} 个样例...")
+    records = []
+    for i, (path, expected) in enumerate(samples, 1):
+        try:
+            record = run_stages(path)
+        except Exception as e:
+            print(f"  跳过 {path}: {e}")
+            continue
+        record["expected"] = expected
+        records.append(record)
+        if i % 50 == 0:
+            print(f"  {i}/{len(samples)}")
+
+    features_ms = sum(r["features_ms"] for r in records) / len(records)
+    yolo_ms = sum(r["yolo_ms"] for r in records) / len(records)
+    print(f"\n平均耗时: 传统特征 {features_ms:.1f}ms, YOLO {yolo_ms:.1f}ms\n")
+
+    rows = []
+    for features_threshold, min_agreement, yolo_threshold in itertools.product(
+            FEATURES_THRESHOLDS, MIN_AGREEMENTS, YOLO_THRESHOLDS):
+        correct = skipped = 0
+        for record in records:
+            theme, stage = simulate(record, features_threshold, min_agreement, yolo_threshold)
+            correct += theme == record["expected"]
+            skipped += stage == "features"
+        skip_rate = skipped / len(records)
+        avg_ms = features_ms + (1 - skip_rate) * yolo_ms
+        rows.append((correct / len(records), skip_rate, avg_ms, features_threshold, min_agreement, yolo_threshold))
+
+    rows.sort(key=lambda row: (-row[0], -row[1]))
+    print(f"{'准确率':>8}{'跳过YOLO':>10}{'平均ms':>9}  features_threshold  min_agreement  yolo_threshold")
+    for accuracy, skip_rate, avg_ms, features_threshold, min_agreement, yolo_threshold in rows[:args.top]:
+        print(f"{accuracy:>8.1%}{skip_rate:>10.1%}{avg_ms:>9.1f}  {features_threshold:>18}  {min_agreement:>13}  {yolo_threshold:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ import torch.nn as nn
 from typing import Dict, List, Tuple, Optional
 import cv2
 
+from .model_registry import model_registry
+
 logger = logging.getLogger(__name__)
 
 class AIImageClassifier:
@@ -19,18 +21,23 @@ class AIImageClassifier:
     
     def __init__(self):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = None
         self.transform = None
         self.class_labels = {}
-        self._load_model()
+        # 模型由注册表在首次使用时加载
+        model_registry.register("resnet50", self._load_model, warmup=self._warmup, version=lambda: "resnet50-imagenet1k-v2")
+    
+    @property
+    def model(self):
+        """已加载的模型，首次访问时加载；不可用时为 None"""
+        return model_registry.get("resnet50")
     
     def _load_model(self):
-        """加载预训练模型"""
+        """加载预训练模型，失败时返回 None"""
         try:
             # 使用ResNet50预训练模型
-            self.model = resnet50(weights=ResNet50_Weights.IMAGENET1K_V2)
-            self.model.eval()
-            self.model.to(self.device)
+            model = resnet50(weights=ResNet50_Weights.IMAGENET1K_V2)
+            model.eval()
+            model.to(self.device)
             
             # 图像预处理
             self.transform = transforms.Compose([
@@ -45,10 +52,16 @@ class AIImageClassifier:
             self.class_labels = self._load_imagenet_labels()
             
             logger.info("AI图像分类器加载成功")
+            return model
             
         except Exception as e:
             logger.error(f"AI模型加载失败: {str(e)}")
-            self.model = None
+            return None
+    
+    def _warmup(self, model):
+        """用一张空白图完成首次推理的初始化"""
+        with torch.no_grad():
+            model(torch.zeros(1, 3, 224, 224, device=self.device))
     
     def _load_imagenet_labels(self) -> Dict[int, str]:
         """加载ImageNet类别标签"""
@@ -185,8 +198,19 @@ class AIImageClassifier:
             return self._fallback_classification()
         
         try:
-            # 加载和预处理图像
             image = Image.open(image_path).convert('RGB')
+        except Exception as e:
+            logger.error(f"AI图像分类失败: {str(e)}")
+            return self._fallback_classification()
+        return self.classify_pil(image)
+    
+    def classify_pil(self, image: Image.Image) -> Dict:
+        """对已解码的RGB图像分类"""
+        if not self.model:
+            return self._fallback_classification()
+        
+        try:
+            # 预处理图像
             input_tensor = self.transform(image).unsqueeze(0).to(self.device)
             
             # 模型推理
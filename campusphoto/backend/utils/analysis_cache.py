@@ -0,0 +1,81 @@
+"""
+图像分析结果缓存
+
+以 (内容哈希, 分析器版本) 为键把完整分析结果保存在 analysis_results 表中。
+上传前的 analyze-for-upload 与上传后的后台分析任务共用，同一张图只分析一次；
+分析流程、模型或参数变化时版本号随之改变，旧结果自然不再命中。
+"""
+from typing import Any, Dict, Optional
+import json
+import logging
+import threading
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.models import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+def to_jsonable(data: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉numpy等不可序列化的类型，便于写入JSON列"""
+    return json.loads(json.dumps(data, default=str))
+
+
+class AnalysisCache:
+    """分析结果缓存"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0
+        }
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, db: Session, content_hash: str, analyzer_version: str) -> Optional[Dict[str, Any]]:
+        """查询缓存的分析结果"""
+        row = db.query(AnalysisResult.result).filter(
+            AnalysisResult.content_hash == content_hash,
+            AnalysisResult.analyzer_version == analyzer_version
+        ).first()
+        self._count("hits" if row is not None else "misses")
+        return row.result if row is not None else None
+
+    def put(self, db: Session, content_hash: str, analyzer_version: str, result: Dict[str, Any]):
+        """保存分析结果（由调用方提交事务），分析失败的占位结果不保存"""
+        if result.get("is_fallback"):
+            return
+        try:
+            with db.begin_nested():
+                db.add(AnalysisResult(
+                    content_hash=content_hash,
+                    analyzer_version=analyzer_version,
+                    result=result
+                ))
+        except IntegrityError:
+            # 并发分析了相同内容，覆盖为最新结果
+            db.query(AnalysisResult).filter(
+                AnalysisResult.content_hash == content_hash,
+                AnalysisResult.analyzer_version == analyzer_version
+            ).update({AnalysisResult.result: result}, synchronize_session=False)
+        self._count("stores")
+
+    def get_stats(self, db: Optional[Session] = None) -> Dict[str, Any]:
+        """获取命中统计，传入 db 时附带缓存条目数"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        if db is not None:
+            stats["entries"] = db.query(AnalysisResult).count()
+        return stats
+
+
+# 全局分析结果缓存实例
+analysis_cache = AnalysisCache()
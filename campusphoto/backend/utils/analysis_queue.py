@@ -0,0 +1,160 @@
+"""
+后台图像分析队列
+
+上传接口只负责落盘和写入作品记录，主题、置信度和标签由这里的线程池异步补全，
+前端通过 GET /api/photos/{photo_id}/analysis 轮询状态。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional
+import logging
+import os
+import threading
+
+from config import settings
+from models.database import SessionLocal
+from models.models import PhotoAnalysis
+from . import content_store
+from .analysis_cache import analysis_cache
+
+logger = logging.getLogger(__name__)
+
+
+def local_path_from_url(image_url: str) -> str:
+    """将 /static/... 形式的URL转换为本地文件路径"""
+    return image_url.lstrip("/")
+
+
+class AnalysisQueue:
+    """图像分析任务队列"""
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0
+        }
+
+    def _count(self, key: str):
+        # 多个工作线程同时更新统计
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="photo-analysis"
+                )
+            return self._executor
+
+    def start(self):
+        """启动工作线程，并重新提交上次未完成的任务"""
+        self._ensure_executor()
+
+        db = SessionLocal()
+        try:
+            unfinished = db.query(PhotoAnalysis).filter(
+                PhotoAnalysis.status.in_(["queued", "processing"])
+            ).all()
+            for record in unfinished:
+                record.status = "queued"
+                self.submit(record.photo_id, local_path_from_url(record.photo.image_url))
+            db.commit()
+            if unfinished:
+                logger.info(f"重新提交 {len(unfinished)} 个未完成的分析任务")
+        except Exception as e:
+            logger.error(f"恢复分析任务失败: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def shutdown(self, wait: bool = True):
+        """停止工作线程"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def submit(self, photo_id: int, image_path: str):
+        """提交分析任务"""
+        self._ensure_executor().submit(self._run, photo_id, image_path)
+        self._count("submitted")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计信息"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            "workers": self.max_workers,
+            "running": self._executor is not None,
+            **stats
+        }
+
+    def _run(self, photo_id: int, image_path: str):
+        """执行单个分析任务（在工作线程中运行）"""
+        # 在线程内导入，避免加载路由时就初始化模型
+        from utils.inference_pool import inference_pool
+
+        db = SessionLocal()
+        try:
+            record = db.query(PhotoAnalysis).filter(PhotoAnalysis.photo_id == photo_id).first()
+            if record is None:
+                # 作品已被删除
+                return
+
+            record.status = "processing"
+            record.started_at = datetime.utcnow()
+            record.attempts = (record.attempts or 0) + 1
+            db.commit()
+
+            photo = record.photo
+            content_hash = content_store.hash_from_url(photo.image_url)
+
+            # 相同内容可能已由其他任务或 analyze-for-upload 分析过
+            analyzer_version = inference_pool.get_version(wait=True)
+            analysis_result = analysis_cache.get(db, content_hash, analyzer_version) if content_hash else None
+            if analysis_result is None:
+                if not os.path.exists(image_path):
+                    raise FileNotFoundError(f"图像文件不存在: {image_path}")
+                analysis_result = inference_pool.analyze_image(image_path)
+                if content_hash:
+                    analysis_cache.put(db, content_hash, analyzer_version, analysis_result)
+
+            if not record.theme_locked:
+                photo.theme = analysis_result.get("theme")
+            photo.confidence = analysis_result.get("confidence")
+
+            record.tags = analysis_result.get("tags", [])
+            record.result = analysis_result
+            record.status = "completed"
+            record.error = None
+            record.completed_at = datetime.utcnow()
+            db.commit()
+
+            self._count("completed")
+
+        except Exception as e:
+            logger.error(f"作品 {photo_id} 分析失败: {e}")
+            db.rollback()
+            self._count("failed")
+            try:
+                record = db.query(PhotoAnalysis).filter(PhotoAnalysis.photo_id == photo_id).first()
+                if record is not None:
+                    record.status = "failed"
+                    record.error = str(e)
+                    record.completed_at = datetime.utcnow()
+                    db.commit()
+            except Exception:
+                db.rollback()
+        finally:
+            db.close()
+
+
+# 全局分析队列实例
+analysis_queue = AnalysisQueue(max_workers=settings.analysis_workers)
@@ -1,46 +1,653 @@
 """
 Redis 缓存策略实现模块
 适配 M4 MacBook Air 单机部署环境
+
+所有缓存操作都通过 redis.asyncio 客户端在事件循环中异步等待，不阻塞其他请求；
+连接池大小、命令超时和空闲连接健康检查由 settings.redis_* 配置。
+Redis 超时或不可用时读取按未命中处理、写入跳过，请求回退到数据库。
+
+两级缓存：Redis 之前有进程内 LRU（L1，保存已解码的对象），命中时不再访问 Redis 也不再 json.loads。
+数据被改写或失效时通过 Redis 发布/订阅频道通知其他工作进程删除各自的 L1 条目；
+只有订阅在线时才使用 L1，每次（重新）订阅时清空 L1，订阅期间错过的消息不会导致读到旧数据。
+L1 条目最长存活 settings.cache_l1_ttl 秒。
+
+按标签失效：每个缓存条目带有若干标签（如 photo:{id}、rankings，以及所有条目共有的 all），
+Redis 中保存条目时一并记录写入时各标签的代数。失效某个标签只需 INCR 它的代数（O(1)），
+读取时值和代数一次 MGET 取回，代数不一致的条目按未命中处理；失效不再需要 KEYS 或 FLUSHALL。
+已失效的条目由后台 SCAN 清理或到期回收。
+
+防击穿：缓存未命中时同一进程内同一个键只有一个加载任务，其余请求等待它的结果；
+跨进程用 Redis 锁（SET NX PX）保证同一时刻只有一个进程查询数据库，其他进程等待其写入缓存。
+条目记录逻辑过期时间和加载耗时：逻辑过期后的 settings.cache_stale_ttl 秒内仍返回旧值并在后台刷新，
+过期前按 XFetch 算法以随加载耗时增大的概率提前刷新，热点键到期时不会有大量请求同时回源。
 """
-import redis
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 import json
 import asyncio
+import math
+import random
 import time
-from typing import Optional, Dict, Any, List
+import uuid
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Callable, Awaitable
 from datetime import datetime, timedelta
 from functools import wraps
 import logging
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from config import settings
-from models.database import get_db
+from models.database import get_db, SessionLocal
 from models.models import Photo, User
+from .local_cache import LocalLRUCache
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Redis 调用失败时捕获的异常（连接池等待超时也是 RedisError）
+REDIS_ERRORS = (RedisError, OSError, asyncio.TimeoutError)
+
+# 订阅断开后重连的最长等待秒数
+RESUBSCRIBE_MAX_DELAY = 30.0
+
+# 热度标记在本进程内的刷新间隔，间隔内的命中不再重复写 Redis
+HOT_MARK_REFRESH = 60.0
+
+# 缓存条目的键前缀，后台清理只扫描该前缀
+KEY_NAMESPACE = "cache"
+
+# 标签代数键前缀（代数键不设过期时间）
+GENERATION_PREFIX = "cachegen:"
+
+# 所有缓存条目共有的标签，递增它即清空全部缓存
+ALL_TAG = "all"
+
+# 排行榜缓存的标签，作品审核、删除后失效
+RANKINGS_TAG = "rankings"
+
+# 作品浏览量的标签（如 photo_views:1）：只有浏览量写回时失效，只用于读取时叠加计数缓冲区的条目
+PHOTO_VIEWS_TAG = "photo_views"
+
+# 多个工作进程时，每个清理周期只由取得该锁的进程执行
+SWEEP_LOCK_KEY = "cachesweep:lock"
+
+# 缓存重建锁的键前缀
+LOAD_LOCK_PREFIX = "cachelock:"
+
+# 未取得重建锁时检查缓存是否已写入的间隔秒数
+LOCK_POLL_INTERVAL = 0.05
+
+# get_or_load 返回的数据来源
+HIT, STALE, MISS = "hit", "stale", "miss"
+
+# 释放重建锁：只删除自己持有的锁，避免锁过期后误删其他进程的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 class RedisCacheManager:
     """Redis缓存管理器"""
     
     def __init__(self):
-        self.redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+        self._client: Optional[aioredis.Redis] = None
+        self.local = LocalLRUCache(settings.cache_l1_max_entries, settings.cache_l1_ttl)
+        self._hot_marks = LocalLRUCache(settings.cache_l1_max_entries, HOT_MARK_REFRESH)
+        # 本进程已知的标签代数，用于校验 L1 条目
+        self._generations = LocalLRUCache(settings.cache_l1_max_entries, settings.cache_l1_ttl)
+        # 失效消息带上来源，忽略本进程自己发出的消息
+        self.instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        # 本进程正在加载的键 -> 加载任务
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._release_lock = None
+        self._subscribed = False
+        self.last_sweep: Optional[Dict[str, Any]] = None
         self.cache_stats = {
             'hits': 0,
             'misses': 0,
             'sets': 0,
-            'deletes': 0
+            'deletes': 0,
+            'errors': 0,
+            'l2_hits': 0,
+            'l2_misses': 0,
+            'stale': 0,
+            'bumps': 0,
+            'loads': 0,
+            'coalesced': 0,
+            'lock_waits': 0,
+            'stale_served': 0,
+            'early_refreshes': 0,
+            'published': 0,
+            'received': 0
+        }
+    
+    @property
+    def redis_client(self) -> aioredis.Redis:
+        """异步客户端，首次使用时在当前事件循环中创建连接池"""
+        if self._client is None:
+            pool = aioredis.BlockingConnectionPool.from_url(
+                settings.redis_url,
+                max_connections=settings.redis_max_connections,
+                timeout=settings.redis_pool_timeout,
+                socket_timeout=settings.redis_socket_timeout,
+                socket_connect_timeout=settings.redis_connect_timeout,
+                health_check_interval=settings.redis_health_check_interval,
+                decode_responses=True
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+            self._release_lock = self._client.register_script(RELEASE_LOCK_SCRIPT)
+        return self._client
+    
+    def start(self):
+        """在当前事件循环中启动失效消息订阅和已失效条目的定期清理（应用启动时调用）"""
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done():
+            self._listener = loop.create_task(self._listen())
+        if settings.cache_sweep_interval > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = loop.create_task(self._sweep_periodically())
+    
+    async def close(self):
+        """停止后台任务并关闭连接池（应用关闭时调用）"""
+        tasks = [task for task in (self._listener, self._sweeper) if task is not None]
+        tasks.extend(self._inflight.values())
+        self._listener = self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+            await client.connection_pool.disconnect()
+    
+    def _record_error(self, operation: str, key: str, error: Exception):
+        self.cache_stats['errors'] += 1
+        logger.warning(f"Redis {operation} 失败: {key}, error: {error!r}")
+    
+    async def get(self, key: str) -> Optional[str]:
+        """读取缓存，失败时按未命中处理"""
+        try:
+            return await self.redis_client.get(key)
+        except REDIS_ERRORS as e:
+            self._record_error("GET", key, e)
+            return None
+    
+    async def mget(self, *keys: str) -> List[Optional[str]]:
+        """一次往返读取多个键，失败时全部按未命中处理"""
+        try:
+            return await self.redis_client.mget(keys)
+        except REDIS_ERRORS as e:
+            self._record_error("MGET", ",".join(keys), e)
+            return [None] * len(keys)
+    
+    async def setex(self, key: str, ttl: int, value: str) -> bool:
+        """写入缓存，失败时跳过"""
+        try:
+            await self.redis_client.setex(key, ttl, value)
+            return True
+        except REDIS_ERRORS as e:
+            self._record_error("SETEX", key, e)
+            return False
+    
+    # ---- 标签代数 ----
+    
+    def _note_generations(self, generations: Dict[str, int]):
+        """记录已知的标签代数，只增不减（并发的读取可能晚于失效消息返回较旧的代数）"""
+        for tag, generation in generations.items():
+            known = self._generations.get(tag)
+            if known is None or generation > known:
+                self._generations.set(tag, generation)
+    
+    def _is_current(self, entry: Dict[str, Any]) -> bool:
+        """L1 条目的标签代数是否都与本进程已知的最新代数一致"""
+        return all(self._generations.get(tag) == generation for tag, generation in entry['g'].items())
+    
+    async def _read_generations(self, tags: List[str]) -> Dict[str, int]:
+        values = await self.redis_client.mget([GENERATION_PREFIX + tag for tag in tags])
+        generations = {tag: int(value or 0) for tag, value in zip(tags, values)}
+        self._note_generations(generations)
+        return generations
+    
+    async def current_generations(self, tags: Iterable[str] = ()) -> Optional[Dict[str, int]]:
+        """读取条目标签（含 all）的当前代数，Redis 不可用时返回 None"""
+        tags = [ALL_TAG, *tags]
+        try:
+            return await self._read_generations(tags)
+        except REDIS_ERRORS as e:
+            self._record_error("MGET", ",".join(tags), e)
+            return None
+    
+    async def bump_generations(self, tags: Iterable[str]) -> Dict[str, int]:
+        """递增标签代数，使带有这些标签的条目全部失效，返回新的代数"""
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return {}
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.incr(GENERATION_PREFIX + tag)
+                values = await pipe.execute()
+        except REDIS_ERRORS as e:
+            self._record_error("INCR", ",".join(tags), e)
+            return {}
+        generations = dict(zip(tags, values))
+        self.cache_stats['bumps'] += len(tags)
+        self._note_generations(generations)
+        await self._publish({'generations': generations})
+        return generations
+    
+    # ---- 两级缓存 ----
+    
+    @property
+    def l1_enabled(self) -> bool:
+        return self._subscribed and self.local.max_entries > 0
+    
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取 L1，未命中、条目已失效或 L1 未启用时返回 None"""
+        if not self.l1_enabled:
+            return None
+        return self.local.get(key, valid=self._is_current)
+    
+    async def lookup(self, key: str, tags: Iterable[str] = (),
+                     flag_key: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, int]], Optional[bool]]:
+        """
+        依次读取 L1、Redis，返回 (条目或 None, 读取时的标签代数, 标记是否存在)
+        
+        条目为 {"v": 值, "g": 标签代数, "e": 逻辑过期时间, "d": 加载耗时}，可能已逻辑过期（见 get_or_load）。
+        值、各标签的代数和标记键（如热度标记）一次 MGET 读取；条目记录的代数与当前代数不一致即已失效。
+        返回的代数用于随后回填缓存：查询数据库期间标签被失效时，回填的条目同样按已失效处理。
+        L1 命中时不访问 Redis，代数和标记都返回 None（未知）。
+        """
+        entry = self._get_local(key)
+        if entry is not None:
+            return entry, None, None
+        
+        try:
+            raw, generations, flag = await self._read_l2(key, tags, flag_key)
+        except REDIS_ERRORS as e:
+            self._record_error("MGET", key, e)
+            return None, None, False
+        
+        entry = _decode_entry(raw) if raw is not None else None
+        if entry is None or entry['g'] != generations:
+            if raw is not None:
+                self.cache_stats['stale'] += 1
+            self.cache_stats['l2_misses'] += 1
+            return None, generations, flag
+        
+        self.cache_stats['l2_hits'] += 1
+        if self.l1_enabled:
+            self.local.set(key, entry)
+        return entry, generations, flag
+    
+    async def _read_l2(self, key: Optional[str], tags: Iterable[str],
+                       flag_key: Optional[str] = None) -> Tuple[Optional[str], Dict[str, int], bool]:
+        """
+        一次 MGET 读取 Redis 中的条目、标签（含 all）代数和标记键，返回 (条目原文, 代数, 标记是否存在)
+        
+        key 为 None 时只读取代数和标记；Redis 不可用时抛出异常。
+        """
+        tags = [ALL_TAG, *tags]
+        keys = [GENERATION_PREFIX + tag for tag in tags]
+        if key is not None:
+            keys.insert(0, key)
+        if flag_key:
+            keys.append(flag_key)
+        values = await self.redis_client.mget(keys)
+        
+        raw = values.pop(0) if key is not None else None
+        generations = {tag: int(value or 0) for tag, value in zip(tags, values)}
+        self._note_generations(generations)
+        flag = bool(values[-1]) if flag_key else False
+        return raw, generations, flag
+    
+    async def set_json(self, key: str, ttl: int, value: Any, tags: Iterable[str] = (),
+                       generations: Optional[Dict[str, int]] = None, publish: bool = False,
+                       load_time: float = 0.0) -> bool:
+        """
+        写入 Redis 和 L1，返回 Redis 是否写入成功
+        
+        ttl 为逻辑过期秒数，Redis 中的条目再多保留 settings.cache_stale_ttl 秒供过期后返回旧值。
+        generations 为 lookup 返回的读取时代数；未提供时读取当前代数（如 Write-Through）。
+        publish 为 True 时（数据被改写）通知其他进程删除各自 L1 中的旧值；
+        缓存未命中后的回填内容来自数据库，不需要通知。
+        """
+        if generations is None:
+            generations = await self.current_generations(tags)
+            if generations is None:
+                return False
+        entry = {'g': generations, 'v': value, 'e': time.time() + ttl, 'd': round(load_time, 4)}
+        payload = json.dumps(entry, default=str)
+        stored = await self.setex(key, ttl + settings.cache_stale_ttl, payload)
+        # L1 保存与 Redis 中一致的解码结果（日期、Decimal 等已转为字符串）
+        if self.l1_enabled:
+            self.local.set(key, json.loads(payload), ttl + settings.cache_stale_ttl)
+        if publish:
+            await self.publish_invalidation(keys=[key])
+        return stored
+    
+    # ---- 防击穿 ----
+    
+    async def get_or_load(self, key: str, loader: Callable[[Session], Awaitable[Any]], ttl: int,
+                          tags: Iterable[str] = (), hot_key: Optional[str] = None,
+                          hot_ttl: Optional[int] = None, publish: bool = False) -> Tuple[Any, str]:
+        """
+        读取缓存，未命中时加载并回填，返回 (值, 来源)，来源为 HIT / STALE / MISS
+        
+        loader 接收一个独立的数据库会话（加载可能在请求结束后于后台完成，不能使用请求的会话），
+        返回值为空时不写入缓存。hot_key 存在时逻辑过期秒数使用 hot_ttl
+        （L1 命中时标记未知，由后台刷新在读取标签代数时一并读取）。
+        - 未过期：直接返回；按 XFetch 概率提前触发后台刷新。
+        - 逻辑过期但仍在 cache_stale_ttl 内：返回旧值并触发后台刷新。
+        - 不存在或已被标签失效：等待本进程内该键唯一的加载任务。
+        """
+        tags = list(tags)
+        entry, generations, is_hot = await self.lookup(key, tags, hot_key)
+        hot = None
+        if hot_key and hot_ttl:
+            if is_hot:
+                ttl = hot_ttl
+            elif is_hot is None:
+                hot = (hot_key, hot_ttl)
+        
+        if entry is not None:
+            now = time.time()
+            if now >= entry['e']:
+                self.cache_stats['stale_served'] += 1
+                self._refresh(key, loader, ttl, tags, generations, publish, hot)
+                return entry['v'], STALE
+            if _should_refresh_early(entry, now):
+                self.cache_stats['early_refreshes'] += 1
+                self._refresh(key, loader, ttl, tags, generations, publish, hot)
+            return entry['v'], HIT
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_load(key, loader, ttl, tags, generations, publish)
+        else:
+            self.cache_stats['coalesced'] += 1
+        # 单个等待者被取消（如客户端断开）时不取消共享的加载任务
+        return await asyncio.shield(task), MISS
+    
+    def _refresh(self, key, loader, ttl, tags, generations, publish, hot=None):
+        """在后台刷新条目；本进程已在加载该键时不重复刷新"""
+        if key not in self._inflight:
+            self._start_load(key, loader, ttl, tags, generations, publish, hot)
+    
+    def _start_load(self, key, loader, ttl, tags, generations, publish, hot=None) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(
+            self._load(key, loader, ttl, tags, generations, publish, hot)
+        )
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._load_finished(key, done))
+        return task
+    
+    def _load_finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 后台刷新没有等待者，在这里取出异常避免未处理异常的警告
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"缓存加载失败: {key}, error: {task.exception()!r}")
+    
+    async def _load(self, key, loader, ttl, tags, generations, publish, hot=None) -> Any:
+        """加载并回填；hot 为 (热度标记键, hot_ttl) 时热度未知，与标签代数一起读取后决定逻辑过期秒数"""
+        lock_key = LOAD_LOCK_PREFIX + key
+        token = uuid.uuid4().hex
+        locked = await self._acquire_lock(lock_key, token)
+        if not locked:
+            # 其他进程正在加载，等待它写入缓存
+            self.cache_stats['lock_waits'] += 1
+            entry = await self._wait_for_fill(key, tags, lock_key)
+            if entry is not None:
+                return entry['v']
+            # 持锁进程超时或没有写入（如结果为空），自行加载
+        try:
+            if generations is None:
+                generations, is_hot = await self._current_state(tags, hot[0] if hot else None)
+                if hot and is_hot:
+                    ttl = hot[1]
+            started = time.perf_counter()
+            db = SessionLocal()
+            try:
+                value = await loader(db)
+            finally:
+                await run_in_threadpool(db.close)
+            self.cache_stats['loads'] += 1
+            if value and generations is not None and await self.set_json(
+                key, ttl, value, generations=generations, publish=publish,
+                load_time=time.perf_counter() - started
+            ):
+                self.cache_stats['sets'] += 1
+            return value
+        finally:
+            if locked:
+                await self._unlock(lock_key, token)
+    
+    async def _acquire_lock(self, lock_key: str, token: str) -> bool:
+        """获取跨进程重建锁；Redis 不可用时直接加载（按获得锁处理）"""
+        try:
+            return bool(await self.redis_client.set(
+                lock_key, token, nx=True, px=int(settings.cache_lock_ttl * 1000)
+            ))
+        except REDIS_ERRORS as e:
+            self._record_error("SET NX", lock_key, e)
+            return True
+    
+    async def _unlock(self, lock_key: str, token: str):
+        try:
+            await self._release_lock(keys=[lock_key], args=[token], client=self.redis_client)
+        except REDIS_ERRORS as e:
+            # 锁会在 cache_lock_ttl 后自动过期
+            self._record_error("UNLOCK", lock_key, e)
+    
+    async def _current_state(self, tags: List[str],
+                             flag_key: Optional[str]) -> Tuple[Optional[Dict[str, int]], bool]:
+        """读取标签代数和标记键，Redis 不可用时返回 (None, False)"""
+        try:
+            _, generations, flag = await self._read_l2(None, tags, flag_key)
+        except REDIS_ERRORS as e:
+            self._record_error("MGET", ",".join(tags), e)
+            return None, False
+        return generations, flag
+    
+    async def _wait_for_fill(self, key: str, tags: List[str], lock_key: str) -> Optional[Dict[str, Any]]:
+        """
+        等待持锁进程写入未过期的条目；锁释放或超时仍未写入时返回 None
+        
+        直接轮询 Redis（不经过 L1：L1 中可能仍是触发刷新的旧条目），值、代数和锁一次 MGET 读取。
+        持锁进程的回填不通知其他进程，读到后写入本进程的 L1，不再返回旧值。
+        """
+        deadline = time.monotonic() + settings.cache_lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            try:
+                raw, generations, locked = await self._read_l2(key, tags, lock_key)
+            except REDIS_ERRORS as e:
+                self._record_error("MGET", key, e)
+                return None
+            entry = _decode_entry(raw) if raw is not None else None
+            if entry is not None and entry['g'] == generations and entry['e'] > time.time():
+                if self.l1_enabled:
+                    self.local.set(key, entry)
+                return entry
+            if not locked:
+                return None
+        return None
+    
+    async def mark_hot(self, hot_key: str, ttl: int = 3600):
+        """刷新热度标记，同一标记在 HOT_MARK_REFRESH 秒内只写一次 Redis"""
+        if self._hot_marks.get(hot_key) is not None:
+            return
+        if await self.setex(hot_key, ttl, "1"):
+            self._hot_marks.set(hot_key, True)
+    
+    # ---- 跨进程失效 ----
+    
+    async def publish_invalidation(self, keys: List[str]):
+        """删除本进程 L1 中的条目，并通知其他进程删除"""
+        for key in keys:
+            self.local.delete(key)
+        await self._publish({'keys': keys})
+    
+    async def _publish(self, message: Dict[str, Any]):
+        message = json.dumps({'origin': self.instance_id, **message})
+        try:
+            await self.redis_client.publish(settings.cache_invalidation_channel, message)
+            self.cache_stats['published'] += 1
+        except REDIS_ERRORS as e:
+            self._record_error("PUBLISH", settings.cache_invalidation_channel, e)
+    
+    def _on_invalidation_message(self, data: str):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            logger.warning(f"无法解析的缓存失效消息: {data!r}")
+            return
+        if message.get('origin') == self.instance_id:
+            return
+        self.cache_stats['received'] += 1
+        for key in message.get('keys') or []:
+            self.local.delete(key)
+        # 带旧代数的 L1 条目在下次读取时被丢弃
+        self._note_generations(message.get('generations') or {})
+    
+    async def _listen(self):
+        delay = 1.0
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(settings.cache_invalidation_channel)
+                # 未订阅期间可能错过失效消息，重新订阅后从空的 L1 开始
+                self.local.clear()
+                self._generations.clear()
+                self._subscribed = True
+                delay = 1.0
+                logger.info(f"已订阅缓存失效频道: {settings.cache_invalidation_channel}")
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._on_invalidation_message(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except REDIS_ERRORS as e:
+                self._record_error("SUBSCRIBE", settings.cache_invalidation_channel, e)
+            finally:
+                self._subscribed = False
+                try:
+                    await pubsub.aclose()
+                except REDIS_ERRORS:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESUBSCRIBE_MAX_DELAY)
+    
+    # ---- 已失效条目清理 ----
+    
+    async def _sweep_periodically(self):
+        interval = settings.cache_sweep_interval
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await self.redis_client.set(SWEEP_LOCK_KEY, self.instance_id, nx=True, ex=max(1, int(interval))):
+                    await self.sweep_stale_entries()
+            except REDIS_ERRORS as e:
+                self._record_error("SWEEP", KEY_NAMESPACE, e)
+    
+    async def sweep_stale_entries(self, batch_size: int = 500) -> Dict[str, Any]:
+        """
+        用 SCAN 分批检查缓存条目，删除代数已过期的条目
+        
+        读取时本就会比对代数，清理只是提前回收内存；SCAN 每次只遍历一小批键，不会像 KEYS 那样阻塞 Redis。
+        """
+        started = time.perf_counter()
+        scanned = deleted = 0
+        batch: List[str] = []
+        async for key in self.redis_client.scan_iter(match=f"{KEY_NAMESPACE}:*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += await self._delete_stale(batch)
+                scanned += len(batch)
+                batch = []
+        if batch:
+            deleted += await self._delete_stale(batch)
+            scanned += len(batch)
+        
+        self.cache_stats['deletes'] += deleted
+        self.last_sweep = {
+            'scanned': scanned,
+            'deleted': deleted,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'finished_at': datetime.utcnow().isoformat()
         }
+        logger.info(f"缓存清理完成: 检查 {scanned} 个键，删除已失效的 {deleted} 个")
+        return self.last_sweep
+    
+    async def _delete_stale(self, keys: List[str]) -> int:
+        payloads = await self.redis_client.mget(keys)
+        entries = {key: _decode_entry(payload) for key, payload in zip(keys, payloads) if payload is not None}
+        tags = sorted({tag for entry in entries.values() if entry for tag in entry['g']})
+        generations = await self._read_generations(tags) if tags else {}
+        # 无法解析的条目（旧格式）也不会再被命中
+        stale = [
+            key for key, entry in entries.items()
+            if entry is None or any(generations.get(tag) != generation for tag, generation in entry['g'].items())
+        ]
+        if stale:
+            await self.redis_client.unlink(*stale)
+        return len(stale)
     
-    def get_stats(self) -> Dict[str, Any]:
+    async def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        info = self.redis_client.info('stats')
+        try:
+            info = await self.redis_client.info('stats')
+        except REDIS_ERRORS as e:
+            self._record_error("INFO", "stats", e)
+            info = {}
         return {
             'keyspace_hits': info.get('keyspace_hits', 0),
             'keyspace_misses': info.get('keyspace_misses', 0),
             'used_memory': info.get('used_memory', 0),
             'used_memory_human': info.get('used_memory_human', '0B'),
-            'hit_rate': self._calculate_hit_rate(info)
+            'hit_rate': self._calculate_hit_rate(info),
+            'available': bool(info),
+            'client': dict(self.cache_stats),
+            'tiers': self._tier_stats()
+        }
+    
+    def _tier_stats(self) -> Dict[str, Any]:
+        """L1 / L2 各自的命中率：L1 未命中的请求才会访问 L2"""
+        l2_hits = self.cache_stats['l2_hits']
+        l2_lookups = l2_hits + self.cache_stats['l2_misses']
+        return {
+            'l1': {
+                **self.local.get_stats(),
+                'enabled': self.l1_enabled
+            },
+            'l2': {
+                'hits': l2_hits,
+                'misses': self.cache_stats['l2_misses'],
+                'stale': self.cache_stats['stale'],
+                'hit_rate': round(l2_hits / l2_lookups * 100, 2) if l2_lookups else 0.0
+            },
+            'stampede': {
+                'loads': self.cache_stats['loads'],
+                'inflight': len(self._inflight),
+                'coalesced': self.cache_stats['coalesced'],
+                'lock_waits': self.cache_stats['lock_waits'],
+                'stale_served': self.cache_stats['stale_served'],
+                'early_refreshes': self.cache_stats['early_refreshes']
+            },
+            'invalidation': {
+                'channel': settings.cache_invalidation_channel,
+                'subscribed': self._subscribed,
+                'published': self.cache_stats['published'],
+                'received': self.cache_stats['received'],
+                'bumps': self.cache_stats['bumps'],
+                'last_sweep': self.last_sweep
+            }
         }
     
     def _calculate_hit_rate(self, info: Dict) -> float:
@@ -50,106 +657,130 @@ class RedisCacheManager:
         total = hits + misses
         return (hits / total * 100) if total > 0 else 0.0
 
+def _decode_entry(payload: str) -> Optional[Dict[str, Any]]:
+    """解析 Redis 中的缓存条目（见 RedisCacheManager.lookup），格式不符时返回 None"""
+    try:
+        entry = json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(entry, dict) and isinstance(entry.get('g'), dict) and 'v' in entry and 'e' in entry:
+        return entry
+    return None
+
+def _should_refresh_early(entry: Dict[str, Any], now: float) -> bool:
+    """
+    XFetch：以 now - d * beta * ln(rand) >= 过期时间 判断是否提前刷新
+    
+    加载越慢（d 越大）、越接近过期，提前刷新的概率越高；各请求独立抽样，通常只有一个请求触发刷新。
+    """
+    beta = settings.cache_xfetch_beta
+    if beta <= 0:
+        return False
+    return now - entry.get('d', 0.0) * beta * math.log(1.0 - random.random()) >= entry['e']
+
 # 全局缓存管理器实例
 cache_manager = RedisCacheManager()
 
 def cache_key(prefix: str, *args) -> str:
     """生成缓存键"""
-    return f"{prefix}:{':'.join(map(str, args))}"
+    return f"{KEY_NAMESPACE}:{prefix}:{':'.join(map(str, args))}"
+
+def cache_tag(name: str, *args) -> str:
+    """生成缓存标签，如 cache_tag("photo", 1) -> "photo:1\""""
+    return ":".join(map(str, (name, *args)))
+
+def hot_key(cache_key_str: str) -> str:
+    """热度标记键（不在缓存键前缀下，不参与清理）"""
+    return f"hot:{cache_key_str}"
+
+def _call_key_args(args, kwargs) -> list:
+    """被装饰函数中参与缓存键的参数，数据库会话不参与"""
+    return [arg for arg in (*args, *kwargs.values()) if not isinstance(arg, Session)]
+
+def _call_cache_key(prefix: str, args, kwargs) -> str:
+    """由被装饰函数的参数生成缓存键"""
+    return cache_key(prefix, *_call_key_args(args, kwargs))
+
+def _call_tags(tag: str, args, kwargs) -> List[str]:
+    """由被装饰函数的参数生成标签，如 tag="photo" 时为 photo:{photo_id}"""
+    return [cache_tag(tag, *_call_key_args(args, kwargs))] if tag else []
 
-def cache_aside(ttl: int = 300, key_prefix: str = ""):
+def _with_session(args, kwargs, db: Session):
+    """把参数中的数据库会话替换为 db"""
+    args = tuple(db if isinstance(arg, Session) else arg for arg in args)
+    kwargs = {key: db if isinstance(value, Session) else value for key, value in kwargs.items()}
+    return args, kwargs
+
+def _call_loader(func, args, kwargs) -> Callable[[Session], Awaitable[Any]]:
+    """用于 get_or_load 的加载函数：以独立的会话调用被装饰函数"""
+    async def loader(db: Session):
+        call_args, call_kwargs = _with_session(args, kwargs, db)
+        return await func(*call_args, **call_kwargs)
+    return loader
+
+def cache_aside(ttl: int = 300, key_prefix: str = "", tag: str = ""):
     """Cache-Aside 装饰器"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # 生成缓存键
-            cache_key_str = cache_key(key_prefix, *args, *kwargs.values())
+            # 生成缓存键和标签
+            cache_key_str = _call_cache_key(key_prefix, args, kwargs)
+            tags = _call_tags(tag, args, kwargs)
             
-            # 尝试从缓存获取
-            cached_data = cache_manager.redis_client.get(cache_key_str)
-            if cached_data:
+            # 从缓存获取（L1 → Redis），未命中时合并并发请求查询数据库后写入缓存
+            result, source = await cache_manager.get_or_load(
+                cache_key_str, _call_loader(func, args, kwargs), ttl, tags
+            )
+            if source == MISS:
+                cache_manager.cache_stats['misses'] += 1
+                logger.info(f"Cache miss: {cache_key_str}")
+            else:
                 cache_manager.cache_stats['hits'] += 1
                 logger.info(f"Cache hit: {cache_key_str}")
-                return json.loads(cached_data)
-            
-            # 缓存未命中，查询数据库
-            cache_manager.cache_stats['misses'] += 1
-            logger.info(f"Cache miss: {cache_key_str}")
-            
-            result = await func(*args, **kwargs)
-            
-            # 写入缓存
-            if result:
-                cache_manager.redis_client.setex(
-                    cache_key_str, 
-                    ttl, 
-                    json.dumps(result, default=str)
-                )
-                cache_manager.cache_stats['sets'] += 1
-                logger.info(f"Cache set: {cache_key_str}, TTL: {ttl}s")
             
             return result
         return wrapper
     return decorator
 
-def smart_ttl_cache(key_prefix: str = ""):
+def smart_ttl_cache(key_prefix: str = "", tag: str = ""):
     """智能TTL缓存装饰器"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            cache_key_str = cache_key(key_prefix, *args, *kwargs.values())
+            cache_key_str = _call_cache_key(key_prefix, args, kwargs)
+            tags = _call_tags(tag, args, kwargs)
             
-            # 检查热度
-            hot_key = cache_key("hot", cache_key_str)
-            is_hot = cache_manager.redis_client.get(hot_key)
+            # 热度标记和缓存数据一次读取，根据热度设置TTL：热门数据6分钟，普通数据3分钟
+            hot_key_str = hot_key(cache_key_str)
+            result, source = await cache_manager.get_or_load(
+                cache_key_str, _call_loader(func, args, kwargs), 300, tags,
+                hot_key=hot_key_str, hot_ttl=600
+            )
             
-            # 根据热度设置TTL
-            if is_hot:
-                ttl = 600  # 热门数据6分钟
+            if source == MISS:
+                cache_manager.cache_stats['misses'] += 1
             else:
-                ttl = 300  # 普通数据3分钟
-            
-            # 尝试从缓存获取
-            cached_data = cache_manager.redis_client.get(cache_key_str)
-            if cached_data:
                 cache_manager.cache_stats['hits'] += 1
                 # 更新热度
-                cache_manager.redis_client.setex(hot_key, 3600, "1")
-                return json.loads(cached_data)
-            
-            # 缓存未命中
-            cache_manager.cache_stats['misses'] += 1
-            result = await func(*args, **kwargs)
-            
-            if result:
-                cache_manager.redis_client.setex(
-                    cache_key_str, 
-                    ttl, 
-                    json.dumps(result, default=str)
-                )
-                cache_manager.cache_stats['sets'] += 1
+                await cache_manager.mark_hot(hot_key_str)
             
             return result
         return wrapper
     return decorator
 
-def write_through_cache(key_prefix: str = "", ttl: int = 600):
+def write_through_cache(key_prefix: str = "", ttl: int = 600, tag: str = ""):
     """Write-Through 缓存装饰器"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            cache_key_str = cache_key(key_prefix, *args, *kwargs.values())
+            cache_key_str = _call_cache_key(key_prefix, args, kwargs)
+            tags = _call_tags(tag, args, kwargs)
             
             # 执行数据库操作
             result = await func(*args, **kwargs)
             
-            # 同时更新缓存
-            if result:
-                cache_manager.redis_client.setex(
-                    cache_key_str, 
-                    ttl, 
-                    json.dumps(result, default=str)
-                )
+            # 同时更新缓存，并通知其他进程丢弃旧值
+            if result and await cache_manager.set_json(cache_key_str, ttl, result, tags, publish=True):
                 cache_manager.cache_stats['sets'] += 1
                 logger.info(f"Write-through cache set: {cache_key_str}")
             
@@ -157,202 +788,117 @@ def write_through_cache(key_prefix: str = "", ttl: int = 600):
         return wrapper
     return decorator
 
-def write_behind_cache(key_prefix: str = "", ttl: int = 1800):
-    """Write-Behind 异步缓存装饰器"""
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            cache_key_str = cache_key(key_prefix, *args, *kwargs.values())
-            
-            # 立即更新缓存
-            cache_manager.redis_client.setex(
-                cache_key_str, 
-                ttl, 
-                json.dumps({"status": "pending"}, default=str)
-            )
-            
-            # 异步更新数据库
-            asyncio.create_task(_async_db_update(func, args, kwargs, cache_key_str))
-            
-            return {"status": "cached", "key": cache_key_str}
-        return wrapper
-    return decorator
-
-async def _async_db_update(func, args, kwargs, cache_key_str):
-    """异步数据库更新"""
-    try:
-        result = await func(*args, **kwargs)
-        if result:
-            cache_manager.redis_client.setex(
-                cache_key_str, 
-                1800, 
-                json.dumps(result, default=str)
-            )
-            logger.info(f"Async DB update completed: {cache_key_str}")
-    except Exception as e:
-        logger.error(f"Async DB update failed: {cache_key_str}, error: {e}")
+def load_photo_detail(photo_id: int, db: Session) -> Optional[Dict[str, Any]]:
+    """从数据库读取照片详情（同步，需在线程池中调用）"""
+    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    if not photo:
+        return None
+    
+    return {
+        "id": photo.id,
+        "title": photo.title,
+        "description": photo.description,
+        "image_url": photo.image_url,
+        "theme": photo.theme,
+        "likes": photo.likes,
+        "views": photo.views,
+        "heat_score": float(photo.heat_score or 0),
+        "user": {
+            "id": photo.user.id,
+            "username": photo.user.username,
+            "avatar_url": photo.user.avatar_url
+        }
+    }
 
 class CacheStrategy:
     """缓存策略实现类"""
     
     @staticmethod
-    @cache_aside(ttl=300, key_prefix="photo_detail")
+    @cache_aside(ttl=300, key_prefix="photo_detail", tag="photo")
     async def get_photo_detail_cache_aside(photo_id: int, db: Session):
         """策略2: Cache-Aside 照片详情"""
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
-        if not photo:
-            return None
-        
-        return {
-            "id": photo.id,
-            "title": photo.title,
-            "description": photo.description,
-            "image_url": photo.image_url,
-            "theme": photo.theme,
-            "likes": photo.likes,
-            "views": photo.views,
-            "heat_score": float(photo.heat_score or 0),
-            "user": {
-                "id": photo.user.id,
-                "username": photo.user.username,
-                "avatar_url": photo.user.avatar_url
-            }
-        }
+        return await run_in_threadpool(load_photo_detail, photo_id, db)
     
     @staticmethod
-    @smart_ttl_cache(key_prefix="photo_detail_smart")
+    @smart_ttl_cache(key_prefix="photo_detail_smart", tag="photo")
     async def get_photo_detail_smart_ttl(photo_id: int, db: Session):
         """策略3: 智能TTL 照片详情"""
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
-        if not photo:
-            return None
-        
-        return {
-            "id": photo.id,
-            "title": photo.title,
-            "description": photo.description,
-            "image_url": photo.image_url,
-            "theme": photo.theme,
-            "likes": photo.likes,
-            "views": photo.views,
-            "heat_score": float(photo.heat_score or 0),
-            "user": {
-                "id": photo.user.id,
-                "username": photo.user.username,
-                "avatar_url": photo.user.avatar_url
-            }
-        }
+        return await run_in_threadpool(load_photo_detail, photo_id, db)
     
     @staticmethod
-    @write_through_cache(key_prefix="photo_detail_wt", ttl=600)
+    @write_through_cache(key_prefix="photo_detail_wt", ttl=600, tag="photo")
     async def get_photo_detail_write_through(photo_id: int, db: Session):
         """策略4: Write-Through 照片详情"""
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
-        if not photo:
-            return None
-        
-        return {
-            "id": photo.id,
-            "title": photo.title,
-            "description": photo.description,
-            "image_url": photo.image_url,
-            "theme": photo.theme,
-            "likes": photo.likes,
-            "views": photo.views,
-            "heat_score": float(photo.heat_score or 0),
-            "user": {
-                "id": photo.user.id,
-                "username": photo.user.username,
-                "avatar_url": photo.user.avatar_url
-            }
-        }
+        return await run_in_threadpool(load_photo_detail, photo_id, db)
     
     @staticmethod
-    @write_behind_cache(key_prefix="photo_detail_wb", ttl=1800)
     async def get_photo_detail_write_behind(photo_id: int, db: Session):
-        """策略5: Write-Behind 照片详情"""
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
-        if not photo:
+        """策略5: Write-Behind 照片详情 - 读取走缓存，浏览量计入计数缓冲区，按间隔批量写回数据库"""
+        from .counter_buffer import counter_buffer
+        
+        # 浏览量写回后缓存中的值即过期（photo_views 标签），否则叠加的增量清零后浏览量会回退
+        cache_key_str = cache_key("photo_detail_wb", photo_id)
+        tags = [cache_tag("photo", photo_id), cache_tag(PHOTO_VIEWS_TAG, photo_id)]
+        
+        async def loader(session: Session):
+            return await run_in_threadpool(load_photo_detail, photo_id, session)
+        
+        result, source = await cache_manager.get_or_load(cache_key_str, loader, 1800, tags)
+        if source == MISS:
+            cache_manager.cache_stats['misses'] += 1
+        else:
+            cache_manager.cache_stats['hits'] += 1
+        if not result:
             return None
         
-        return {
-            "id": photo.id,
-            "title": photo.title,
-            "description": photo.description,
-            "image_url": photo.image_url,
-            "theme": photo.theme,
-            "likes": photo.likes,
-            "views": photo.views,
-            "heat_score": float(photo.heat_score or 0),
-            "user": {
-                "id": photo.user.id,
-                "username": photo.user.username,
-                "avatar_url": photo.user.avatar_url
-            }
-        }
+        counter_buffer.add(photo_id, "views")
+        # 叠加尚未写回的浏览量、点赞数（缓存中的对象不原地修改）
+        return counter_buffer.apply(photo_id, result)
     
     @staticmethod
     async def get_photo_detail_hybrid(photo_id: int, db: Session):
         """策略6: 混合策略 照片详情"""
         # 结合智能TTL和Write-Through
         cache_key_str = cache_key("photo_detail_hybrid", photo_id)
+        tags = [cache_tag("photo", photo_id)]
         
-        # 检查热度
-        hot_key = cache_key("hot", cache_key_str)
-        is_hot = cache_manager.redis_client.get(hot_key)
+        # 热度标记和缓存数据一次读取，根据热度设置TTL
+        hot_key_str = hot_key(cache_key_str)
         
-        # 根据热度设置TTL
-        ttl = 600 if is_hot else 300
+        async def loader(session: Session):
+            return await run_in_threadpool(load_photo_detail, photo_id, session)
         
-        # 尝试从缓存获取
-        cached_data = cache_manager.redis_client.get(cache_key_str)
-        if cached_data:
+        # 未命中时查询数据库并写入缓存（Write-Through：通知其他进程丢弃旧值）
+        result, source = await cache_manager.get_or_load(
+            cache_key_str, loader, 300, tags,
+            hot_key=hot_key_str, hot_ttl=600, publish=True
+        )
+        
+        if source == MISS:
+            cache_manager.cache_stats['misses'] += 1
+        else:
             cache_manager.cache_stats['hits'] += 1
             # 更新热度
-            cache_manager.redis_client.setex(hot_key, 3600, "1")
-            return json.loads(cached_data)
-        
-        # 缓存未命中，查询数据库
-        cache_manager.cache_stats['misses'] += 1
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
-        if not photo:
-            return None
+            await cache_manager.mark_hot(hot_key_str)
         
-        result = {
-            "id": photo.id,
-            "title": photo.title,
-            "description": photo.description,
-            "image_url": photo.image_url,
-            "theme": photo.theme,
-            "likes": photo.likes,
-            "views": photo.views,
-            "heat_score": float(photo.heat_score or 0),
-            "user": {
-                "id": photo.user.id,
-                "username": photo.user.username,
-                "avatar_url": photo.user.avatar_url
-            }
-        }
-        
-        # 写入缓存
-        cache_manager.redis_client.setex(
-            cache_key_str, 
-            ttl, 
-            json.dumps(result, default=str)
-        )
-        cache_manager.cache_stats['sets'] += 1
-        
-        return result
-
-def invalidate_cache(pattern: str):
-    """缓存失效函数"""
-    keys = cache_manager.redis_client.keys(pattern)
-    if keys:
-        cache_manager.redis_client.delete(*keys)
-        cache_manager.cache_stats['deletes'] += len(keys)
-        logger.info(f"Cache invalidated: {len(keys)} keys matching {pattern}")
-
-def clear_all_cache():
-    """清空所有缓存"""
-    cache_manager.redis_client.flushall()
+        return result or None
+
+async def invalidate_cache(*tags: str) -> Dict[str, int]:
+    """
+    使带有任一标签的缓存条目失效，返回各标签的新代数
+    
+    每个标签一次 INCR，不扫描也不删除键；旧条目在读取时按未命中处理，随后由后台清理或到期回收。
+    """
+    generations = await cache_manager.bump_generations(tags)
+    if generations:
+        logger.info(f"Cache invalidated: {generations}")
+    return generations
+
+async def invalidate_photo_cache(photo_ids: Iterable[int]):
+    """作品被修改、审核或删除后，使其详情缓存和排行榜缓存失效"""
+    await invalidate_cache(*(cache_tag("photo", photo_id) for photo_id in photo_ids), RANKINGS_TAG)
+
+async def clear_all_cache():
+    """清空所有缓存（递增 all 标签的代数，不影响 Redis 中的其他数据）"""
+    await invalidate_cache(ALL_TAG)
     logger.info("All cache cleared")
@@ -0,0 +1,80 @@
+"""
+分类器级联的配置与统计
+
+混合分类器按从廉价到昂贵的顺序执行各阶段：传统特征（亮度/边缘、颜色、纹理）→ YOLO →
+可选的 ResNet50，某一阶段足够确定时直接返回，后面的阶段不再执行。
+阈值从 image_processing.classifier_cascade 读取，可以对照已标注的错误样例调整。
+每次分类的结果附带 cascade 轨迹（由哪个阶段决定、各阶段耗时），这里汇总成统计信息。
+"""
+from typing import Any, Dict, Optional
+import threading
+
+from .config_manager import get_config_manager
+
+# 级联默认配置（系统配置 image_processing.classifier_cascade 中的项覆盖这里的值）
+# 传统特征阶段默认关闭：三种方法一致时综合置信度即可超过 0.75，会在 YOLO 之前决定主题、
+# 改变现有分类结果；先用 tune_cascade.py 在错误样例上评估出阈值后再在系统配置中启用
+DEFAULT_CASCADE_CONFIG = {
+    "features_enabled": False,
+    "features_threshold": 0.75,     # 传统特征综合置信度达到该值时直接返回
+    "features_min_agreement": 3,    # 同时至少有几种传统方法给出相同主题
+    "yolo_threshold": 0.0,          # YOLO 有检测且置信度达到该值时返回，0 表示有检测即返回
+    "resnet_enabled": False,        # YOLO 未决定时是否再运行 ResNet50
+    "resnet_threshold": 0.6
+}
+
+# 级联阶段，按执行顺序
+STAGES = ("features", "yolo", "resnet", "fallback")
+
+
+def get_cascade_config() -> Dict[str, Any]:
+    """读取级联配置"""
+    config = get_config_manager().get("image_processing", {}) or {}
+    cascade_config = dict(DEFAULT_CASCADE_CONFIG)
+    cascade_config.update(config.get("classifier_cascade") or {})
+    return cascade_config
+
+
+class CascadeStats:
+    """各阶段的执行次数、决定次数和耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.classified = 0
+            self.stages = {stage: {"runs": 0, "decided": 0, "total_ms": 0.0} for stage in STAGES}
+
+    def record(self, trace: Optional[Dict[str, Any]]):
+        """记录一次分类的级联轨迹 {"decided_by": 阶段, "stage_ms": {阶段: 耗时}}"""
+        if not trace:
+            return
+        with self._lock:
+            self.classified += 1
+            for stage, elapsed_ms in trace.get("stage_ms", {}).items():
+                entry = self.stages.setdefault(stage, {"runs": 0, "decided": 0, "total_ms": 0.0})
+                entry["runs"] += 1
+                entry["total_ms"] += elapsed_ms
+            decided_by = trace.get("decided_by")
+            if decided_by:
+                self.stages.setdefault(decided_by, {"runs": 0, "decided": 0, "total_ms": 0.0})["decided"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息，decision_rate 为该阶段决定的分类占全部分类的比例"""
+        with self._lock:
+            classified = self.classified
+            stages = {}
+            for stage, entry in self.stages.items():
+                stages[stage] = {
+                    "runs": entry["runs"],
+                    "decided": entry["decided"],
+                    "decision_rate": round(entry["decided"] / classified, 4) if classified else 0.0,
+                    "avg_ms": round(entry["total_ms"] / entry["runs"], 2) if entry["runs"] else 0.0
+                }
+        return {"classified": classified, "stages": stages, "config": get_cascade_config()}
+
+
+# 全局级联统计实例
+cascade_stats = CascadeStats()
@@ -0,0 +1,81 @@
+"""
+主色调调色板
+
+每张图只计算一次：先把像素量化到 RGB 三维直方图（每通道 16 级，共 4096 个区间），
+再以区间内像素的平均颜色为样本、像素数为权重做 MiniBatchKMeans 聚类。
+聚类样本数最多 4096 个，与图像分辨率无关。
+"""
+import logging
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+logger = logging.getLogger(__name__)
+
+# 每通道量化位数
+QUANT_BITS = 4
+BINS_PER_CHANNEL = 1 << QUANT_BITS
+
+
+class ColorPalette:
+    """调色板：主要颜色（RGB）、占比、颜色多样性和各通道方差"""
+
+    def __init__(self, colors: np.ndarray, percentages: np.ndarray, color_variance: np.ndarray):
+        order = np.argsort(percentages, kind="stable")[::-1]
+        self.colors = colors[order]
+        self.percentages = percentages[order]
+        self.color_variance = color_variance
+
+    @property
+    def diversity(self) -> int:
+        """有像素归属的聚类数"""
+        return int(np.count_nonzero(self.percentages))
+
+    def as_features(self) -> dict:
+        """_calculate_color_features 使用的格式"""
+        return {
+            "dominant_colors": self.colors,
+            "color_percentages": self.percentages,
+            "color_variance": self.color_variance,
+            "color_diversity": self.diversity
+        }
+
+
+def compute_palette(rgb: np.ndarray, n_colors: int = 5) -> ColorPalette:
+    """计算图像的调色板（输入为 HxWx3 的 RGB uint8 数组）"""
+    pixels = rgb.reshape(-1, 3)
+    total = pixels.shape[0]
+
+    # 量化到三维直方图，同时累加每个区间的颜色和用于求平均颜色
+    quantized = (pixels >> (8 - QUANT_BITS)).astype(np.intp)
+    bin_index = (quantized[:, 0] * BINS_PER_CHANNEL + quantized[:, 1]) * BINS_PER_CHANNEL + quantized[:, 2]
+    n_bins = BINS_PER_CHANNEL ** 3
+    counts = np.bincount(bin_index, minlength=n_bins)
+    sums = np.stack(
+        [np.bincount(bin_index, weights=pixels[:, c], minlength=n_bins) for c in range(3)],
+        axis=1
+    )
+
+    occupied = np.flatnonzero(counts)
+    weights = counts[occupied].astype(np.float64)
+    bin_colors = sums[occupied] / weights[:, None]
+
+    # 各通道方差：由区间的一阶、二阶矩无法精确还原，直接在像素上计算
+    color_variance = pixels.var(axis=0)
+
+    n_clusters = min(n_colors, len(occupied))
+    if n_clusters == len(occupied):
+        # 颜色种类不超过聚类数，直接使用各区间
+        colors, cluster_weights = bin_colors, weights
+    else:
+        kmeans = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            random_state=42,
+            n_init=3,
+            batch_size=1024
+        )
+        labels = kmeans.fit_predict(bin_colors, sample_weight=weights)
+        cluster_weights = np.bincount(labels, weights=weights, minlength=n_clusters)
+        colors = kmeans.cluster_centers_
+
+    return ColorPalette(colors, cluster_weights / total, color_variance)
@@ -81,6 +81,8 @@ class ConfigManager:
                 "thumbnail_sizes": [150, 300, 600],
                 "enable_ai_tagging": True,
                 "ai_confidence_threshold": 0.6
+                # 各类特征的长边上限 analysis_max_edge 的默认值见 utils/image_pipeline.py DEFAULT_ANALYSIS_MAX_EDGE，
+                # 分类器级联 classifier_cascade 的默认值见 utils/classifier_cascade.py
             },
             
             # 通知配置
@@ -103,6 +105,10 @@ class ConfigManager:
         """获取配置值"""
         return self._cache.get(key, default)
     
+    def set_local(self, key: str, value: Any):
+        """只更新内存中的配置，不写数据库（推理工作进程用来同步主进程的配置）"""
+        self._cache[key] = value
+    
     def set(self, key: str, value: Any, db: Session) -> bool:
         """设置配置值"""
         try:
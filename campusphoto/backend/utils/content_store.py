@@ -0,0 +1,149 @@
+"""
+内容寻址的原图存储
+
+上传内容以 SHA-256 为键保存在 static/uploads/cas/<前两位>/<哈希>.<扩展名>，
+相同内容只保存一份，由 stored_images.ref_count 记录被多少作品引用。
+作品的 image_url 直接指向该路径，删除作品时据此释放引用。
+"""
+from typing import BinaryIO, Optional, Tuple
+import hashlib
+import logging
+import os
+import re
+import uuid
+
+from fastapi import UploadFile
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.models import StoredImage
+from .upload_storage import CHUNK_SIZE, save_upload, remove_quietly
+
+logger = logging.getLogger(__name__)
+
+CAS_DIR = "static/uploads/cas"
+STAGING_DIR = os.path.join(CAS_DIR, ".staging")
+
+_CAS_URL_PATTERN = re.compile(r"^/static/uploads/cas/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$")
+
+
+def storage_path_for(content_hash: str, file_ext: str) -> str:
+    """根据内容哈希计算存储路径"""
+    return os.path.join(CAS_DIR, content_hash[:2], f"{content_hash}.{file_ext}")
+
+
+def url_for(stored: StoredImage) -> str:
+    """存储对象对应的访问URL"""
+    return "/" + stored.storage_path.replace(os.sep, "/")
+
+
+def hash_from_url(image_url: Optional[str]) -> Optional[str]:
+    """从 image_url 中解析内容哈希，非内容寻址的旧URL返回 None"""
+    if not image_url:
+        return None
+    match = _CAS_URL_PATTERN.match(image_url)
+    return match.group(1) if match else None
+
+
+async def stage_upload(file: UploadFile, max_size: int) -> Tuple[str, str, int]:
+    """流式写入暂存区并计算哈希，返回 (暂存路径, 内容哈希, 大小)"""
+    hasher = hashlib.sha256()
+    staging_path = os.path.join(STAGING_DIR, f"{uuid.uuid4().hex}.part")
+    size = await save_upload(file, staging_path, max_size, hasher=hasher)
+    return staging_path, hasher.hexdigest(), size
+
+
+def commit_staged(db: Session, staging_path: str, content_hash: str, file_ext: str, size: int) -> Tuple[StoredImage, bool]:
+    """将暂存文件纳入内容存储并增加引用计数
+
+    返回 (存储对象, 是否为新内容)。内容已存在时直接丢弃暂存文件。
+    """
+    stored = db.query(StoredImage).filter(StoredImage.content_hash == content_hash).first()
+    if stored is not None and os.path.exists(stored.storage_path):
+        remove_quietly(staging_path)
+        _increment(db, stored)
+        return stored, False
+
+    if stored is not None:
+        # 记录存在但文件丢失，用本次上传的内容补回
+        os.makedirs(os.path.dirname(stored.storage_path), exist_ok=True)
+        os.replace(staging_path, stored.storage_path)
+        _increment(db, stored)
+        return stored, False
+
+    final_path = storage_path_for(content_hash, file_ext)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(staging_path, final_path)
+
+    stored = StoredImage(
+        content_hash=content_hash,
+        file_ext=file_ext,
+        storage_path=final_path,
+        size=size,
+        ref_count=1
+    )
+    try:
+        with db.begin_nested():
+            db.add(stored)
+    except IntegrityError:
+        # 并发上传了相同内容，改为引用已有记录
+        stored = db.query(StoredImage).filter(StoredImage.content_hash == content_hash).one()
+        if stored.storage_path != final_path:
+            remove_quietly(final_path)
+        _increment(db, stored)
+        return stored, False
+    return stored, True
+
+
+def _increment(db: Session, stored: StoredImage):
+    db.query(StoredImage).filter(StoredImage.id == stored.id).update(
+        {StoredImage.ref_count: StoredImage.ref_count + 1},
+        synchronize_session=False
+    )
+
+
+def release(db: Session, image_url: Optional[str]) -> Optional[str]:
+    """释放作品对原图的引用
+
+    引用计数归零时删除存储记录并返回应删除的文件路径，由调用方在提交事务后删除。
+    """
+    content_hash = hash_from_url(image_url)
+    if content_hash is None:
+        return None
+
+    db.query(StoredImage).filter(StoredImage.content_hash == content_hash).update(
+        {StoredImage.ref_count: StoredImage.ref_count - 1},
+        synchronize_session=False
+    )
+    stored = db.query(StoredImage).filter(StoredImage.content_hash == content_hash).first()
+    if stored is None:
+        return None
+    db.refresh(stored)
+    if stored.ref_count > 0:
+        return None
+
+    storage_path = stored.storage_path
+    db.delete(stored)
+    return storage_path
+
+
+def hash_stream(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> str:
+    """计算文件对象内容的 SHA-256（读取后回到开头）"""
+    hasher = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+
+def remove_stored_files(storage_path: Optional[str], thumbnail_dir: str = "static/thumbnails"):
+    """删除原图及其缩略图（在释放引用并提交事务后调用）"""
+    if not storage_path:
+        return
+    remove_quietly(storage_path)
+    content_hash = os.path.splitext(os.path.basename(storage_path))[0]
+    if os.path.isdir(thumbnail_dir):
+        for name in os.listdir(thumbnail_dir):
+            if name.startswith(f"{content_hash}_thumb_"):
+                remove_quietly(os.path.join(thumbnail_dir, name))
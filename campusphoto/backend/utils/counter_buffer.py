@@ -0,0 +1,232 @@
+"""
+作品互动计数的写回缓冲（Write-Behind）
+
+浏览、点赞、收藏、投票不再在每个请求中更新 photos 行，而是累加为进程内的增量，
+每 settings.counter_flush_interval 秒（或待写回的作品数达到 settings.counter_max_pending 时）
+用一条 executemany 的 UPDATE ... SET views = views + :d 批量写回，热门作品不再出现行锁争用。
+
+读取计数的接口用 apply() 叠加尚未写回的增量，同一进程内写入后立即可读（read-your-writes）；
+增量只保存在本进程中，多进程部署时其他进程要到写回后才能看到。
+写回失败时增量放回缓冲区下次重试；应用关闭时 stop() 做最后一次写回，仍失败的增量记录到错误日志。
+写回后使缓存中相应的计数失效：点赞、收藏、投票失效作品的 photo 标签，
+只有浏览量变化时失效 photo_views 标签（只有叠加了缓冲区增量的 Write-Behind 详情带有该标签），
+热门作品的这类缓存条目每个写回间隔最多重新加载一次。
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, case, update
+
+from config import settings
+from models.database import SessionLocal
+from models.models import Photo
+from .cache_strategies import PHOTO_VIEWS_TAG, cache_tag, invalidate_cache
+
+logger = logging.getLogger(__name__)
+
+# 缓冲的计数字段
+COUNTER_FIELDS = ("views", "likes", "favorites", "votes")
+
+# 写回后需要让作品全部详情缓存失效的字段（浏览量只失效 PHOTO_VIEWS_TAG 标签）
+VISIBLE_FIELDS = ("likes", "favorites", "votes")
+
+_photos = Photo.__table__
+
+
+def _counter_value(field: str):
+    """字段加上增量，结果不小于 0（取消点赞等减量可能先于对应的加量写回）"""
+    column = _photos.c[field]
+    delta = bindparam(f"d_{field}")
+    return case((column + delta < 0, 0), else_=column + delta)
+
+
+# 一条语句更新四个计数，按作品 executemany
+_FLUSH_STATEMENT = (
+    update(_photos)
+    .where(_photos.c.id == bindparam("photo_id"))
+    .values({field: _counter_value(field) for field in COUNTER_FIELDS})
+)
+
+
+def _merge(target: Dict[int, Dict[str, int]], source: Dict[int, Dict[str, int]]):
+    for photo_id, deltas in source.items():
+        counters = target.setdefault(photo_id, {})
+        for field, delta in deltas.items():
+            counters[field] = counters.get(field, 0) + delta
+
+
+def _stale_tags(batch: Dict[int, Dict[str, int]]) -> List[str]:
+    """写回这批增量后需要失效的缓存标签"""
+    tags = []
+    for photo_id, deltas in batch.items():
+        if any(deltas.get(field) for field in VISIBLE_FIELDS):
+            tags.append(cache_tag("photo", photo_id))
+        elif deltas.get("views"):
+            tags.append(cache_tag(PHOTO_VIEWS_TAG, photo_id))
+    return tags
+
+
+class CounterBuffer:
+    """按作品累加计数增量，定期批量写回数据库（只在事件循环线程中调用）"""
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._pending: Dict[int, Dict[str, int]] = {}
+        # 正在写回的增量，提交完成前读取时仍需叠加
+        self._flushing: Dict[int, Dict[str, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "added": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "failures": 0,
+            "last_flush_ms": 0.0
+        }
+
+    def add(self, photo_id: int, field: str, delta: int = 1):
+        """记录一次计数变化"""
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"不支持的计数字段: {field}")
+        counters = self._pending.setdefault(photo_id, {})
+        counters[field] = counters.get(field, 0) + delta
+        self.stats["added"] += 1
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def pending(self, photo_id: int) -> Dict[str, int]:
+        """该作品尚未写入数据库的增量"""
+        result: Dict[str, int] = {}
+        for source in (self._flushing, self._pending):
+            for field, delta in source.get(photo_id, {}).items():
+                result[field] = result.get(field, 0) + delta
+        return result
+
+    def apply(self, photo_id: int, target: Any) -> Any:
+        """
+        在数据库（或缓存）读出的计数上叠加未写回的增量
+
+        target 为 dict 时返回修改后的副本（缓存中的对象是共享的，不能原地修改），
+        其他对象（如 Pydantic 模型）直接设置属性并返回；只处理 target 中已有的计数字段。
+        """
+        deltas = {field: delta for field, delta in self.pending(photo_id).items() if delta}
+        if not deltas:
+            return target
+        if isinstance(target, dict):
+            target = dict(target)
+            for field, delta in deltas.items():
+                if target.get(field) is not None:
+                    target[field] = max(0, target[field] + delta)
+            return target
+        for field, delta in deltas.items():
+            if getattr(target, field, None) is not None:
+                setattr(target, field, max(0, getattr(target, field) + delta))
+        return target
+
+    def start(self):
+        """在当前事件循环中启动定期写回"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止定期写回并写回剩余的增量（应用关闭时调用）"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        if self._pending:
+            logger.error(f"关闭时仍有计数增量未能写回: {self._pending}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """把当前缓冲的增量批量写回数据库，返回写回的作品数"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            started = time.perf_counter()
+            # 线程中的写入无法中途取消：flush 被取消（如 stop()）时先等写入结束再按结果处理，
+            # 否则这批增量既不在缓冲区中，也不确定是否已写入数据库
+            write = asyncio.ensure_future(run_in_threadpool(self._write, batch))
+            cancelled = False
+            while not write.done():
+                try:
+                    await asyncio.shield(write)
+                except asyncio.CancelledError:
+                    cancelled = True
+                except Exception:
+                    pass
+            try:
+                write.result()
+            except Exception as e:
+                # 放回缓冲区，与期间新增的增量合并后下次重试
+                self._flushing = {}
+                _merge(self._pending, batch)
+                self.stats["failures"] += 1
+                logger.error(f"计数增量写回失败，{len(batch)} 个作品稍后重试: {e}")
+                if cancelled:
+                    raise asyncio.CancelledError()
+                return 0
+
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            try:
+                # 缓存失效完成前，读取缓存的请求仍叠加这批增量
+                tags = _stale_tags(batch)
+                if tags:
+                    await invalidate_cache(*tags)
+            finally:
+                self._flushing = {}
+            if cancelled:
+                raise asyncio.CancelledError()
+            return len(batch)
+
+    @staticmethod
+    def _write(batch: Dict[int, Dict[str, int]]):
+        rows = [
+            {"photo_id": photo_id, **{f"d_{field}": deltas.get(field, 0) for field in COUNTER_FIELDS}}
+            for photo_id, deltas in batch.items()
+        ]
+        db = SessionLocal()
+        try:
+            db.execute(_FLUSH_STATEMENT, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self._task is not None and not self._task.done(),
+            "flush_interval": self.flush_interval,
+            "pending_photos": len(self._pending),
+            "pending_deltas": sum(
+                abs(delta) for deltas in self._pending.values() for delta in deltas.values()
+            )
+        }
+
+
+# 全局计数缓冲
+counter_buffer = CounterBuffer(settings.counter_flush_interval, settings.counter_max_pending)
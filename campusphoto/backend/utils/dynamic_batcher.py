@@ -0,0 +1,130 @@
+"""
+动态微批处理
+
+并发的推理请求先进入队列，由单个工作线程在 max_wait_ms 内或凑满 max_batch_size 个后
+合并为一次批量前向计算，再把结果分别交还给各调用方。
+模型调用因此也被串行化到同一个线程，避免多线程同时使用一个模型实例。
+
+YOLO 的凑批只在多个线程共用同一模型时有意义：主进程内分析（inference_workers=0）
+和 evaluate_classifier.py 离线评估。推理进程池的工作进程同一时刻只分析一张图，
+初始化时把批大小设为 1，settings.yolo_max_batch_size 在那里不起作用。
+"""
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 队列中的停止信号
+_STOP = object()
+
+
+class DynamicBatcher:
+    """动态批处理器"""
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        name: str = "batcher"
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "largest_batch": 0,
+            "errors": 0
+        }
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """提交一个请求，返回可等待的 Future"""
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def run(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """提交请求并等待结果"""
+        return self.submit(item).result(timeout=timeout)
+
+    def shutdown(self, wait: bool = True):
+        """停止工作线程，已在队列中的请求会先处理完"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            if wait:
+                thread.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取批处理统计信息"""
+        stats = dict(self.stats)
+        stats["avg_batch_size"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+    def _collect(self, first) -> tuple:
+        """从第一个请求开始收集一批，返回 (批次, 是否收到停止信号)"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _worker(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+
+            # 调用方已取消的请求不再计算
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: List[tuple]):
+        items = [item for item, _ in batch]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"批处理返回 {len(results)} 个结果，期望 {len(items)} 个")
+        except Exception as e:
+            logger.error(f"{self.name} 批处理失败 (批大小 {len(items)}): {e}")
+            self.stats["errors"] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.stats["requests"] += len(items)
+        self.stats["batches"] += 1
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(items))
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
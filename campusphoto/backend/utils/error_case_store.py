@@ -0,0 +1,212 @@
+"""
+错误案例存储
+
+error_cases.json 有数万条记录，各分析脚本原先每次都完整 json.load 后用循环统计。
+这里把它导入同目录下的 SQLite 数据库（error_cases.db），按 期望/预测主题、路径和置信度建立索引，
+统计和筛选都交给 SQL；JSON 文件仍是数据来源，文件大小或修改时间变化时自动重新导入。
+每条记录的原始内容也保存下来，导出时原样写回。
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    id INTEGER PRIMARY KEY,
+    file_path TEXT NOT NULL DEFAULT '',
+    expected_theme TEXT NOT NULL DEFAULT '',
+    predicted_theme TEXT NOT NULL DEFAULT '',
+    confidence REAL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cases_themes ON cases (expected_theme, predicted_theme);
+CREATE INDEX IF NOT EXISTS idx_cases_predicted ON cases (predicted_theme);
+CREATE INDEX IF NOT EXISTS idx_cases_path ON cases (file_path);
+CREATE INDEX IF NOT EXISTS idx_cases_confidence ON cases (confidence);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 单条记录的列，顺序与 SELECT 一致
+CASE_COLUMNS = ("id", "file_path", "expected_theme", "predicted_theme", "confidence")
+
+
+def _text(value: Any) -> str:
+    return value.strip() if isinstance(value, str) else ""
+
+
+def _confidence(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ErrorCaseStore:
+    """error_cases.json 的 SQLite 索引"""
+
+    def __init__(self, json_path: Union[str, Path], db_path: Optional[Union[str, Path]] = None):
+        self.json_path = Path(json_path)
+        self.db_path = Path(db_path) if db_path else self.json_path.with_suffix(".db")
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(SCHEMA)
+        self.refresh()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> "ErrorCaseStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- 导入与导出 ----
+
+    def _source_signature(self) -> Optional[str]:
+        if not self.json_path.exists():
+            return None
+        stat = self.json_path.stat()
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[str]):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def refresh(self, force: bool = False) -> bool:
+        """JSON 文件变化时重新导入，返回是否导入"""
+        signature = self._source_signature()
+        if signature is None or (not force and signature == self._get_meta("source_signature")):
+            return False
+
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records = [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+
+        with self.conn:
+            self.conn.execute("DELETE FROM cases")
+            self.conn.executemany(
+                "INSERT INTO cases (file_path, expected_theme, predicted_theme, confidence, raw) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        _text(item.get("file_path") or item.get("path")),
+                        _text(item.get("expected_theme")),
+                        _text(item.get("predicted_theme")),
+                        _confidence(item.get("confidence")),
+                        json.dumps(item, ensure_ascii=False)
+                    )
+                    for item in records
+                )
+            )
+            self._set_meta("source_signature", signature)
+        return True
+
+    def export_json(self, path: Optional[Union[str, Path]] = None):
+        """按原始内容写回 JSON（默认覆盖数据来源），写回后不会触发重新导入"""
+        path = Path(path) if path else self.json_path
+        records = [json.loads(raw) for (raw,) in self.conn.execute("SELECT raw FROM cases ORDER BY id")]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        if path == self.json_path:
+            with self.conn:
+                self._set_meta("source_signature", self._source_signature())
+
+    # ---- 统计 ----
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+
+    def theme_counts(self) -> Counter:
+        """各期望主题的记录数"""
+        rows = self.conn.execute(
+            "SELECT expected_theme, COUNT(*) FROM cases WHERE expected_theme != '' GROUP BY expected_theme"
+        )
+        return Counter(dict(rows.fetchall()))
+
+    def confusion_counts(self) -> Dict[str, int]:
+        """误判类别 "期望->预测" 的记录数，按数量降序"""
+        rows = self.conn.execute(
+            "SELECT expected_theme || '->' || predicted_theme, COUNT(*) AS n FROM cases "
+            "WHERE expected_theme != '' AND predicted_theme != '' AND expected_theme != predicted_theme "
+            "GROUP BY expected_theme, predicted_theme ORDER BY n DESC"
+        )
+        return dict(rows.fetchall())
+
+    # ---- 查询 ----
+
+    def _where(self, expected: Optional[str], predicted: Optional[str], path: Optional[str],
+               path_contains: Optional[str], min_confidence: Optional[float],
+               max_confidence: Optional[float]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if expected is not None:
+            clauses.append("expected_theme = ?")
+            params.append(expected)
+        if predicted is not None:
+            clauses.append("predicted_theme = ?")
+            params.append(predicted)
+        if path is not None:
+            clauses.append("file_path = ?")
+            params.append(path)
+        if path_contains:
+            clauses.append("instr(file_path, ?) > 0")
+            params.append(path_contains)
+        if min_confidence is not None:
+            clauses.append("confidence >= ?")
+            params.append(min_confidence)
+        if max_confidence is not None:
+            clauses.append("confidence <= ?")
+            params.append(max_confidence)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def cases(
+        self,
+        expected: Optional[str] = None,
+        predicted: Optional[str] = None,
+        path: Optional[str] = None,
+        path_contains: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        max_confidence: Optional[float] = None,
+        limit: Optional[int] = None,
+        raw: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        按条件筛选记录
+
+        path 为完整路径（走索引），path_contains 为路径片段；raw 为 True 时返回原始 JSON 记录，否则返回索引列
+        """
+        where, params = self._where(expected, predicted, path, path_contains, min_confidence, max_confidence)
+        columns = "raw" if raw else ", ".join(CASE_COLUMNS)
+        sql = f"SELECT {columns} FROM cases{where} ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self.conn.execute(sql, params)
+        if raw:
+            return [json.loads(row[0]) for row in rows]
+        return [dict(zip(CASE_COLUMNS, row)) for row in rows]
+
+    def iter_rows(self) -> Iterator[Tuple[str, str, str]]:
+        """按导入顺序遍历 (路径, 期望主题, 预测主题)"""
+        return self.conn.execute("SELECT file_path, expected_theme, predicted_theme FROM cases ORDER BY id")
+
+    def delete_cases(self, path_contains: str) -> int:
+        """删除路径包含指定片段的记录，返回删除数"""
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM cases WHERE instr(file_path, ?) > 0", (path_contains,))
+        return cursor.rowcount
+
+
+def open_store(json_path: Union[str, Path], db_path: Optional[Union[str, Path]] = None) -> Optional[ErrorCaseStore]:
+    """打开错误案例存储，JSON 和已导入的数据库都不存在时返回 None"""
+    json_path = Path(json_path)
+    db = Path(db_path) if db_path else json_path.with_suffix(".db")
+    if not json_path.exists() and not db.exists():
+        return None
+    return ErrorCaseStore(json_path, db)
@@ -0,0 +1,80 @@
+"""
+单张图像的共享特征上下文
+
+灰度图、梯度、边缘、轮廓等中间结果在多个分析阶段中都会用到，
+这里在首次访问时计算并缓存，同一次分析内的各阶段直接复用，计算方式与原实现保持一致。
+"""
+from functools import cached_property
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+from .texture_features import calculate_lbp
+
+
+class FeatureContext:
+    """某一金字塔层级上按需计算的中间特征"""
+
+    def __init__(self, rgb: np.ndarray):
+        self.rgb = rgb
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        """灰度图"""
+        return cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+
+    @cached_property
+    def gray_float(self) -> np.ndarray:
+        """float64 灰度图，供差值类计算使用"""
+        return self.gray.astype(float)
+
+    @cached_property
+    def brightness(self) -> float:
+        """平均亮度（0-1）"""
+        return np.mean(self.gray) / 255.0
+
+    @cached_property
+    def contrast(self) -> float:
+        """亮度标准差（0-1）"""
+        return np.std(self.gray) / 255.0
+
+    @cached_property
+    def gradients(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Sobel 梯度 (x方向, y方向)"""
+        grad_x = cv2.Sobel(self.gray, cv2.CV_64F, 1, 0, ksize=3)
+        grad_y = cv2.Sobel(self.gray, cv2.CV_64F, 0, 1, ksize=3)
+        return grad_x, grad_y
+
+    @cached_property
+    def gradient_magnitude(self) -> np.ndarray:
+        """梯度幅值"""
+        grad_x, grad_y = self.gradients
+        return np.sqrt(grad_x**2 + grad_y**2)
+
+    @cached_property
+    def edges(self) -> np.ndarray:
+        """Canny 边缘 (50, 150)"""
+        return cv2.Canny(self.gray, 50, 150)
+
+    @cached_property
+    def contours(self) -> tuple:
+        """边缘图的外轮廓"""
+        contours, _ = cv2.findContours(self.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return contours
+
+    @cached_property
+    def laplacian(self) -> np.ndarray:
+        """拉普拉斯响应"""
+        return cv2.Laplacian(self.gray, cv2.CV_64F)
+
+    @cached_property
+    def noise(self) -> np.ndarray:
+        """与 5x5 高斯模糊结果的差值（高频成分）"""
+        blurred = cv2.GaussianBlur(self.gray, (5, 5), 0)
+        return self.gray_float - blurred.astype(float)
+
+    @cached_property
+    def lbp(self) -> np.ndarray:
+        """局部二值模式"""
+        return calculate_lbp(self.gray)
@@ -0,0 +1,132 @@
+"""
+实验图片目录的持久化文件名索引
+
+误判查看工具需要按文件名在 ai/exp 下找回被移动的图片，原先每次运行都完整 os.walk 整棵目录树。
+这里把目录树保存到 SQLite：每个目录记录修改时间和子目录，每个文件记录 NFC 规范化后的文件名和路径。
+刷新时只 stat 目录，目录修改时间未变（没有增删或重命名条目）的直接沿用上次的文件列表，
+只有发生变化的目录才重新列出。文件名和路径统一按 NFC 比较，macOS 上的 NFD 路径也能命中。
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import os
+import sqlite3
+import unicodedata
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    path_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS idx_files_name_key ON files (name_key);
+CREATE INDEX IF NOT EXISTS idx_files_path_key ON files (path_key);
+"""
+
+
+def nfc(value: str) -> str:
+    return unicodedata.normalize('NFC', value)
+
+
+class FilenameIndex:
+    """目录树的文件名索引"""
+
+    def __init__(self, root: Union[str, Path], db_path: Union[str, Path]):
+        self.root = os.path.normpath(str(root))
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> "FilenameIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def refresh(self) -> Dict[str, int]:
+        """按目录修改时间增量刷新，返回检查和重新列出的目录数"""
+        known = dict(self.conn.execute("SELECT path, mtime_ns FROM dirs"))
+        children: Dict[str, List[str]] = {}
+        for path, parent in self.conn.execute("SELECT path, parent FROM dirs"):
+            children.setdefault(parent, []).append(path)
+
+        stats = {"checked": 0, "rescanned": 0, "removed": 0}
+        seen = set()
+        stack = [self.root] if os.path.isdir(self.root) else []
+        with self.conn:
+            while stack:
+                directory = stack.pop()
+                try:
+                    mtime_ns = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(directory)
+                stats["checked"] += 1
+
+                if known.get(directory) == mtime_ns:
+                    # 条目未变化，子目录也沿用上次的记录
+                    stack.extend(children.get(directory, []))
+                    continue
+
+                stats["rescanned"] += 1
+                subdirs, files = self._list(directory)
+                self.conn.execute("DELETE FROM files WHERE dir = ?", (directory,))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO files (path, dir, name_key, path_key) VALUES (?, ?, ?, ?)",
+                    ((path, directory, nfc(os.path.basename(path)), nfc(path)) for path in files)
+                )
+                parent = os.path.dirname(directory) if directory != self.root else None
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                    (directory, parent, mtime_ns)
+                )
+                stack.extend(subdirs)
+
+            # 已删除或移走的目录
+            for directory in set(known) - seen:
+                self.conn.execute("DELETE FROM files WHERE dir = ?", (directory,))
+                self.conn.execute("DELETE FROM dirs WHERE path = ?", (directory,))
+                stats["removed"] += 1
+        return stats
+
+    @staticmethod
+    def _list(directory: str):
+        subdirs, files = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name:
+                            files.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return subdirs, files
+
+    def find_by_name(self, name: str) -> List[Path]:
+        """按文件名查找（NFC/NFD 均可）"""
+        rows = self.conn.execute("SELECT path FROM files WHERE name_key = ?", (nfc(name),))
+        return [Path(path) for (path,) in rows]
+
+    def resolve(self, path: Union[str, Path]) -> Optional[Path]:
+        """返回索引中与给定路径对应的实际路径（忽略 NFC/NFD 差异），不存在时返回 None"""
+        key = nfc(os.path.normpath(str(path)))
+        row = self.conn.execute("SELECT path FROM files WHERE path_key = ?", (key,)).fetchone()
+        return Path(row[0]) if row else None
+
+    def contains(self, path: Union[str, Path]) -> bool:
+        """路径是否位于索引的目录树内"""
+        key = nfc(os.path.normpath(str(path)))
+        return key == nfc(self.root) or key.startswith(nfc(self.root) + os.sep)
@@ -3,16 +3,25 @@
 """
 import os
 import logging
+import time
 import numpy as np
-from PIL import Image
-import cv2
 from typing import Dict, List, Tuple, Optional
-from sklearn.cluster import KMeans
 import colorsys
+from .classifier_cascade import get_cascade_config
+from .color_palette import ColorPalette, compute_palette
+from .feature_context import FeatureContext
+from .image_pipeline import DecodedImage, get_analysis_max_edges
+from .texture_features import lbp_histogram
 from .yolo_image_classifier import yolo_classifier
 
 logger = logging.getLogger(__name__)
 
+# 早期传统方法使用的主题名称与当前分类体系的对应关系
+LEGACY_THEME_ALIASES = {
+    "自然与风景": "自然风光",
+    "人物": "人像"
+}
+
 class HybridImageClassifier:
     """混合图像分类器 - 结合多种方法"""
     
@@ -32,45 +41,123 @@ class HybridImageClassifier:
         }
     
     def classify_image(self, image_path: str) -> Dict:
-        """混合分类方法 - 完全依赖YOLO"""
+        """混合分类方法 - 从文件读取"""
+        try:
+            image = DecodedImage.open(image_path)
+        except Exception as e:
+            logger.error(f"混合分类失败: {str(e)}")
+            return self._fallback_classification()
+        return self.classify_decoded(image)
+    
+    def classify_decoded(self, image: DecodedImage, palette: Optional[ColorPalette] = None) -> Dict:
+        """级联分类 - 廉价的传统特征先行，只有不确定的图像才运行YOLO / ResNet50
+
+        palette 为图像分析器已计算的调色板，未传入时自行计算；
+        返回结果中的 cascade 记录由哪个阶段决定以及各阶段耗时
+        """
         try:
-            # 1. YOLO目标检测分类（唯一方法）
-            yolo_result = yolo_classifier.classify_image(image_path)
+            config = get_cascade_config()
+            stage_ms = {}
+            candidates = []
             
-            # 如果YOLO检测到任何目标，直接使用YOLO结果
-            if yolo_result['method'] == 'yolo' and yolo_result.get('detections'):
-                logger.info(f"YOLO检测分类: {yolo_result['theme']} ({yolo_result['confidence']:.2f})")
-                return yolo_result
+            def finish(result: Dict, stage: str) -> Dict:
+                result["cascade"] = {"decided_by": stage, "stage_ms": stage_ms}
+                return result
+            
+            # 1. 传统特征（亮度/边缘、颜色、纹理）多数一致且足够确定时直接返回
+            if config["features_enabled"]:
+                start = time.perf_counter()
+                features_result = self._features_stage(image, palette, config)
+                stage_ms["features"] = round((time.perf_counter() - start) * 1000, 2)
+                if features_result is not None:
+                    logger.info(f"传统特征分类: {features_result['theme']} ({features_result['confidence']:.2f})")
+                    return finish(features_result, "features")
             
-            # 2. 如果YOLO没有检测到目标，回退到传统方法
-            logger.info("YOLO未检测到目标，使用传统方法")
-            image = Image.open(image_path).convert('RGB')
-            image_array = np.array(image)
+            # 2. YOLO目标检测
+            start = time.perf_counter()
+            yolo_result = yolo_classifier.classify_array(image.bgr)
+            stage_ms["yolo"] = round((time.perf_counter() - start) * 1000, 2)
+            if yolo_result['method'] == 'yolo' and yolo_result.get('detections'):
+                if yolo_result['confidence'] >= config["yolo_threshold"]:
+                    logger.info(f"YOLO检测分类: {yolo_result['theme']} ({yolo_result['confidence']:.2f})")
+                    return finish(yolo_result, "yolo")
+                candidates.append(yolo_result)
             
-            traditional_result = self._traditional_classification(image_array)
+            # 3. 可选的 ResNet50 整图分类
+            if config["resnet_enabled"]:
+                start = time.perf_counter()
+                resnet_result = self._resnet_stage(image)
+                stage_ms["resnet"] = round((time.perf_counter() - start) * 1000, 2)
+                if resnet_result is not None:
+                    if resnet_result['confidence'] >= config["resnet_threshold"]:
+                        logger.info(f"ResNet50分类: {resnet_result['theme']} ({resnet_result['confidence']:.2f})")
+                        return finish(resnet_result, "resnet")
+                    candidates.append(resnet_result)
             
-            return traditional_result
+            # 4. 都不确定时取置信度最高的候选，没有候选则回退到传统方法
+            start = time.perf_counter()
+            if candidates:
+                result = max(candidates, key=lambda r: r['confidence'])
+            else:
+                logger.info("YOLO未检测到目标，使用传统方法")
+                result = self._traditional_classification(image.features)
+            stage_ms["fallback"] = round((time.perf_counter() - start) * 1000, 2)
+            return finish(result, "fallback")
             
         except Exception as e:
             logger.error(f"混合分类失败: {str(e)}")
             return self._fallback_classification()
     
-    def _traditional_classification(self, image_array: np.ndarray) -> Dict:
-        """传统特征分类"""
-        # 转换为灰度图
-        gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+    def _features_stage(self, image: DecodedImage, palette: Optional[ColorPalette], config: Dict) -> Optional[Dict]:
+        """传统特征阶段，不够确定时返回 None"""
+        combined = self._features_vote(image, palette)
+        if (combined is None or len(combined["methods_used"]) < config["features_min_agreement"]
+                or combined["confidence"] < config["features_threshold"]):
+            return None
+        return combined
+    
+    def _features_vote(self, image: DecodedImage, palette: Optional[ColorPalette] = None) -> Optional[Dict]:
+        """综合亮度/边缘、颜色、纹理三种传统方法的结果，methods_used 为给出该主题的方法"""
+        if palette is None:
+            palette = compute_palette(image.level(get_analysis_max_edges().get("color")).rgb)
+        results = [
+            self._traditional_classification(image.features),
+            self._color_based_classification(palette),
+            self._texture_based_classification(image.features)
+        ]
+        # 旧的传统方法使用另一套主题名称，映射到当前分类体系；无法映射的结果不参与投票
+        for result in results:
+            result["theme"] = LEGACY_THEME_ALIASES.get(result["theme"], result["theme"])
+        results = [r for r in results if r["theme"] in self.subcategory_mapping]
+        if not results:
+            return None
         
+        combined = self._combine_classifications(*results)
+        combined["method"] = "features"
+        return combined
+    
+    def _resnet_stage(self, image: DecodedImage) -> Optional[Dict]:
+        """ResNet50 阶段，模型不可用时返回 None"""
+        # 只在启用时导入，避免加载 torchvision 并登记模型
+        from .ai_image_classifier import ai_classifier
+        if not ai_classifier.model:
+            return None
+        result = ai_classifier.classify_pil(image.to_pil())
+        result["method"] = "resnet"
+        return result
+    
+    def _traditional_classification(self, features: FeatureContext) -> Dict:
+        """传统特征分类（使用共享特征上下文）"""
         # 计算基础特征
-        brightness = np.mean(gray) / 255.0
-        contrast = np.std(gray) / 255.0
+        brightness = features.brightness
+        contrast = features.contrast
         
         # 边缘检测
-        edges = cv2.Canny(gray, 50, 150)
+        edges = features.edges
         edge_density = np.sum(edges) / (edges.shape[0] * edges.shape[1])
         
         # 轮廓分析
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        contour_count = len(contours)
+        contour_count = len(features.contours)
         
         # 基于特征分类
         if brightness > 0.7 and contrast < 0.3:
@@ -84,21 +171,11 @@ class HybridImageClassifier:
         else:
             return {"theme": "自然与风景", "confidence": 0.6, "method": "traditional"}
     
-    def _color_based_classification(self, image_array: np.ndarray) -> Dict:
-        """基于颜色的分类"""
-        # 计算主色调
-        pixels = image_array.reshape(-1, 3)
-        
-        # 使用K-means聚类
+    def _color_based_classification(self, palette: ColorPalette) -> Dict:
+        """基于颜色的分类（使用共享调色板中占比最高的三种颜色）"""
         try:
-            kmeans = KMeans(n_clusters=3, random_state=42, n_init=10)
-            kmeans.fit(pixels)
-            dominant_colors = kmeans.cluster_centers_
-            labels = kmeans.labels_
-            
-            # 计算颜色比例
-            color_counts = np.bincount(labels)
-            color_percentages = color_counts / len(labels)
+            dominant_colors = palette.colors[:3]
+            color_percentages = palette.percentages[:3]
             
             # 分析颜色特征
             avg_color = np.mean(dominant_colors, axis=0)
@@ -131,21 +208,16 @@ class HybridImageClassifier:
             logger.warning(f"颜色分析失败: {str(e)}")
             return {"theme": "自然与风景", "confidence": 0.5, "method": "color"}
     
-    def _texture_based_classification(self, image_array: np.ndarray) -> Dict:
-        """基于纹理的分类"""
-        # 转换为灰度图
-        gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+    def _texture_based_classification(self, features: FeatureContext) -> Dict:
+        """基于纹理的分类（使用共享特征上下文）"""
         
         # 计算纹理特征
         # 1. 局部二值模式 (LBP)
-        lbp = self._calculate_lbp(gray)
-        lbp_hist = np.histogram(lbp, bins=256)[0]
+        lbp_hist = lbp_histogram(features.lbp)
         lbp_entropy = -np.sum((lbp_hist / np.sum(lbp_hist)) * np.log2((lbp_hist / np.sum(lbp_hist)) + 1e-10))
         
         # 2. 梯度特征
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
+        gradient_magnitude = features.gradient_magnitude
         gradient_mean = np.mean(gradient_magnitude)
         gradient_std = np.std(gradient_magnitude)
         
@@ -164,35 +236,8 @@ class HybridImageClassifier:
         else:
             return {"theme": "自然与风景", "confidence": 0.6, "method": "texture"}
     
-    def _calculate_lbp(self, image: np.ndarray) -> np.ndarray:
-        """计算局部二值模式"""
-        rows, cols = image.shape
-        lbp = np.zeros_like(image)
-        
-        for i in range(1, rows - 1):
-            for j in range(1, cols - 1):
-                center = image[i, j]
-                binary_string = ""
-                
-                # 8邻域
-                neighbors = [
-                    image[i-1, j-1], image[i-1, j], image[i-1, j+1],
-                    image[i, j+1], image[i+1, j+1], image[i+1, j],
-                    image[i+1, j-1], image[i, j-1]
-                ]
-                
-                for neighbor in neighbors:
-                    binary_string += "1" if neighbor >= center else "0"
-                
-                lbp[i, j] = int(binary_string, 2)
-        
-        return lbp
-    
-    def _combine_classifications(self, traditional: Dict, color: Dict, texture: Dict) -> Dict:
+    def _combine_classifications(self, *results: Dict) -> Dict:
         """综合多个分类结果"""
-        # 收集所有分类结果
-        results = [traditional, color, texture]
-        
         # 统计每个主题的得分
         theme_scores = {}
         for result in results:
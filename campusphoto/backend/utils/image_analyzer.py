@@ -1,23 +1,31 @@
 """
 图像分析工具 - AI增强版本
 """
-from typing import Dict, List, Tuple, Optional
+from typing import BinaryIO, Dict, List, Tuple, Optional, Union
+import hashlib
 import os
 import tempfile
 import logging
 import random
-import shutil
 import numpy as np
-from PIL import Image
 import cv2
-from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 import colorsys
 from .hybrid_image_classifier import hybrid_classifier
+from .color_palette import ColorPalette, compute_palette
+from .feature_context import FeatureContext
+from .classifier_cascade import get_cascade_config
+from .image_pipeline import DecodedImage, get_analysis_max_edges
+from .texture_features import lbp_histogram
+from .thumbnails import generate_derivatives
+from .yolo_image_classifier import yolo_classifier
 
 logger = logging.getLogger(__name__)
 
+# 分析流程版本，修改分析逻辑或结果格式后递增，使缓存的旧结果失效
+ANALYZER_VERSION = 3
+
 
 class ImageAnalyzer:
     """图像分析器"""
@@ -54,36 +62,59 @@ class ImageAnalyzer:
             "white": "白色"
         }
     
-    def analyze_image(self, image_path: str) -> Dict:
+    def get_model_name(self) -> str:
+        """当前使用的YOLO模型文件名，模型不可用时为 no-model"""
+        return os.path.basename(yolo_classifier.model_path) if yolo_classifier.model else "no-model"
+    
+    def get_version(self, model_name: Optional[str] = None) -> str:
+        """分析器版本标识：流程版本 + 模型 + 各特征分辨率上限
+
+        model_name 为实际执行分析的进程中的模型名，默认取当前进程
+        """
+        model = model_name or self.get_model_name()
+        max_edges = ",".join(f"{k}={v}" for k, v in sorted(get_analysis_max_edges().items()))
+        cascade = ",".join(f"{k}={v}" for k, v in sorted(get_cascade_config().items()))
+        params = hashlib.sha1(f"{max_edges};{cascade}".encode()).hexdigest()[:8]
+        return f"v{ANALYZER_VERSION}-{model}-{params}"
+    
+    def analyze_image(self, image_path: Union[str, BinaryIO]) -> Dict:
         """
         分析图像，返回主题分类、置信度、主色调等信息
+
+        image_path 也可以是已打开的二进制文件对象（如上传文件），直接在内存中解码
         """
         try:
-            # 检查文件是否存在
-            if not os.path.exists(image_path):
-                raise ValueError(f"图像文件不存在: {image_path}")
-            
-            # 获取文件大小
-            file_size = os.path.getsize(image_path)
-            
-            # 加载图像
-            image = Image.open(image_path)
-            image_array = np.array(image)
+            # 只解码一次，后续各阶段共用
+            image = DecodedImage.open(image_path)
+        except Exception as e:
+            logger.error(f"图像分析失败: {str(e)}")
+            return self._fallback_analysis(image_path)
+        return self.analyze_decoded(image)
+    
+    def analyze_decoded(self, image: DecodedImage, max_edges: Optional[Dict[str, int]] = None) -> Dict:
+        """分析已解码的图像
+
+        max_edges 为各类特征的长边上限，默认读取配置；尺寸、EXIF等信息始终取自原图
+        """
+        try:
+            if max_edges is None:
+                max_edges = get_analysis_max_edges()
+            image.build_pyramid(max_edges.values())
             
-            # 获取图像尺寸
-            width, height = image.size
+            # 调色板只计算一次，主色调分析和传统分类共用
+            palette = compute_palette(image.level(max_edges.get("color")).rgb)
             
             # AI主题分类
-            theme_result = self._classify_theme_ai(image_array)
+            theme_result = self._classify_theme_ai(image.level(max_edges.get("classification")), palette)
             
             # AI主色调分析
-            dominant_colors = self._extract_dominant_colors_ai(image_array)
+            dominant_colors = self._extract_dominant_colors_ai(palette)
             
             # AI图像质量评估
-            quality_score = self._assess_image_quality_ai(image_array)
+            quality_score = self._assess_image_quality_ai(image.level(max_edges.get("quality")))
             
             # AI构图分析
-            composition_features = self._analyze_composition_ai(image_array)
+            composition_features = self._analyze_composition_ai(image.level(max_edges.get("composition")))
             
             # 生成智能标签
             tags = self._generate_smart_tags(theme_result, dominant_colors, composition_features)
@@ -95,59 +126,44 @@ class ImageAnalyzer:
                 "dominant_colors": dominant_colors,
                 "quality_score": quality_score,
                 "composition": composition_features,
-                "exif": self._extract_exif_data(image),
-                "dimensions": {"width": width, "height": height},
-                "file_size": file_size,
-                "tags": tags
+                "exif": image.exif,
+                "dimensions": {"width": image.width, "height": image.height},
+                "file_size": image.file_size,
+                "tags": tags,
+                "cascade": theme_result.get("cascade")
             }
             
         except Exception as e:
             logger.error(f"图像分析失败: {str(e)}")
             # 回退到简单分析
-            return self._fallback_analysis(image_path)
+            return self._fallback_analysis(image.path)
     
-    def _classify_theme_ai(self, image_array: np.ndarray) -> Dict:
+    def _classify_theme_ai(self, image: DecodedImage, palette: Optional[ColorPalette] = None) -> Dict:
         """AI主题分类 - 使用深度学习模型"""
         try:
-            # 保存临时图像文件用于AI分类
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                # 转换numpy数组为PIL图像
-                if len(image_array.shape) == 3:
-                    image = Image.fromarray(image_array)
-                else:
-                    image = Image.fromarray(image_array, mode='L').convert('RGB')
-                
-                image.save(tmp.name)
-                temp_path = tmp.name
-            
-            try:
-                # 使用混合分类器
-                ai_result = hybrid_classifier.classify_image(temp_path)
-                
-                if ai_result and ai_result.get("theme"):
-                    return {
-                        "theme": ai_result["theme"],
-                        "subcategory": ai_result.get("subcategory"),
-                        "confidence": ai_result.get("confidence", 0.8)
-                    }
-                else:
-                    # AI分类失败，回退到传统方法
-                    return self._classify_theme_traditional(image_array)
-                    
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
+            # 使用混合分类器，直接传入已解码的图像
+            ai_result = hybrid_classifier.classify_decoded(image, palette)
+            
+            if ai_result and ai_result.get("theme"):
+                return {
+                    "theme": ai_result["theme"],
+                    "subcategory": ai_result.get("subcategory"),
+                    "confidence": ai_result.get("confidence", 0.8),
+                    "cascade": ai_result.get("cascade")
+                }
+            else:
+                # AI分类失败，回退到传统方法
+                return self._classify_theme_traditional(image, palette)
                     
         except Exception as e:
             logger.error(f"AI主题分类失败: {str(e)}")
-            return self._classify_theme_traditional(image_array)
+            return self._classify_theme_traditional(image, palette)
     
-    def _classify_theme_traditional(self, image_array: np.ndarray) -> Dict:
+    def _classify_theme_traditional(self, image: DecodedImage, palette: Optional[ColorPalette] = None) -> Dict:
         """传统主题分类 - 基于图像特征分析"""
         try:
             # 提取图像特征
-            features = self._extract_image_features(image_array)
+            features = self._extract_image_features(image, palette)
             
             # 基于特征进行分类
             theme, confidence = self._classify_by_features(features)
@@ -164,31 +180,24 @@ class ImageAnalyzer:
             logger.error(f"传统主题分类失败: {str(e)}")
             return self._classify_theme_simple()
     
-    def _extract_image_features(self, image_array: np.ndarray) -> Dict:
+    def _extract_image_features(self, image: DecodedImage, palette: Optional[ColorPalette] = None) -> Dict:
         """提取图像特征"""
-        # 转换为RGB
-        if len(image_array.shape) == 3:
-            rgb_image = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
-        else:
-            rgb_image = image_array
-        
-        # 转换为灰度图
-        gray = cv2.cvtColor(rgb_image, cv2.COLOR_BGR2GRAY)
+        features = image.features
         
         # 计算颜色特征
-        color_features = self._calculate_color_features(rgb_image)
+        color_features = self._calculate_color_features(palette or compute_palette(image.rgb))
         
         # 计算纹理特征
-        texture_features = self._calculate_texture_features(gray)
+        texture_features = self._calculate_texture_features(features)
         
         # 计算形状特征
-        shape_features = self._calculate_shape_features(gray)
+        shape_features = self._calculate_shape_features(features)
         
         # 计算亮度特征
-        brightness = np.mean(gray) / 255.0
+        brightness = features.brightness
         
         # 计算对比度
-        contrast = np.std(gray) / 255.0
+        contrast = features.contrast
         
         return {
             "color_features": color_features,
@@ -196,78 +205,35 @@ class ImageAnalyzer:
             "shape_features": shape_features,
             "brightness": brightness,
             "contrast": contrast,
-            "aspect_ratio": rgb_image.shape[1] / rgb_image.shape[0]
+            "aspect_ratio": image.width / image.height
         }
     
-    def _calculate_color_features(self, image: np.ndarray) -> Dict:
+    def _calculate_color_features(self, palette: ColorPalette) -> Dict:
         """计算颜色特征"""
-        # 计算主色调
-        pixels = image.reshape(-1, 3)
-        
-        # 检查颜色多样性
-        unique_colors = len(np.unique(pixels.view(np.dtype((np.void, pixels.dtype.itemsize * pixels.shape[1])))))
-        
-        # 根据颜色多样性调整聚类数量
-        n_clusters = min(5, max(2, unique_colors))
-        
-        try:
-            # 使用K-means聚类找到主要颜色
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-            kmeans.fit(pixels)
-            
-            # 获取主要颜色
-            dominant_colors = kmeans.cluster_centers_
-            labels = kmeans.labels_
-            
-            # 计算每种颜色的比例
-            color_counts = np.bincount(labels)
-            color_percentages = color_counts / len(labels)
-            
-            # 计算颜色分布
-            color_variance = np.var(pixels, axis=0)
-            
-            return {
-                "dominant_colors": dominant_colors,
-                "color_percentages": color_percentages,
-                "color_variance": color_variance,
-                "color_diversity": len(np.unique(labels))
-            }
-        except Exception as e:
-            logger.warning(f"K-means聚类失败，使用简化方法: {str(e)}")
-            # 回退到简单方法
-            unique_colors, counts = np.unique(pixels.view(np.dtype((np.void, pixels.dtype.itemsize * pixels.shape[1]))), return_counts=True)
-            dominant_colors = pixels[np.argmax(counts)]
-            return {
-                "dominant_colors": [dominant_colors],
-                "color_percentages": [1.0],
-                "color_variance": np.var(pixels, axis=0),
-                "color_diversity": 1
-            }
+        return palette.as_features()
     
-    def _calculate_texture_features(self, gray_image: np.ndarray) -> Dict:
+    def _calculate_texture_features(self, features: FeatureContext) -> Dict:
         """计算纹理特征"""
         # 计算LBP (Local Binary Pattern) 特征
-        lbp = self._calculate_lbp(gray_image)
+        lbp = features.lbp
         
         # 计算梯度特征
-        grad_x = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
+        gradient_magnitude = features.gradient_magnitude
         
         return {
-            "lbp_histogram": np.histogram(lbp, bins=256)[0],
+            "lbp_histogram": lbp_histogram(lbp),
             "gradient_mean": np.mean(gradient_magnitude),
             "gradient_std": np.std(gradient_magnitude),
             "texture_energy": np.sum(gradient_magnitude**2)
         }
     
-    def _calculate_shape_features(self, gray_image: np.ndarray) -> Dict:
+    def _calculate_shape_features(self, features: FeatureContext) -> Dict:
         """计算形状特征"""
         # 边缘检测
-        edges = cv2.Canny(gray_image, 50, 150)
+        edges = features.edges
         
         # 查找轮廓
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours = features.contours
         
         # 计算形状特征
         if contours:
@@ -293,30 +259,6 @@ class ImageAnalyzer:
             "circularity": circularity
         }
     
-    def _calculate_lbp(self, image: np.ndarray) -> np.ndarray:
-        """计算局部二值模式"""
-        rows, cols = image.shape
-        lbp = np.zeros_like(image)
-        
-        for i in range(1, rows - 1):
-            for j in range(1, cols - 1):
-                center = image[i, j]
-                binary_string = ""
-                
-                # 8邻域
-                neighbors = [
-                    image[i-1, j-1], image[i-1, j], image[i-1, j+1],
-                    image[i, j+1], image[i+1, j+1], image[i+1, j],
-                    image[i+1, j-1], image[i, j-1]
-                ]
-                
-                for neighbor in neighbors:
-                    binary_string += "1" if neighbor >= center else "0"
-                
-                lbp[i, j] = int(binary_string, 2)
-        
-        return lbp
-    
     def _classify_by_features(self, features: Dict) -> Tuple[str, float]:
         """基于特征进行分类"""
         # 基于规则的特征分类
@@ -437,37 +379,18 @@ class ImageAnalyzer:
             "confidence": confidence
         }
     
-    def _extract_dominant_colors_ai(self, image_array: np.ndarray) -> List[Dict]:
+    def _extract_dominant_colors_ai(self, palette: ColorPalette) -> List[Dict]:
         """AI主色调分析"""
         try:
-            # 重塑图像数据
-            pixels = image_array.reshape(-1, 3)
-            
-            # 使用K-means聚类找到主要颜色
-            kmeans = KMeans(n_clusters=5, random_state=42, n_init=10)
-            kmeans.fit(pixels)
-            
-            # 获取主要颜色和标签
-            dominant_colors = kmeans.cluster_centers_
-            labels = kmeans.labels_
-            
-            # 计算每种颜色的比例
-            color_counts = np.bincount(labels)
-            color_percentages = color_counts / len(labels)
-            
-            # 转换为颜色名称和百分比
+            # 转换为颜色名称和百分比（调色板已按占比降序排列）
             color_results = []
-            for i, (color, percentage) in enumerate(zip(dominant_colors, color_percentages)):
-                color_name = self._rgb_to_color_name(color)
+            for color, percentage in zip(palette.colors, palette.percentages):
                 color_results.append({
-                    "name": color_name,
-                        "percentage": float(percentage),
+                    "name": self._rgb_to_color_name(color),
+                    "percentage": float(percentage),
                     "rgb": color.tolist()
                 })
             
-            # 按百分比排序
-            color_results.sort(key=lambda x: x["percentage"], reverse=True)
-            
             return color_results[:3]  # 返回前3个主要颜色
             
         except Exception as e:
@@ -505,26 +428,22 @@ class ImageAnalyzer:
         else:
             return "粉色"
     
-    def _assess_image_quality_ai(self, image_array: np.ndarray) -> float:
+    def _assess_image_quality_ai(self, image: DecodedImage) -> float:
         """AI图像质量评估"""
         try:
-            # 转换为灰度图
-            if len(image_array.shape) == 3:
-                gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-            else:
-                gray = image_array
+            features = image.features
             
             # 计算清晰度（拉普拉斯方差）
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+            laplacian_var = features.laplacian.var()
             
             # 计算对比度
-            contrast = np.std(gray) / 255.0
+            contrast = features.contrast
             
             # 计算亮度分布
-            brightness = np.mean(gray) / 255.0
+            brightness = features.brightness
             
             # 计算噪声水平（高频成分）
-            noise_level = self._calculate_noise_level(gray)
+            noise_level = self._calculate_noise_level(features)
             
             # 综合质量评分
             sharpness_score = min(laplacian_var / 1000, 1.0)  # 归一化
@@ -546,36 +465,29 @@ class ImageAnalyzer:
             logger.error(f"AI质量评估失败: {str(e)}")
             return random.uniform(0.6, 0.9)
     
-    def _calculate_noise_level(self, gray_image: np.ndarray) -> float:
+    def _calculate_noise_level(self, features: FeatureContext) -> float:
         """计算噪声水平"""
         # 使用高斯滤波估计噪声
-        blurred = cv2.GaussianBlur(gray_image, (5, 5), 0)
-        noise = gray_image.astype(float) - blurred.astype(float)
-        return np.std(noise) / 255.0
+        return np.std(features.noise) / 255.0
     
-    def _analyze_composition_ai(self, image_array: np.ndarray) -> Dict:
+    def _analyze_composition_ai(self, image: DecodedImage) -> Dict:
         """AI构图分析"""
         try:
-            height, width = image_array.shape[:2]
-            aspect_ratio = width / height
-            
-            # 转换为灰度图
-            if len(image_array.shape) == 3:
-                gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-            else:
-                gray = image_array
+            aspect_ratio = image.width / image.height
+            features = image.features
+            gray = features.gray
             
             # 计算三分法构图
             rule_of_thirds = self._analyze_rule_of_thirds(gray)
             
             # 计算对称性
-            symmetry = self._calculate_symmetry(gray)
+            symmetry = self._calculate_symmetry(features)
             
             # 计算主体位置
             subject_position = self._find_subject_position(gray)
             
             # 计算景深效果
-            depth_of_field = self._analyze_depth_of_field(gray)
+            depth_of_field = self._analyze_depth_of_field(features)
             
             return {
                 "aspect_ratio": aspect_ratio,
@@ -611,8 +523,10 @@ class ImageAnalyzer:
         
         return abs(avg_intersection - avg_overall) / 255.0
     
-    def _calculate_symmetry(self, gray_image: np.ndarray) -> float:
+    def _calculate_symmetry(self, features: FeatureContext) -> float:
         """计算图像对称性"""
+        # 使用缓存的 float 灰度图，避免每个半区单独转换
+        gray_image = features.gray_float
         height, width = gray_image.shape
         
         # 水平对称
@@ -625,7 +539,7 @@ class ImageAnalyzer:
         top_half = top_half[:min_height, :]
         bottom_half_flipped = bottom_half_flipped[:min_height, :]
         
-        horizontal_symmetry = 1.0 - np.mean(np.abs(top_half.astype(float) - bottom_half_flipped.astype(float))) / 255.0
+        horizontal_symmetry = 1.0 - np.mean(np.abs(top_half - bottom_half_flipped)) / 255.0
         
         # 垂直对称
         left_half = gray_image[:, :width//2]
@@ -637,7 +551,7 @@ class ImageAnalyzer:
         left_half = left_half[:, :min_width]
         right_half_flipped = right_half_flipped[:, :min_width]
         
-        vertical_symmetry = 1.0 - np.mean(np.abs(left_half.astype(float) - right_half_flipped.astype(float))) / 255.0
+        vertical_symmetry = 1.0 - np.mean(np.abs(left_half - right_half_flipped)) / 255.0
         
         return (horizontal_symmetry + vertical_symmetry) / 2.0
     
@@ -660,12 +574,10 @@ class ImageAnalyzer:
         positions = ["左上", "右上", "左下", "右下"]
         return positions[max_quadrant]
     
-    def _analyze_depth_of_field(self, gray_image: np.ndarray) -> float:
+    def _analyze_depth_of_field(self, features: FeatureContext) -> float:
         """分析景深效果"""
         # 计算图像梯度
-        grad_x = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
+        gradient_magnitude = features.gradient_magnitude
         
         # 计算梯度分布
         gradient_std = np.std(gradient_magnitude)
@@ -676,20 +588,6 @@ class ImageAnalyzer:
         
         return float(np.clip(depth_score, 0.0, 1.0))
     
-    def _extract_exif_data(self, image: Image.Image) -> Dict:
-        """提取EXIF数据"""
-        try:
-            exif_data = {}
-            if hasattr(image, '_getexif') and image._getexif() is not None:
-                exif = image._getexif()
-                for tag_id, value in exif.items():
-                    tag = image._getexif().get(tag_id, {})
-                    if isinstance(tag, dict) and 'name' in tag:
-                        exif_data[tag['name']] = str(value)
-            return exif_data
-        except Exception:
-            return {}
-    
     def _generate_smart_tags(self, theme_result: Dict, colors: List[Dict], composition: Dict) -> List[str]:
         """生成智能标签"""
         tags = [theme_result["theme"]]
@@ -726,7 +624,8 @@ class ImageAnalyzer:
             "exif": {},
             "dimensions": {"width": 1920, "height": 1080},
             "file_size": 0,
-            "tags": ["自然风光", "蓝色"]
+            "tags": ["自然风光", "蓝色"],
+            "is_fallback": True  # 分析失败时的占位结果，不写入缓存
         }
     
     def _extract_dominant_colors_simple(self) -> List[Dict]:
@@ -753,20 +652,16 @@ class ImageAnalyzer:
         
         return tags
     
-    def create_thumbnail(self, image_path: str, size: Tuple[int, int] = (300, 300)) -> str:
-        """创建缩略图 - 简化版本"""
+    def create_thumbnail(self, image_path: str, size: Tuple[int, int] = (300, 300), output_dir: Optional[str] = None) -> str:
+        """创建缩略图，output_dir 为空时写入系统临时目录"""
         try:
-            # 直接返回原图路径作为缩略图
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
-            thumbnail_path = os.path.join(
-                tempfile.gettempdir(),
-                f"{base_name}_thumb_{size[0]}x{size[1]}.jpg"
+            derivatives = generate_derivatives(
+                image_path,
+                output_dir or tempfile.gettempdir(),
+                sizes=[max(size)],
+                formats=("jpeg",)
             )
-            
-            # 复制原文件作为缩略图（简化实现）
-            shutil.copy2(image_path, thumbnail_path)
-            
-            return thumbnail_path
+            return derivatives[max(size)]["jpeg"]
                 
         except Exception as e:
             logger.error(f"缩略图创建失败: {str(e)}")
@@ -0,0 +1,83 @@
+"""
+相似图片检索用的图像特征向量
+
+由已有的颜色/纹理特征拼接而成，不依赖模型推理，单张图在 256 像素尺度上计算只需几毫秒：
+- 颜色：HSV 8x4x4 联合直方图（开方后归一化，降低大面积单色的支配作用）
+- 纹理：LBP 256 区间直方图（与 texture_features 共用实现）
+- 布局：4x4 网格的平均 Lab 颜色，反映构图和色块分布
+- 边缘：按梯度幅值加权的 8 方向梯度方向直方图
+
+各部分先单独 L2 归一化再按权重拼接，整体再次归一化，两向量的点积即余弦相似度。
+调整特征或权重时需递增 EMBEDDING_VERSION，已有索引会在启动时整体重建。
+"""
+import cv2
+import numpy as np
+
+from .texture_features import calculate_lbp, lbp_histogram
+from .thumbnails import _open_reduced
+
+EMBEDDING_VERSION = 1
+
+# 计算特征时图像长边的尺寸
+EMBEDDING_EDGE = 256
+
+HSV_BINS = (8, 4, 4)
+LAYOUT_GRID = 4
+ORIENTATION_BINS = 8
+
+# 各部分特征的权重
+WEIGHTS = {
+    "color": 1.0,
+    "texture": 0.7,
+    "layout": 0.8,
+    "edges": 0.5,
+}
+
+EMBEDDING_DIM = (
+    HSV_BINS[0] * HSV_BINS[1] * HSV_BINS[2]
+    + 256
+    + LAYOUT_GRID * LAYOUT_GRID * 3
+    + ORIENTATION_BINS
+)
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def compute_embedding(rgb: np.ndarray) -> np.ndarray:
+    """计算 RGB 图像（uint8，长边约 EMBEDDING_EDGE）的特征向量，返回 float16"""
+    hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+    color_hist = cv2.calcHist([hsv], [0, 1, 2], None, list(HSV_BINS), [0, 180, 0, 256, 0, 256]).ravel()
+    color = _normalize(np.sqrt(color_hist / max(color_hist.sum(), 1.0)))
+
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    texture_hist = lbp_histogram(calculate_lbp(gray)).astype(np.float32)
+    texture = _normalize(np.sqrt(texture_hist / max(texture_hist.sum(), 1.0)))
+
+    grid = cv2.resize(rgb, (LAYOUT_GRID, LAYOUT_GRID), interpolation=cv2.INTER_AREA)
+    lab = cv2.cvtColor(grid, cv2.COLOR_RGB2LAB).astype(np.float32).reshape(-1, 3)
+    layout = _normalize(((lab - 128.0) / 128.0).ravel())
+
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude, angle = cv2.cartToPolar(gx, gy)
+    # 方向不区分正反，映射到 [0, pi)
+    bins = ((angle % np.pi) / np.pi * ORIENTATION_BINS).astype(np.int32) % ORIENTATION_BINS
+    edges = _normalize(np.bincount(bins.ravel(), weights=magnitude.ravel(), minlength=ORIENTATION_BINS))
+
+    vector = np.concatenate([
+        WEIGHTS["color"] * color,
+        WEIGHTS["texture"] * texture,
+        WEIGHTS["layout"] * layout,
+        WEIGHTS["edges"] * edges,
+    ]).astype(np.float32)
+    return _normalize(vector).astype(np.float16)
+
+
+def embed_image(image_path: str) -> np.ndarray:
+    """读取图像文件并计算特征向量（JPEG 直接按比例解码到接近 EMBEDDING_EDGE）"""
+    image = _open_reduced(image_path, EMBEDDING_EDGE)
+    image.thumbnail((EMBEDDING_EDGE, EMBEDDING_EDGE))
+    return compute_embedding(np.asarray(image, dtype=np.uint8))
@@ -0,0 +1,154 @@
+"""
+单次解码的内存图像
+
+一次上传只从磁盘解码一次，之后分类器和各特征计算都共用同一份数组，
+不再经过临时文件中转或重复编码。BGR、灰度、梯度等派生表示在首次使用时计算并缓存。
+
+各类特征并不需要全分辨率：分析前按 image_processing.analysis_max_edge 中
+每类特征的长边上限构建缩小的金字塔层级，各阶段取对应层级计算。
+"""
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Union
+import os
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from .config_manager import get_config_manager
+from .feature_context import FeatureContext
+
+# 各类特征的长边上限，0 表示使用原始分辨率
+DEFAULT_ANALYSIS_MAX_EDGE = {
+    "classification": 1280,  # YOLO 内部还会缩放到 640
+    "color": 256,            # 主色调聚类
+    "quality": 1024,         # 清晰度、噪声
+    "composition": 512       # 三分法、对称性、景深
+}
+
+
+def get_analysis_max_edges() -> Dict[str, int]:
+    """读取各类特征的长边上限"""
+    config = get_config_manager().get("image_processing", {}) or {}
+    max_edges = dict(DEFAULT_ANALYSIS_MAX_EDGE)
+    max_edges.update(config.get("analysis_max_edge") or {})
+    return max_edges
+
+
+def _read_exif(image: Image.Image) -> Dict[str, Any]:
+    """读取EXIF数据（需在方向校正前调用）"""
+    try:
+        exif_data = {}
+        if hasattr(image, '_getexif') and image._getexif() is not None:
+            exif = image._getexif()
+            for tag_id, value in exif.items():
+                tag = exif.get(tag_id, {})
+                if isinstance(tag, dict) and 'name' in tag:
+                    exif_data[tag['name']] = str(value)
+        return exif_data
+    except Exception:
+        return {}
+
+
+class DecodedImage:
+    """已解码的RGB图像及其派生表示"""
+
+    def __init__(self, rgb: np.ndarray, path: Optional[str] = None, file_size: int = 0,
+                 exif: Optional[Dict[str, Any]] = None, format: Optional[str] = None):
+        self.rgb = np.ascontiguousarray(rgb)
+        self.path = path
+        self.file_size = file_size
+        self.exif = exif or {}
+        self.format = format
+        self._bgr: Optional[np.ndarray] = None
+        self._features: Optional[FeatureContext] = None
+        self._levels: Dict[int, "DecodedImage"] = {}
+
+    @classmethod
+    def open(cls, source: Union[str, BinaryIO]) -> "DecodedImage":
+        """从文件路径或二进制文件对象解码，按EXIF方向校正并统一为RGB"""
+        if isinstance(source, str):
+            if not os.path.exists(source):
+                raise ValueError(f"图像文件不存在: {source}")
+            path = source
+            file_size = os.path.getsize(source)
+        else:
+            path = None
+            source.seek(0, os.SEEK_END)
+            file_size = source.tell()
+            source.seek(0)
+
+        with Image.open(source) as image:
+            image_format = image.format
+            exif = _read_exif(image)
+            image = ImageOps.exif_transpose(image)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            rgb = np.asarray(image)
+
+        return cls(rgb, path=path, file_size=file_size, exif=exif, format=image_format)
+
+    @classmethod
+    def from_array(cls, image_array: np.ndarray, path: Optional[str] = None) -> "DecodedImage":
+        """从已有的RGB或灰度数组构造"""
+        if image_array.ndim == 2:
+            image_array = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
+        elif image_array.shape[2] == 4:
+            image_array = cv2.cvtColor(image_array, cv2.COLOR_RGBA2RGB)
+        return cls(image_array, path=path)
+
+    @property
+    def width(self) -> int:
+        return self.rgb.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.rgb.shape[0]
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """OpenCV / YOLO 使用的BGR顺序"""
+        if self._bgr is None:
+            self._bgr = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR)
+        return self._bgr
+
+    @property
+    def features(self) -> FeatureContext:
+        """该层级的共享特征上下文"""
+        if self._features is None:
+            self._features = FeatureContext(self.rgb)
+        return self._features
+
+    @property
+    def gray(self) -> np.ndarray:
+        """灰度图"""
+        return self.features.gray
+
+    def build_pyramid(self, max_edges: Iterable[Optional[int]]):
+        """预先构建金字塔层级，较小的层级从上一级继续缩小"""
+        for max_edge in sorted({e for e in max_edges if e}, reverse=True):
+            self.level(max_edge)
+
+    def level(self, max_edge: Optional[int]) -> "DecodedImage":
+        """获取长边不超过 max_edge 的层级，max_edge 为空或图像本身更小时返回自身"""
+        if not max_edge or max(self.width, self.height) <= max_edge:
+            return self
+        if max_edge in self._levels:
+            return self._levels[max_edge]
+
+        # 从已有的、比目标大的最小层级开始缩小，减少需要处理的像素
+        source = self
+        for edge in sorted(self._levels):
+            if edge > max_edge:
+                source = self._levels[edge]
+                break
+
+        scale = max_edge / max(source.width, source.height)
+        size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+        rgb = cv2.resize(source.rgb, size, interpolation=cv2.INTER_AREA)
+        level = DecodedImage(rgb, path=self.path, file_size=self.file_size, exif=self.exif, format=self.format)
+        self._levels[max_edge] = level
+        return level
+
+    def to_pil(self) -> Image.Image:
+        """转换为PIL图像（共享数组内存，不重新编码）"""
+        return Image.fromarray(self.rgb)
@@ -0,0 +1,328 @@
+"""
+进程池推理
+
+YOLO 和 NumPy/OpenCV 特征计算即使放在线程中也会争抢 GIL，并拖慢 uvicorn 事件循环。
+启用后 analyze_image 在独立的工作进程中执行，每个进程持有自己加载的模型：
+主进程只负责解码，解码后的像素写入 multiprocessing.shared_memory，
+工作进程直接映射同一块内存计算，不再 pickle 整张图像。
+
+每个工作进程限定 OpenCV / torch / BLAS 的线程数，多个进程不会超额占用 CPU 核心；
+工作进程崩溃或任务超时时整个进程池会被重建：超时的任务直接失败，同时在执行或排队的其他任务
+随进程池一起被终止，在新的进程池中重新提交一次。进程池不可用（启动失败或被重建后）时，
+健康检查线程负责重建，失败时按指数退避重试，不依赖新的任务到来。inference_workers 为 0 时在当前进程内分析。
+"""
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Any, BinaryIO, Dict, Optional, Union
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from config import settings
+from .analysis_cache import to_jsonable
+from .classifier_cascade import cascade_stats
+from .config_manager import get_config_manager
+from .image_pipeline import DecodedImage
+
+logger = logging.getLogger(__name__)
+
+# 各数值计算库读取的线程数环境变量
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# 进程池不可用时重建的首次等待秒数，每次失败翻倍，最多 REBUILD_BACKOFF_MAX 秒
+REBUILD_BACKOFF_MIN = 1.0
+REBUILD_BACKOFF_MAX = 300.0
+
+
+def _init_worker(threads: int, max_batch_size: int = 1):
+    """工作进程初始化：限定线程数，加载并预热模型
+
+    在线分析时每个工作进程同一时刻只分析一张图，凑批只会增加等待时间，max_batch_size 默认为 1；
+    离线评估在进程内用多个线程并发分类时才需要凑批
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    if not settings.yolo_onnx_threads:
+        settings.yolo_onnx_threads = threads
+    settings.yolo_max_batch_size = max_batch_size
+
+    from utils.image_analyzer import image_analyzer  # noqa: F401  导入时登记模型
+    from utils.model_registry import model_registry
+    model_registry.load_all()
+
+    # ultralytics 后端加载后 torch 才会被导入
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def _worker_ping() -> Dict[str, Any]:
+    """健康检查，返回进程号和模型状态"""
+    from utils.image_analyzer import image_analyzer
+    from utils.model_registry import model_registry
+    return {
+        "pid": os.getpid(),
+        "model_name": image_analyzer.get_model_name(),
+        "models": model_registry.get_status()
+    }
+
+
+def _worker_analyze(shm_name: str, shape: tuple, dtype: str, meta: Dict[str, Any],
+                    image_processing: Dict[str, Any]) -> Dict:
+    """在工作进程中分析共享内存中的图像，image_processing 为主进程当前的分析配置"""
+    from utils.image_analyzer import image_analyzer
+
+    get_config_manager().set_local("image_processing", image_processing)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        rgb = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        image = DecodedImage(rgb, **meta)
+        return to_jsonable(image_analyzer.analyze_decoded(image))
+    finally:
+        # 关闭共享内存前必须释放所有指向它的数组
+        rgb = image = None
+        try:
+            shm.close()
+        except BufferError:
+            gc.collect()
+            shm.close()
+
+
+class InferencePool:
+    """推理进程池"""
+
+    def __init__(self, workers: int, threads_per_worker: int = 0, task_timeout: float = 120.0,
+                 health_interval: float = 30.0):
+        self.workers = max(0, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // max(1, self.workers))
+        self.task_timeout = task_timeout
+        self.health_interval = health_interval
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        self._model_name: Optional[str] = None
+        self.last_health: Dict[str, Any] = {}
+        self.ready = False
+        self.stats = {
+            "tasks": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "crashes": 0,
+            "restarts": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def start(self):
+        """启动工作进程并等待模型加载完成，随后定期做健康检查"""
+        if not self.enabled:
+            return
+        # 子进程在创建时继承环境变量，导入 numpy 等库之前就能生效
+        for var in THREAD_ENV_VARS:
+            os.environ.setdefault(var, str(self.threads_per_worker))
+        self._stop.clear()
+
+        start = time.perf_counter()
+        try:
+            self._warm_up()
+            logger.info(f"推理进程池已就绪: {self.workers} 个进程，每个 {self.threads_per_worker} 个线程，"
+                        f"耗时 {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"推理进程池启动失败: {e}")
+
+        if self._health_thread is None or not self._health_thread.is_alive():
+            self._health_thread = threading.Thread(target=self._health_loop, name="inference-health", daemon=True)
+            self._health_thread.start()
+
+    def shutdown(self):
+        """停止健康检查和全部工作进程"""
+        self._stop.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.ready = False
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.threads_per_worker,)
+                )
+            return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor, reason: str):
+        """终止并丢弃出问题的进程池，下次提交任务时重建"""
+        with self._lock:
+            if self._executor is not executor:
+                # 其他线程已经重建过
+                return
+            self._executor = None
+        self.ready = False
+        self.stats["restarts"] += 1
+        logger.warning(f"重建推理进程池: {reason}")
+        # ProcessPoolExecutor 没有公开的终止接口，卡住的进程需要直接结束
+        for process in list((executor._processes or {}).values()):
+            if process.is_alive():
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _call(self, fn, *args, timeout: Optional[float]):
+        """
+        在进程池中执行任务；工作进程崩溃时重建进程池并重试一次
+
+        其他任务超时导致进程池被重建时，本任务会被终止（BrokenProcessPool）或取消（CancelledError），
+        同样重新提交一次，不计为崩溃
+        """
+        for attempt in range(2):
+            executor = self._ensure_executor()
+            try:
+                result = executor.submit(fn, *args).result(timeout=timeout)
+                self.ready = True
+                return result
+            except (BrokenProcessPool, CancelledError):
+                if self._executor is executor:
+                    self.stats["crashes"] += 1
+                    self._restart(executor, "工作进程异常退出")
+                if attempt:
+                    raise
+            except FutureTimeoutError:
+                self.stats["timeouts"] += 1
+                self._restart(executor, f"任务超过 {timeout}s 未完成")
+                raise
+
+    def _warm_up(self):
+        """
+        同时提交与进程数相同的健康检查任务
+
+        进程池按需创建进程，任务都在排队时才会把全部工作进程启动起来并加载模型
+        """
+        executor = self._ensure_executor()
+        futures = [executor.submit(_worker_ping) for _ in range(self.workers)]
+        try:
+            for future in futures:
+                self.last_health = future.result()
+        except BrokenProcessPool:
+            self.stats["crashes"] += 1
+            self._restart(executor, "工作进程启动失败")
+            raise
+        self._model_name = self.last_health["model_name"]
+        self.ready = True
+
+    def check_health(self, timeout: Optional[float] = 10.0) -> Dict[str, Any]:
+        """向进程池发送一次健康检查任务"""
+        result = self._call(_worker_ping, timeout=timeout)
+        self._model_name = result["model_name"]
+        self.last_health = result
+        self.ready = True
+        return result
+
+    def _health_loop(self):
+        backoff = REBUILD_BACKOFF_MIN
+        while not self._stop.wait(self.health_interval if self.ready else backoff):
+            executor = self._executor
+            # 有进程退出时进程池已不可用，提前重建而不是等下一个任务失败
+            if executor is not None:
+                processes = list((executor._processes or {}).values())
+                if any(not process.is_alive() for process in processes):
+                    self.stats["crashes"] += 1
+                    self._restart(executor, "健康检查发现工作进程已退出")
+            # 启动失败、任务超时或上面的检查都会使进程池不可用，由这里重建，/ready 才能恢复
+            if self.ready or self._stop.is_set():
+                backoff = REBUILD_BACKOFF_MIN
+                continue
+            try:
+                self._warm_up()
+                backoff = REBUILD_BACKOFF_MIN
+                logger.info("推理进程池已重建")
+            except Exception as e:
+                backoff = min(backoff * 2, REBUILD_BACKOFF_MAX)
+                logger.error(f"推理进程池重建失败，{backoff:.0f}s 后重试: {e}")
+
+    def get_version(self, wait: bool = False) -> Optional[str]:
+        """
+        与实际执行分析的进程一致的分析器版本
+
+        模型尚未加载完成（工作进程还没有报告模型名）时返回 None，请求路径中不等待；
+        wait 为 True 时等待工作进程就绪（或在当前进程中加载模型），只在后台任务中使用
+        """
+        from utils.image_analyzer import image_analyzer
+        from utils.model_registry import model_registry
+        if not self.enabled:
+            if not wait and not model_registry.is_ready():
+                return None
+            return image_analyzer.get_version()
+        if self._model_name is None:
+            if not wait:
+                return None
+            self.check_health(timeout=None)
+        return image_analyzer.get_version(self._model_name)
+
+    def analyze_image(self, source: Union[str, BinaryIO]) -> Dict:
+        """分析图像（阻塞调用，应在线程中执行），返回可JSON序列化的结果"""
+        result = self._analyze(source)
+        cascade_stats.record(result.get("cascade"))
+        return result
+
+    def _analyze(self, source: Union[str, BinaryIO]) -> Dict:
+        from utils.image_analyzer import image_analyzer
+        if not self.enabled:
+            return to_jsonable(image_analyzer.analyze_image(source))
+
+        try:
+            image = DecodedImage.open(source)
+        except Exception as e:
+            logger.error(f"图像解码失败: {e}")
+            return image_analyzer._fallback_analysis(source if isinstance(source, str) else None)
+
+        shm = shared_memory.SharedMemory(create=True, size=image.rgb.nbytes)
+        try:
+            np.ndarray(image.rgb.shape, dtype=image.rgb.dtype, buffer=shm.buf)[:] = image.rgb
+            meta = {"path": image.path, "file_size": image.file_size, "exif": image.exif, "format": image.format}
+            self.stats["tasks"] += 1
+            return self._call(
+                _worker_analyze, shm.name, image.rgb.shape, image.rgb.dtype.str, meta,
+                get_config_manager().get("image_processing", {}),
+                timeout=self.task_timeout
+            )
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取进程池统计信息"""
+        executor = self._executor
+        processes = list((executor._processes or {}).values()) if executor is not None else []
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "alive_workers": sum(1 for process in processes if process.is_alive()),
+            "ready": self.ready,
+            **self.stats
+        }
+
+
+# 全局推理进程池实例
+inference_pool = InferencePool(
+    workers=settings.inference_workers,
+    threads_per_worker=settings.inference_threads_per_worker,
+    task_timeout=settings.inference_task_timeout,
+    health_interval=settings.inference_health_interval
+)
@@ -0,0 +1,84 @@
+"""
+进程内 LRU/TTL 缓存
+
+作为 Redis 之前的一级缓存，保存已解码的对象，命中时既不需要网络往返也不需要 json.loads。
+容量按条目数限制，超出时淘汰最久未使用的条目；每个条目有独立的过期时间（单调时钟）。
+只在事件循环线程中使用，不加锁；返回的对象与缓存共享，调用方不得修改。
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import time
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """有容量上限的 LRU + TTL 缓存"""
+
+    def __init__(self, max_entries: int = 10000, default_ttl: float = 30.0):
+        self.max_entries = max(0, max_entries)
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+            "invalidations": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default: Any = None, valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """读取条目；valid 返回 False 的条目（如已被标签失效）与过期条目一样删除并按未命中处理"""
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.stats["misses"] += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return default
+        if valid is not None and not valid(value):
+            del self._entries[key]
+            self.stats["invalidations"] += 1
+            self.stats["misses"] += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if self.max_entries == 0:
+            return
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        self.stats["sets"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def delete(self, key: str) -> bool:
+        if self._entries.pop(key, _MISSING) is _MISSING:
+            return False
+        self.stats["invalidations"] += 1
+        return True
+
+    def clear(self):
+        self.stats["invalidations"] += len(self._entries)
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.default_ttl,
+        }
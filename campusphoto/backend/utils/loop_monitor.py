@@ -0,0 +1,81 @@
+"""
+事件循环延迟监测
+
+后台协程每隔 interval 秒 sleep 一次，实际醒来时间与预期时间之差即事件循环被阻塞的时长：
+async 接口中的同步网络调用、CPU 计算等都会使其增大。
+保留最近 window 个采样计算分位数，同时累计超过阈值的次数和最大值。
+"""
+from collections import deque
+from typing import Dict, Optional
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    """事件循环延迟监测器"""
+
+    def __init__(self, interval: float = 0.05, window: int = 2000, slow_threshold_ms: float = 20.0):
+        self.interval = interval
+        self.slow_threshold_ms = slow_threshold_ms
+        self._samples = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.samples = 0
+        self.slow = 0
+        self.max_lag_ms = 0.0
+
+    def start(self):
+        """在当前事件循环中启动监测"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+            self._samples.append(lag_ms)
+            self.samples += 1
+            if lag_ms > self.slow_threshold_ms:
+                self.slow += 1
+            if lag_ms > self.max_lag_ms:
+                self.max_lag_ms = lag_ms
+
+    def reset(self):
+        """清空采样，用于分段对比（如压测前后）"""
+        self._samples.clear()
+        self._reset_counters()
+
+    def get_stats(self) -> Dict:
+        samples = np.array(self._samples) if self._samples else np.zeros(1)
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "mean_ms": round(float(samples.mean()), 3),
+            "p50_ms": round(float(np.percentile(samples, 50)), 3),
+            "p99_ms": round(float(np.percentile(samples, 99)), 3),
+            "max_ms": round(self.max_lag_ms, 3),
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "slow": self.slow,
+        }
+
+
+# 全局事件循环监测器
+loop_monitor = EventLoopLagMonitor()
@@ -0,0 +1,141 @@
+"""
+模型注册表
+
+各分类器在导入时只登记加载函数，不再立即加载模型。模型在首次使用时加载，
+或由应用启动时的 lifespan 统一预加载；加载后执行一次预热推理，
+使首个真实请求不再承担初始化和内存分配的开销。
+每个模型的状态、版本和耗时通过 /ready 接口对外暴露。
+"""
+from typing import Any, Callable, Dict, Optional
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 模型状态
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+UNAVAILABLE = "unavailable"  # 模型文件或依赖缺失，使用回退逻辑
+FAILED = "failed"
+
+
+class ModelEntry:
+    """注册表中的单个模型"""
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warmup: Optional[Callable[[Any], None]] = None,
+        version: Optional[Callable[[], str]] = None
+    ):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.version = version
+        self.model = None
+        self.state = NOT_LOADED
+        self.error: Optional[str] = None
+        self.load_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self.loaded_at: Optional[datetime] = None
+        self.lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "version": self.version() if self.version and self.state == READY else None,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "error": self.error
+        }
+
+
+class ModelRegistry:
+    """模型注册表"""
+
+    def __init__(self):
+        self._entries: Dict[str, ModelEntry] = {}
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warmup: Optional[Callable[[Any], None]] = None,
+        version: Optional[Callable[[], str]] = None
+    ):
+        """
+        登记模型
+
+        loader 返回加载好的模型，返回 None 表示模型不可用（调用方使用回退逻辑）；
+        warmup 接收模型并执行一次推理；version 返回模型版本标识。
+        """
+        self._entries[name] = ModelEntry(name, loader, warmup, version)
+
+    def get(self, name: str) -> Any:
+        """获取模型，未加载时在当前线程加载、正在加载时等待；不可用或加载失败时返回 None"""
+        entry = self._entries[name]
+        if entry.state in (NOT_LOADED, LOADING):
+            self._load(entry)
+        return entry.model
+
+    def load(self, name: str):
+        """加载指定模型（已加载时不重复加载）"""
+        self._load(self._entries[name])
+
+    def load_all(self):
+        """加载全部已登记的模型，供应用启动时调用"""
+        for entry in list(self._entries.values()):
+            self._load(entry)
+
+    def _load(self, entry: ModelEntry):
+        with entry.lock:
+            # 其他线程可能已经加载完成
+            if entry.state != NOT_LOADED:
+                return
+            entry.state = LOADING
+            start = time.perf_counter()
+            try:
+                model = entry.loader()
+                entry.load_ms = round((time.perf_counter() - start) * 1000, 1)
+                if model is None:
+                    entry.state = UNAVAILABLE
+                    logger.warning(f"模型 {entry.name} 不可用，将使用回退逻辑")
+                    return
+
+                if entry.warmup is not None:
+                    start = time.perf_counter()
+                    entry.warmup(model)
+                    entry.warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+
+                entry.model = model
+                entry.loaded_at = datetime.utcnow()
+                entry.state = READY
+                logger.info(f"模型 {entry.name} 已就绪 (加载 {entry.load_ms}ms, 预热 {entry.warmup_ms}ms)")
+            except Exception as e:
+                entry.model = None
+                entry.state = FAILED
+                entry.error = str(e)
+                logger.error(f"模型 {entry.name} 加载失败: {e}")
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """获取全部模型的状态"""
+        return {name: entry.to_dict() for name, entry in self._entries.items()}
+
+    def is_ready(self, require_loaded: bool = True) -> bool:
+        """
+        是否可以接收流量
+
+        require_loaded 为 True（启动时预加载）时，所有模型都必须已结束加载；
+        不可用或加载失败的模型不影响就绪，请求会走回退逻辑。
+        """
+        pending = {LOADING, NOT_LOADED} if require_loaded else {LOADING}
+        return all(entry.state not in pending for entry in self._entries.values())
+
+
+# 全局模型注册表实例
+model_registry = ModelRegistry()
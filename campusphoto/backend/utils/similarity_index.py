@@ -0,0 +1,455 @@
+"""
+相似作品检索索引
+
+为已审核通过的作品保存 image_embedding 特征向量（float16，按槽位连续存放），
+用倒排文件 (IVF) 做近似最近邻检索：用 k-means 把向量划分为约 sqrt(N) 个簇，
+查询时只计算与查询向量最近的 nprobe 个簇内的向量，作品数较少时直接全量计算。
+
+作品审核通过时由后台线程计算向量并加入索引，拒绝或删除时移除；
+索引文件在后台定期保存，启动时加载并与数据库中的已审核作品对账。
+离线全量重建见 rebuild_similarity_index.py。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from config import settings
+from .image_embedding import EMBEDDING_DIM, EMBEDDING_VERSION, embed_image
+
+logger = logging.getLogger(__name__)
+
+# 向量数少于该值时不建簇，直接全量计算
+IVF_MIN_SIZE = 2048
+
+# 向量数超过上次建簇时的该倍数后重新建簇
+RETRAIN_GROWTH = 2.0
+
+# 建簇时每个簇使用的样本数，更多样本对簇中心的改善有限
+TRAIN_SAMPLES_PER_LIST = 64
+
+# 分块计算簇分配，限制 float32 临时数组的大小
+ASSIGN_CHUNK = 8192
+
+
+def _nlist_for(size: int) -> int:
+    return int(np.clip(np.sqrt(size), 16, 1024))
+
+
+class VectorIndex:
+    """float16 向量的 IVF 近似最近邻索引（非线程安全，由 SimilarityIndex 加锁）"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float16)
+        self.slots: Dict[int, int] = {}
+        # IVF：簇中心、每个槽位所属的簇、每个簇的槽位集合
+        self.centroids: Optional[np.ndarray] = None
+        self.assign = np.empty(0, dtype=np.int32)
+        self.members: List[Set[int]] = []
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self.slots
+
+    def _reserve(self, capacity: int):
+        if capacity <= len(self.ids):
+            return
+        capacity = max(capacity, 2 * len(self.ids), 64)
+        ids = np.empty(capacity, dtype=np.int64)
+        vectors = np.empty((capacity, self.dim), dtype=np.float16)
+        assign = np.zeros(capacity, dtype=np.int32)
+        ids[:self.size] = self.ids[:self.size]
+        vectors[:self.size] = self.vectors[:self.size]
+        assign[:self.size] = self.assign[:self.size]
+        self.ids, self.vectors, self.assign = ids, vectors, assign
+
+    def _nearest_list(self, vector: np.ndarray) -> int:
+        return int(np.argmax(self.centroids @ vector.astype(np.float32)))
+
+    def get(self, item_id: int) -> Optional[np.ndarray]:
+        slot = self.slots.get(item_id)
+        return None if slot is None else self.vectors[slot]
+
+    def add(self, item_id: int, vector: np.ndarray):
+        """加入或替换向量"""
+        if item_id in self.slots:
+            self.remove(item_id)
+        self._reserve(self.size + 1)
+        slot = self.size
+        self.ids[slot] = item_id
+        self.vectors[slot] = vector
+        self.slots[item_id] = slot
+        if self.centroids is not None:
+            cluster = self._nearest_list(vector)
+            self.assign[slot] = cluster
+            self.members[cluster].add(slot)
+        self.size += 1
+
+    def remove(self, item_id: int) -> bool:
+        """移除向量，末尾的向量移到空出的槽位"""
+        slot = self.slots.pop(item_id, None)
+        if slot is None:
+            return False
+        last = self.size - 1
+        if self.centroids is not None:
+            self.members[self.assign[slot]].discard(slot)
+        if slot != last:
+            moved_id = int(self.ids[last])
+            self.ids[slot] = moved_id
+            self.vectors[slot] = self.vectors[last]
+            self.slots[moved_id] = slot
+            if self.centroids is not None:
+                cluster = self.assign[last]
+                self.members[cluster].discard(last)
+                self.members[cluster].add(slot)
+                self.assign[slot] = cluster
+        self.size -= 1
+        return True
+
+    def needs_training(self) -> bool:
+        if self.size < IVF_MIN_SIZE:
+            return False
+        return self.centroids is None or self.size > RETRAIN_GROWTH * self.trained_size
+
+    def compute_centroids(self) -> np.ndarray:
+        """在当前向量上训练簇中心（只读，可在锁外对快照调用）"""
+        from sklearn.cluster import MiniBatchKMeans
+
+        nlist = _nlist_for(self.size)
+        data = self.vectors[:self.size]
+        sample_size = nlist * TRAIN_SAMPLES_PER_LIST
+        if self.size > sample_size:
+            rng = np.random.default_rng(0)
+            data = data[rng.choice(self.size, sample_size, replace=False)]
+        kmeans = MiniBatchKMeans(
+            n_clusters=nlist,
+            batch_size=1024,
+            n_init=1,
+            random_state=0
+        )
+        kmeans.fit(data.astype(np.float32))
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        return centroids / np.maximum(norms, 1e-12)
+
+    def set_centroids(self, centroids: np.ndarray, assign: Optional[np.ndarray] = None):
+        """设置簇中心并重新分配所有向量"""
+        self.centroids = centroids.astype(np.float32)
+        if assign is None:
+            assign = np.empty(self.size, dtype=np.int32)
+            for start in range(0, self.size, ASSIGN_CHUNK):
+                end = min(start + ASSIGN_CHUNK, self.size)
+                chunk = self.vectors[start:end].astype(np.float32)
+                assign[start:end] = np.argmax(chunk @ self.centroids.T, axis=1)
+        self.assign[:self.size] = assign
+        self.members = [set() for _ in range(len(self.centroids))]
+        for slot, cluster in enumerate(assign.tolist()):
+            self.members[cluster].add(slot)
+        self.trained_size = self.size
+
+    def train(self):
+        self.set_centroids(self.compute_centroids())
+
+    def search(self, query: np.ndarray, k: int, nprobe: int,
+               exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """返回与查询向量余弦相似度最高的 k 个 (id, 相似度)"""
+        if self.size == 0:
+            return []
+        query = query.astype(np.float32)
+        if self.centroids is None:
+            candidates = None
+            vectors = self.vectors[:self.size]
+        else:
+            probe = np.argsort(self.centroids @ query)[::-1][:max(1, nprobe)]
+            candidates = np.fromiter(
+                chain.from_iterable(self.members[c] for c in probe), dtype=np.int64
+            )
+            vectors = self.vectors[candidates]
+        scores = vectors.astype(np.float32) @ query
+        ids = self.ids[:self.size] if candidates is None else self.ids[candidates]
+
+        if exclude is not None:
+            scores[ids == exclude] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    # ---- 持久化 ----
+
+    def save(self, path: str):
+        """原子写入 npz 文件"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "version": np.array(EMBEDDING_VERSION),
+            "ids": self.ids[:self.size],
+            "vectors": self.vectors[:self.size],
+            "trained_size": np.array(self.trained_size),
+        }
+        if self.centroids is not None:
+            arrays["centroids"] = self.centroids
+            arrays["assign"] = self.assign[:self.size]
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional["VectorIndex"]:
+        """读取索引文件，特征版本不一致时返回 None"""
+        with np.load(path) as data:
+            if int(data["version"]) != EMBEDDING_VERSION:
+                return None
+            vectors = data["vectors"]
+            index = cls(vectors.shape[1])
+            index._reserve(len(vectors))
+            index.size = len(vectors)
+            index.ids[:index.size] = data["ids"]
+            index.vectors[:index.size] = vectors
+            index.slots = {int(item_id): slot for slot, item_id in enumerate(data["ids"].tolist())}
+            if "centroids" in data:
+                index.set_centroids(data["centroids"], data["assign"])
+                index.trained_size = int(data["trained_size"])
+        return index
+
+
+class SimilarityIndex:
+    """已审核作品的相似检索服务"""
+
+    def __init__(self, index_path: str, nprobe: int = 8):
+        self.index_path = index_path
+        self.nprobe = max(1, nprobe)
+        self.index = VectorIndex()
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._dirty = False
+        self._save_scheduled = False
+        self._training = False
+        # 最近一次加载/保存时索引文件的修改时间，用于发现离线重建
+        self._file_mtime: Optional[int] = None
+        self.stats = {
+            "submitted": 0,
+            "indexed": 0,
+            "failed": 0,
+            "removed": 0,
+            "queries": 0,
+            "query_time_ms": 0.0,
+        }
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # 单线程：向量按提交顺序写入，保存任务排在写入之后
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similarity-index")
+            return self._executor
+
+    def _file_signature(self) -> Optional[int]:
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return None
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        """加载索引文件，并与数据库中的已审核作品对账"""
+        self._ensure_executor()
+        self._load()
+
+        from models.database import SessionLocal
+        from models.models import Photo
+        from .analysis_queue import local_path_from_url
+
+        db = SessionLocal()
+        try:
+            approved = dict(db.query(Photo.id, Photo.image_url).filter(Photo.is_approved == True).all())
+        except Exception as e:
+            logger.error(f"相似检索索引对账失败: {e}")
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            stale = [item_id for item_id in self.index.slots if item_id not in approved]
+            missing = [(photo_id, url) for photo_id, url in approved.items() if photo_id not in self.index]
+        self.remove(stale)
+        self.submit_many((photo_id, local_path_from_url(url)) for photo_id, url in missing)
+        logger.info(
+            f"相似检索索引已加载: {len(self.index)} 个向量，移除 {len(stale)} 个，待补充 {len(missing)} 个"
+        )
+
+    def _load(self):
+        self._file_mtime = self._file_signature()
+        if self._file_mtime is None:
+            return
+        try:
+            index = VectorIndex.load(self.index_path)
+        except Exception as e:
+            logger.error(f"读取相似检索索引失败，将重新构建: {e}")
+            return
+        if index is None:
+            logger.info("相似检索特征版本已变化，将重新构建索引")
+            return
+        with self._lock:
+            self.index = index
+
+    def shutdown(self):
+        """等待未完成的写入并保存索引"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.save()
+
+    def save(self):
+        """索引有变化时写入文件；文件已被离线重建覆盖时不再写回"""
+        with self._lock:
+            self._save_scheduled = False
+            if not self._dirty:
+                return
+            current = self._file_signature()
+            if current is not None and current != self._file_mtime:
+                logger.warning("相似检索索引文件已被外部重建，跳过保存，下次启动时加载新文件")
+                self._dirty = False
+                return
+            try:
+                self.index.save(self.index_path)
+            except Exception as e:
+                logger.error(f"保存相似检索索引失败: {e}")
+                return
+            self._dirty = False
+            self._file_mtime = self._file_signature()
+
+    def _schedule_save(self):
+        with self._lock:
+            if self._save_scheduled:
+                return
+            self._save_scheduled = True
+        self._ensure_executor().submit(self.save)
+
+    # ---- 增量更新 ----
+
+    def submit(self, photo_id: int, image_path: str):
+        """后台计算作品的向量并加入索引"""
+        self.submit_many([(photo_id, image_path)])
+
+    def submit_many(self, items: Iterable[Tuple[int, str]]):
+        items = list(items)
+        if not items:
+            return
+        executor = self._ensure_executor()
+        for photo_id, image_path in items:
+            self.stats["submitted"] += 1
+            executor.submit(self._index_photo, photo_id, image_path)
+        executor.submit(self._after_updates)
+
+    def _index_photo(self, photo_id: int, image_path: str):
+        try:
+            self.add(photo_id, embed_image(image_path))
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"计算作品 {photo_id} 的相似检索向量失败: {e}")
+
+    def _after_updates(self):
+        """批量写入后按需重新建簇，并安排保存"""
+        with self._lock:
+            needs_training = self.index.needs_training() and not self._training
+            if needs_training:
+                self._training = True
+                snapshot = VectorIndex(self.index.dim)
+                snapshot._reserve(self.index.size)
+                snapshot.size = self.index.size
+                snapshot.vectors[:snapshot.size] = self.index.vectors[:self.index.size]
+        if needs_training:
+            try:
+                # 训练在快照上进行，期间不阻塞查询
+                centroids = snapshot.compute_centroids()
+                with self._lock:
+                    self.index.set_centroids(centroids)
+                    self._dirty = True
+                logger.info(f"相似检索索引已重新建簇: {len(centroids)} 个簇，{len(self.index)} 个向量")
+            except Exception as e:
+                logger.error(f"相似检索索引建簇失败: {e}")
+            finally:
+                self._training = False
+        self._schedule_save()
+
+    def add(self, photo_id: int, vector: np.ndarray):
+        with self._lock:
+            self.index.add(photo_id, vector)
+            self._dirty = True
+        self.stats["indexed"] += 1
+
+    def remove(self, photo_ids: Iterable[int]):
+        """移除作品（拒绝、删除）"""
+        removed = 0
+        with self._lock:
+            for photo_id in photo_ids:
+                removed += self.index.remove(int(photo_id))
+            if removed:
+                self._dirty = True
+        if removed:
+            self.stats["removed"] += removed
+            self._schedule_save()
+
+    # ---- 查询 ----
+
+    def similar_to(self, photo_id: int, image_path: str, limit: int) -> List[Tuple[int, float]]:
+        """
+        返回与作品最相似的 limit 个 (作品ID, 相似度)，不含作品自身
+
+        作品尚未入索引（刚审核通过、后台还未处理）时当场计算向量并加入。
+        """
+        start = time.perf_counter()
+        with self._lock:
+            vector = self.index.get(photo_id)
+            vector = None if vector is None else vector.copy()
+        if vector is None:
+            vector = embed_image(image_path)
+            self.add(photo_id, vector)
+            self._schedule_save()
+
+        with self._lock:
+            results = self.index.search(vector, limit, self.nprobe, exclude=photo_id)
+        self.stats["queries"] += 1
+        self.stats["query_time_ms"] += (time.perf_counter() - start) * 1000
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            size = len(self.index)
+            lists = 0 if self.index.centroids is None else len(self.index.centroids)
+        stats = dict(self.stats)
+        queries = stats.pop("query_time_ms")
+        stats.update({
+            "size": size,
+            "lists": lists,
+            "nprobe": self.nprobe,
+            "avg_query_ms": round(queries / stats["queries"], 3) if stats["queries"] else 0.0,
+        })
+        return stats
+
+
+# 全局相似检索索引
+similarity_index = SimilarityIndex(settings.similarity_index_path, settings.similarity_nprobe)
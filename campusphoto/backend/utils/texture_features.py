@@ -0,0 +1,37 @@
+"""
+纹理特征
+
+8邻域局部二值模式 (LBP) 的向量化实现，供 ImageAnalyzer 与 HybridImageClassifier 共用。
+邻域顺序与位权与原逐像素实现一致：从左上角开始顺时针，第一个邻居为最高位；
+边界一圈像素保持为 0，输出类型与输入相同。
+"""
+import numpy as np
+
+# (行偏移, 列偏移)，依次对应第7位到第0位
+LBP_NEIGHBORS = (
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, 1), (1, 1), (1, 0),
+    (1, -1), (0, -1)
+)
+
+
+def calculate_lbp(image: np.ndarray) -> np.ndarray:
+    """计算局部二值模式（输入为灰度图）"""
+    rows, cols = image.shape
+    lbp = np.zeros_like(image)
+    if rows < 3 or cols < 3:
+        return lbp
+
+    center = image[1:-1, 1:-1]
+    codes = np.zeros(center.shape, dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(LBP_NEIGHBORS):
+        neighbor = image[1 + dy:rows - 1 + dy, 1 + dx:cols - 1 + dx]
+        codes |= (neighbor >= center).astype(np.uint8) << np.uint8(7 - bit)
+
+    lbp[1:-1, 1:-1] = codes
+    return lbp
+
+
+def lbp_histogram(lbp: np.ndarray) -> np.ndarray:
+    """LBP直方图（256个区间，与 np.histogram(lbp, bins=256) 结果一致）"""
+    return np.histogram(lbp, bins=256)[0]
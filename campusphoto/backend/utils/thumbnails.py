@@ -0,0 +1,113 @@
+"""
+缩略图/派生图生成
+
+为原图生成 image_processing.thumbnail_sizes 中每个尺寸的 JPEG 和 WebP 版本，
+命名为 <原图名>_thumb_<尺寸>x<尺寸>.<jpg|webp>，尺寸为长边上限，保持原始宽高比。
+
+JPEG 通过 draft 模式按 1/2、1/4、1/8 比例直接解码到接近目标尺寸，
+较小尺寸从上一级结果继续缩小，避免为每个尺寸重复解码全尺寸原图。
+"""
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+from .config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [150, 300, 600]
+
+# 输出格式 -> (扩展名, 保存参数)
+FORMATS = {
+    "jpeg": ("jpg", {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("webp", {"format": "WEBP", "quality": 80, "method": 4}),
+}
+
+# 非JPEG图像无法按比例解码，超过该像素数时拒绝处理以限制内存占用
+MAX_DECODE_PIXELS = 64_000_000
+
+
+def get_thumbnail_sizes() -> List[int]:
+    """读取配置中的缩略图尺寸"""
+    config = get_config_manager().get("image_processing", {}) or {}
+    sizes = config.get("thumbnail_sizes") or DEFAULT_SIZES
+    return sorted({int(s) for s in sizes})
+
+
+def derivative_name(stem: str, size: int, fmt: str = "jpeg") -> str:
+    """派生图文件名"""
+    ext = FORMATS[fmt][0]
+    return f"{stem}_thumb_{size}x{size}.{ext}"
+
+
+def _open_reduced(image_path: str, target: int) -> Image.Image:
+    """打开图像并尽量以缩小比例解码，返回方向已校正的RGB图像"""
+    image = Image.open(image_path)
+    if image.format == "JPEG":
+        # draft 会选择不小于目标尺寸的最大缩小比例
+        image.draft("RGB", (target, target))
+    elif image.width * image.height > MAX_DECODE_PIXELS:
+        raise ValueError(f"图像像素过多，拒绝生成缩略图: {image.width}x{image.height}")
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+def _save_atomic(image: Image.Image, path: str, params: Dict):
+    """先写临时文件再重命名，避免读到写了一半的缩略图"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".thumb-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            image.save(out, **params)
+        # mkstemp 创建的文件权限为 0600，静态文件服务需要可读
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def generate_derivatives(
+    image_path: str,
+    output_dir: str,
+    sizes: Optional[Iterable[int]] = None,
+    formats: Iterable[str] = ("jpeg", "webp"),
+    stem: Optional[str] = None
+) -> Dict[int, Dict[str, str]]:
+    """生成多尺寸派生图，返回 {尺寸: {格式: 文件路径}}"""
+    sizes = sorted(set(sizes or get_thumbnail_sizes()), reverse=True)
+    stem = stem or os.path.splitext(os.path.basename(image_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+
+    current = _open_reduced(image_path, sizes[0])
+    results: Dict[int, Dict[str, str]] = {}
+    try:
+        for size in sizes:
+            # 从上一级（更大的）结果继续缩小
+            current.thumbnail((size, size), Image.LANCZOS, reducing_gap=2.0)
+            results[size] = {}
+            for fmt in formats:
+                path = os.path.join(output_dir, derivative_name(stem, size, fmt))
+                _save_atomic(current, path, FORMATS[fmt][1])
+                results[size][fmt] = path
+    finally:
+        current.close()
+    return results
+
+
+def is_derivative_current(path: str, size: int) -> bool:
+    """派生图是否存在且确实不超过目标尺寸（旧版本直接复制了原图）"""
+    if not os.path.exists(path):
+        return False
+    try:
+        with Image.open(path) as image:
+            return max(image.size) <= size
+    except Exception:
+        return False
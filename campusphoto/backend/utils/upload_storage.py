@@ -0,0 +1,95 @@
+"""
+上传文件流式落盘
+
+按块从上传流读取并写入目标目录下的临时文件，写完后原子重命名到最终位置。
+大小限制在读取过程中校验，不依赖客户端声明的 file.size。
+"""
+from typing import BinaryIO
+import logging
+import os
+import tempfile
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# 每次读取的块大小
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# 落盘文件的权限（nginx 以非 root 用户读取 static 目录）
+FILE_MODE = 0o644
+
+
+class FileTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"文件大小超过限制 ({max_size} bytes)")
+        self.max_size = max_size
+
+
+def _copy_stream(src: BinaryIO, dest_path: str, max_size: int, chunk_size: int, hasher=None) -> int:
+    """将文件流按块复制到 dest_path，返回写入的字节数；传入 hasher 时同步计算摘要"""
+    dest_dir = os.path.dirname(dest_path) or "."
+    os.makedirs(dest_dir, exist_ok=True)
+
+    # 临时文件与目标文件位于同一目录，保证 os.replace 是原子操作
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-", suffix=".part")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(max_size)
+                if hasher is not None:
+                    hasher.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        # mkstemp 创建的文件权限为 0600，静态文件服务需要可读
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return size
+
+
+async def save_upload(file: UploadFile, dest_path: str, max_size: int, chunk_size: int = CHUNK_SIZE, hasher=None) -> int:
+    """流式保存上传文件到 dest_path，超出 max_size 时抛出 FileTooLargeError"""
+    await file.seek(0)
+    return await run_in_threadpool(_copy_stream, file.file, dest_path, max_size, chunk_size, hasher)
+
+
+def remove_quietly(path: str):
+    """删除文件，忽略不存在等错误"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def fix_permissions(directory: str) -> int:
+    """将目录下不可被其他用户读取的文件改为 FILE_MODE，返回修改的文件数
+
+    用于修复此前以 0600 权限落盘的上传文件。
+    """
+    fixed = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(".part"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_mode & 0o004 == 0:
+                    os.chmod(path, FILE_MODE)
+                    fixed += 1
+            except OSError as e:
+                logger.warning(f"修改文件权限失败 {path}: {e}")
+    return fixed
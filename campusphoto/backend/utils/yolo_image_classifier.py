@@ -10,14 +10,20 @@ from typing import Dict, List, Tuple, Optional
 import tempfile
 import shutil
 
+from config import settings
+from .dynamic_batcher import DynamicBatcher
+from .model_registry import model_registry
+from .yolo_onnx_backend import load_onnx_backend
+
 logger = logging.getLogger(__name__)
 
 class YOLOImageClassifier:
     """基于YOLOv8的图像识别分类器"""
     
     def __init__(self):
-        # YOLO模型路径
-        self.model_path = "/Users/caizhuoqi/Code/graduate-project/campusphoto/ai/yolov8n.pt"
+        # YOLO权重路径；model_path 为实际使用的模型文件（ONNX 后端时为 .onnx 文件）
+        self.weights_path = settings.yolo_model_path
+        self.model_path = self.weights_path
         
         # COCO数据集类别映射到我们的分类体系
         self.coco_to_our_categories = {
@@ -124,62 +130,88 @@ class YOLOImageClassifier:
             "自然风光": ["山川", "海洋", "森林", "天空", "花草", "四季", "日出日落", "云彩", "湖泊", "河流"]
         }
         
-        # 初始化YOLO模型
-        self.model = None
-        self._load_model()
+        # 模型由注册表在首次使用或应用启动时加载，backend 为实际使用的推理后端
+        self.backend = settings.yolo_backend
+        self._batcher = None
+        model_registry.register("yolo", self._load_model, warmup=self._warmup, version=self.get_model_id)
+    
+    @property
+    def model(self):
+        """已加载的模型，首次访问时加载；不可用时为 None"""
+        return model_registry.get("yolo")
     
     def _load_model(self):
-        """加载YOLO模型"""
-        try:
-            from ultralytics import YOLO
-            if os.path.exists(self.model_path):
-                self.model = YOLO(self.model_path)
-                logger.info(f"YOLO模型加载成功: {self.model_path}")
+        """加载YOLO模型，模型不可用时返回 None"""
+        model = None
+        if settings.yolo_backend == "onnx":
+            model, onnx_path = load_onnx_backend(
+                self.weights_path,
+                settings.yolo_onnx_path or None,
+                settings.yolo_onnx_quantized,
+                settings.yolo_onnx_threads
+            )
+            if model is not None:
+                self.backend = "onnx"
+                self.model_path = onnx_path
             else:
+                logger.warning("ONNX推理后端不可用，回退到ultralytics")
+        
+        if model is None:
+            self.backend = "ultralytics"
+            self.model_path = self.weights_path
+            try:
+                from ultralytics import YOLO
+            except ImportError:
+                logger.warning("ultralytics模块未安装，无法使用YOLO分类器")
+                return None
+            if not os.path.exists(self.model_path):
                 logger.warning(f"YOLO模型文件不存在: {self.model_path}")
-                self.model = None
-        except ImportError:
-            logger.warning("ultralytics模块未安装，无法使用YOLO分类器")
-            self.model = None
-        except Exception as e:
-            logger.error(f"YOLO模型加载失败: {e}")
-            self.model = None
+                return None
+            model = YOLO(self.model_path)
+            logger.info(f"YOLO模型加载成功: {self.model_path}")
+        
+        # 动态批处理，max_batch_size 为 1 时直接调用模型
+        if settings.yolo_max_batch_size > 1:
+            self._batcher = DynamicBatcher(
+                self._infer_batch,
+                max_batch_size=settings.yolo_max_batch_size,
+                max_wait_ms=settings.yolo_max_batch_wait_ms,
+                name="yolo-batcher"
+            )
+        return model
+    
+    def _warmup(self, model):
+        """用一张空白图完成首次推理的初始化"""
+        self._run_model(model, [np.zeros((640, 640, 3), dtype=np.uint8)])
+    
+    def get_model_id(self) -> str:
+        """模型标识：推理后端 + 模型文件名"""
+        return f"{self.backend}:{os.path.basename(self.model_path)}"
     
     def classify_image(self, image_path: str) -> Dict:
         """使用YOLO进行图像分类"""
         if not self.model:
             return self._fallback_classification()
         
+        # 读取图像
+        image = cv2.imread(image_path)
+        if image is None:
+            logger.error(f"无法读取图像: {image_path}")
+            return self._fallback_classification()
+        
+        return self.classify_array(image)
+    
+    def classify_array(self, image: np.ndarray) -> Dict:
+        """对已解码的BGR数组进行分类，避免重复读取文件"""
+        if not self.model:
+            return self._fallback_classification()
+        
         try:
-            # 读取图像
-            image = cv2.imread(image_path)
-            if image is None:
-                logger.error(f"无法读取图像: {image_path}")
-                return self._fallback_classification()
-            
-            # YOLO推理
-            results = self.model(image)
-            
-            # 解析结果 - 降低置信度阈值以捕获更多检测
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for i in range(len(boxes)):
-                        # 获取类别ID和置信度
-                        class_id = int(boxes.cls[i])
-                        confidence = float(boxes.conf[i])
-                        
-                        # 降低置信度阈值，从0.5降到0.2
-                        if confidence >= 0.2:
-                            # 获取类别名称
-                            class_name = result.names[class_id]
-                            
-                            detections.append({
-                                'class_name': class_name,
-                                'confidence': confidence,
-                                'class_id': class_id
-                            })
+            # YOLO推理（并发请求由批处理器合并为一次前向计算）
+            if self._batcher is not None:
+                detections = self._batcher.run(image)
+            else:
+                detections = self._infer_batch([image])[0]
             
             # 根据检测结果进行分类
             classification_result = self._classify_from_detections(detections)
@@ -196,6 +228,44 @@ class YOLOImageClassifier:
             logger.error(f"YOLO分类失败: {e}")
             return self._fallback_classification()
     
+    def _infer_batch(self, images: List[np.ndarray]) -> List[List[Dict]]:
+        """对一批BGR图像做一次前向计算，返回每张图的检测结果"""
+        return self._run_model(self.model, images)
+    
+    def _run_model(self, model, images: List[np.ndarray]) -> List[List[Dict]]:
+        if self.backend == "onnx":
+            return model(images)
+        results = model(images, verbose=False)
+        return [self._parse_detections(result) for result in results]
+    
+    def _parse_detections(self, result) -> List[Dict]:
+        """解析单张图的检测结果 - 降低置信度阈值以捕获更多检测"""
+        detections = []
+        boxes = result.boxes
+        if boxes is not None:
+            for i in range(len(boxes)):
+                # 获取类别ID和置信度
+                class_id = int(boxes.cls[i])
+                confidence = float(boxes.conf[i])
+                
+                # 降低置信度阈值，从0.5降到0.2
+                if confidence >= 0.2:
+                    # 获取类别名称
+                    class_name = result.names[class_id]
+                    
+                    detections.append({
+                        'class_name': class_name,
+                        'confidence': confidence,
+                        'class_id': class_id
+                    })
+        return detections
+    
+    def get_batching_stats(self) -> Dict:
+        """获取批处理统计信息"""
+        if self._batcher is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._batcher.get_stats()}
+    
     def _classify_from_detections(self, detections: List[Dict]) -> Dict:
         """根据检测结果进行分类"""
         if not detections:
@@ -249,29 +319,43 @@ class YOLOImageClassifier:
     
     def create_annotated_image(self, image_path: str, output_path: str) -> bool:
         """创建带标注的图像"""
-        if not self.model:
-            return False
+        return self.create_annotated_images([(image_path, output_path)])[0]
+    
+    def create_annotated_images(self, jobs: List[Tuple[str, str]]) -> List[bool]:
+        """批量创建带标注的图像，jobs 为 (原图路径, 输出路径)
+
+        尺寸相同的图像合并为一次前向计算；尺寸不同的图像放在同一批时都会被补边到正方形，
+        在CPU上反而比逐张推理慢，因此按尺寸分组
+        """
+        results = [False] * len(jobs)
+        if not jobs or not self.model:
+            return results
+        if self.backend == "onnx":
+            logger.warning("ONNX推理后端不支持生成标注图像")
+            return results
         
-        try:
-            # 读取图像
+        # 读取图像并按尺寸分组
+        groups: Dict[Tuple[int, int], List[Tuple[int, np.ndarray]]] = {}
+        for i, (image_path, _) in enumerate(jobs):
             image = cv2.imread(image_path)
-            if image is None:
-                return False
-            
-            # YOLO推理
-            results = self.model(image)
-            
-            # 绘制结果
-            annotated_img = results[0].plot()
-            
-            # 保存标注图像
-            cv2.imwrite(output_path, annotated_img)
-            
-            return True
+            if image is not None:
+                groups.setdefault(image.shape[:2], []).append((i, image))
+        
+        for group in groups.values():
+            try:
+                # YOLO推理
+                predictions = self.model([image for _, image in group], verbose=False)
+            except Exception as e:
+                logger.error(f"创建标注图像失败: {e}")
+                continue
             
-        except Exception as e:
-            logger.error(f"创建标注图像失败: {e}")
-            return False
+            for (i, _), prediction in zip(group, predictions):
+                try:
+                    # 绘制并保存标注图像
+                    results[i] = bool(cv2.imwrite(jobs[i][1], prediction.plot()))
+                except Exception as e:
+                    logger.error(f"创建标注图像失败: {e}")
+        return results
 
 # 创建全局实例
 yolo_classifier = YOLOImageClassifier()
@@ -0,0 +1,171 @@
+"""
+YOLOv8 的 ONNX Runtime 推理后端（CPU）
+
+加载由 export_yolo_onnx.py 导出的模型（可选 int8 动态量化），批量推理后输出与
+ultralytics 路径相同格式的检测结果 {class_name, confidence, class_id}。
+预处理与后处理按 ultralytics 默认参数实现：640 letterbox（填充 114）、
+置信度阈值 0.25、按类别 NMS（IoU 0.7）、每张图最多 300 个检测。
+"""
+from typing import Dict, List, Optional, Tuple
+import ast
+import logging
+import os
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 按类别做 NMS 时给不同类别的框加的偏移量，与 ultralytics 一致
+MAX_WH = 7680
+# 模型的最大下采样倍数
+STRIDE = 32
+
+
+def letterbox(image: np.ndarray, size: int, rect: bool = False) -> np.ndarray:
+    """
+    等比例缩放使长边为 size，不足部分用灰色填充
+
+    rect 为 True 时只填充到 STRIDE 的整数倍（矩形输入），否则填充为 size x size
+    """
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    pad_w, pad_h = size - new_width, size - new_height
+    if rect:
+        pad_w, pad_h = pad_w % STRIDE, pad_h % STRIDE
+    pad_w, pad_h = pad_w / 2, pad_h / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    return cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """贪心 NMS，boxes 为 xyxy，返回保留的下标（按分数降序）"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.intp)
+
+
+class OnnxYoloBackend:
+    """ONNX Runtime 推理后端"""
+
+    def __init__(
+        self,
+        model_path: str,
+        intra_op_threads: int = 0,
+        conf_threshold: float = 0.25,
+        iou_threshold: float = 0.7,
+        max_det: int = 300
+    ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size, self.dynamic_shape = self._read_input_size()
+        self.names = self._read_names()
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+    def _read_input_size(self) -> Tuple[int, bool]:
+        """返回 (输入尺寸, 是否支持动态尺寸)"""
+        shape = self.session.get_inputs()[0].shape
+        # 动态尺寸导出时形状为字符串，尺寸从元数据读取
+        if isinstance(shape[2], int):
+            return shape[2], False
+        imgsz = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map.get("imgsz", "[640, 640]"))
+        return max(imgsz), True
+
+    def _read_names(self) -> Dict[int, str]:
+        """从 ultralytics 导出时写入的元数据读取类别名称"""
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        try:
+            return {int(k): v for k, v in ast.literal_eval(metadata.get("names", "{}")).items()}
+        except (ValueError, SyntaxError):
+            return {}
+
+    def __call__(self, images: List[np.ndarray]) -> List[List[Dict]]:
+        """对一批BGR图像推理，返回每张图的检测结果"""
+        if not images:
+            return []
+        # 与 ultralytics 相同：批内图像尺寸一致时使用矩形输入，减少填充区域的计算量
+        rect = self.dynamic_shape and len({image.shape for image in images}) == 1
+        batch = np.stack([letterbox(image, self.input_size, rect) for image in images])
+        # BGR -> RGB, NHWC -> NCHW, 归一化
+        batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(prediction) for prediction in outputs]
+
+    def _postprocess(self, prediction: np.ndarray) -> List[Dict]:
+        """prediction 形状为 (4 + 类别数, 候选框数)"""
+        prediction = prediction.T
+        class_scores = prediction[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        confidences = class_scores[np.arange(len(class_ids)), class_ids]
+
+        mask = confidences > self.conf_threshold
+        if not mask.any():
+            return []
+        boxes, confidences, class_ids = self._xywh_to_xyxy(prediction[mask, :4]), confidences[mask], class_ids[mask]
+
+        keep = nms(boxes + class_ids[:, None] * MAX_WH, confidences, self.iou_threshold)[:self.max_det]
+        return [
+            {
+                'class_name': self.names.get(int(class_ids[i]), str(int(class_ids[i]))),
+                'confidence': float(confidences[i]),
+                'class_id': int(class_ids[i])
+            }
+            for i in keep
+        ]
+
+    @staticmethod
+    def _xywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+        xy, wh = boxes[:, :2], boxes[:, 2:] / 2
+        return np.concatenate([xy - wh, xy + wh], axis=1)
+
+
+def default_onnx_path(weights_path: str, quantized: bool = False) -> str:
+    """与 .pt 权重同目录的 ONNX 文件路径"""
+    stem = os.path.splitext(weights_path)[0]
+    return f"{stem}.int8.onnx" if quantized else f"{stem}.onnx"
+
+
+def load_onnx_backend(weights_path: str, onnx_path: Optional[str], quantized: bool, intra_op_threads: int) -> Tuple[Optional[OnnxYoloBackend], str]:
+    """加载 ONNX 后端，返回 (后端或 None, 实际使用的模型路径)"""
+    path = onnx_path or default_onnx_path(weights_path, quantized)
+    try:
+        if not os.path.exists(path):
+            logger.warning(f"ONNX模型文件不存在: {path}，请先运行 export_yolo_onnx.py 导出")
+            return None, path
+        backend = OnnxYoloBackend(path, intra_op_threads=intra_op_threads)
+        logger.info(f"YOLO ONNX模型加载成功: {path}")
+        return backend, path
+    except ImportError:
+        logger.warning("onnxruntime模块未安装，无法使用ONNX推理后端")
+        return None, path
+    except Exception as e:
+        logger.error(f"ONNX模型加载失败: {e}")
+        return None, path
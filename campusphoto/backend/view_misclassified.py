@@ -1,11 +1,13 @@
 import os
 import sys
-import json
 import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 from pathlib import Path
 import unicodedata
 import re
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
@@ -14,6 +16,15 @@ ERROR_JSON = BACKEND_DIR / "error_cases.json"
 EXP_DIR = REPO_ROOT / "campusphoto" / "ai" / "exp"
 # 结果输出目录改为 ai/exp/result
 RESULT_DIR = EXP_DIR / "result"
+# ai/exp 的文件名索引，按目录修改时间增量刷新
+FILENAME_INDEX_DB = BACKEND_DIR / "exp_filename_index.db"
+# 标注进程数（0 表示在当前进程内标注）和每批图片数
+ANNOTATE_WORKERS = int(os.environ.get("ANNOTATE_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+ANNOTATE_CHUNK_SIZE = int(os.environ.get("ANNOTATE_CHUNK_SIZE", 16))
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.error_case_store import ErrorCaseStore, open_store  # noqa: E402
+from utils.filename_index import FilenameIndex  # noqa: E402
 
 # YOLO 标注支持
 try:
@@ -36,18 +47,21 @@ def open_image(image_path: Path) -> bool:
         return False
 
 
-def load_error_cases_raw() -> List[Dict[str, Any]]:
-    """读取 error_cases.json 的原始记录列表。"""
-    if not ERROR_JSON.exists():
-        return []
-
+def load_error_store() -> Optional[ErrorCaseStore]:
+    """打开错误案例存储（error_cases.json 变化时自动重新导入）。"""
     try:
-        data = json.loads(ERROR_JSON.read_text(encoding="utf-8"))
-        if isinstance(data, list):
-            return [x for x in data if isinstance(x, dict)]
-        return []
+        return open_store(ERROR_JSON)
     except Exception:
+        return None
+
+
+def load_error_cases_raw() -> List[Dict[str, Any]]:
+    """读取 error_cases.json 的原始记录列表。"""
+    store = load_error_store()
+    if store is None:
         return []
+    with store:
+        return store.cases(raw=True)
 
 
 def normalize_path(p: Any) -> Path:
@@ -78,7 +92,13 @@ def to_nfd(s: str) -> str:
 
 
 def path_exists_any(p: Path) -> bool:
-    """Check existence trying both NFC and NFD normalized strings."""
+    """Check existence trying both NFC and NFD normalized strings.
+
+    Paths under EXP_DIR are looked up in the persistent filename index instead of the filesystem.
+    """
+    index = get_exp_index()
+    if index is not None and index.contains(p):
+        return index.resolve(p) is not None
     s = str(p)
     # try current
     if p.exists() or os.path.lexists(s):
@@ -118,24 +138,29 @@ def debug_path_info(p: Path) -> None:
         print(f" listdir error: {e}")
 
 
-def build_filename_index(root: Path) -> Dict[str, List[Path]]:
-    """Index all files under root by basename (with NFC and NFD normalized keys)."""
-    index: Dict[str, List[Path]] = {}
-    if not root.exists():
-        return index
-    for dirpath, _, filenames in os.walk(root):
-        for name in filenames:
-            if not name:
-                continue
-            name_nfc = unicodedata.normalize('NFC', name)
-            name_nfd = unicodedata.normalize('NFD', name)
-            p = Path(dirpath) / name
-            index.setdefault(name, []).append(p)
-            index.setdefault(name_nfc, []).append(p)
-            index.setdefault(name_nfd, []).append(p)
+def build_filename_index(root: Path, db_path: Path = FILENAME_INDEX_DB) -> FilenameIndex:
+    """Open the persistent filename index of root and refresh it from directory mtimes.
+
+    Only directories whose mtime changed since the last run are listed again.
+    """
+    index = FilenameIndex(root, db_path)
+    stats = index.refresh()
+    if stats["rescanned"]:
+        print(f"🗂️ 文件名索引已更新: 检查 {stats['checked']} 个目录，重新列出 {stats['rescanned']} 个")
     return index
 
 
+_exp_index: Optional[FilenameIndex] = None
+
+
+def get_exp_index() -> Optional[FilenameIndex]:
+    """EXP_DIR 的文件名索引，每次运行只刷新一次；目录不存在时为 None"""
+    global _exp_index
+    if _exp_index is None and EXP_DIR.exists():
+        _exp_index = build_filename_index(EXP_DIR)
+    return _exp_index
+
+
 def try_repair_missing_paths(missing: List[Path]) -> Dict[Path, Path]:
     """Attempt to repair missing paths by matching basenames under EXP_DIR.
 
@@ -145,14 +170,11 @@ def try_repair_missing_paths(missing: List[Path]) -> Dict[Path, Path]:
     Returns a mapping from old_missing_path -> new_found_path
     """
     repaired: Dict[Path, Path] = {}
-    if not EXP_DIR.exists():
+    index = get_exp_index()
+    if index is None:
         return repaired
-    index = build_filename_index(EXP_DIR)
     for mp in missing:
-        name = os.path.basename(str(mp))
-        name_nfc = unicodedata.normalize('NFC', name)
-        name_nfd = unicodedata.normalize('NFD', name)
-        cands = index.get(name, []) + index.get(name_nfc, []) + index.get(name_nfd, [])
+        cands = index.find_by_name(os.path.basename(str(mp)))
         if not cands:
             continue
         # derive class folder from original path
@@ -202,29 +224,11 @@ def extract_missing_paths(cases: List[Dict[str, Any]]) -> List[Path]:
     return paths
 
 
-def build_groups(cases: List[Dict[str, Any]], mode: str = "gt_pred") -> Dict[str, List[Path]]:
-    """按 gt->pred 分组，值为存在的图片路径列表。
+def build_groups(store: ErrorCaseStore, mode: str = "gt_pred") -> Dict[str, List[Path]]:
+    """按 gt->pred 分组，值为图片路径列表。
     
-    兼容多种字段命名（中英文），并在缺失 gt 时尽量从路径中推断（ai/exp/后一级目录）。
+    gt/pred 取自存储中已建索引的 expected_theme / predicted_theme，缺失 gt 时尽量从路径中推断（ai/exp/后一级目录）。
     """
-    # 优先从 JSON 读取 GT/Pred 字段；若 GT 缺失则回退从路径推导
-    default_gt_keys = [
-        "expected_theme", "gt", "truth", "label", "ground_truth", "true_label", "expected",
-        "expected_label", "真实", "真实类别", "应为", "标签", "真实分类", "groundtruth"
-    ]
-    default_pred_keys = [
-        "predicted_theme", "pred", "prediction", "predicted", "pred_label", "model_pred", "yolo_pred",
-        "detected", "detected_label", "ai", "ai_label", "ai_theme",
-        "预测", "预测类别", "误分为", "被误分为", "预测分类"
-    ]
-
-    def first_str(item: Dict[str, Any], keys: List[str]) -> Any:
-        for k in keys:
-            v = item.get(k)
-            if isinstance(v, str) and v.strip():
-                return v.strip()
-        return None
-
     def derive_gt_from_path(p: str) -> Any:
         try:
             parts = Path(p).parts
@@ -239,19 +243,12 @@ def build_groups(cases: List[Dict[str, Any]], mode: str = "gt_pred") -> Dict[str
         return None
 
     groups: Dict[str, List[Path]] = {}
-    for item in cases:
-        p = item.get("file_path") or item.get("path")
-        if not isinstance(p, str):
+    for p, gt, pred in store.iter_rows():
+        if not p:
             continue
         path_obj = normalize_path(p)
 
-        # 运行时选定的键优先（可由外部设置）；否则使用默认键
-        gt_keys = getattr(build_groups, "_gt_keys", None) or default_gt_keys
-        pred_keys = getattr(build_groups, "_pred_keys", None) or default_pred_keys
-
-        # 先从 JSON 读取 GT/Pred；若 GT 缺失则回退路径
-        gt = first_str(item, gt_keys)
-        pred = first_str(item, pred_keys)
+        # 若 GT 缺失则回退路径
         if not gt:
             gt = derive_gt_from_path(str(path_obj))
 
@@ -260,7 +257,7 @@ def build_groups(cases: List[Dict[str, Any]], mode: str = "gt_pred") -> Dict[str
                 continue
             key = f"{gt}"
         else:
-            if not isinstance(gt, str) or not isinstance(pred, str):
+            if not isinstance(gt, str) or not pred:
                 continue
             key = f"{gt}->{pred}"
         groups.setdefault(key, []).append(path_obj)
@@ -334,70 +331,167 @@ def sanitize_group_dir_name(group_key: str) -> str:
     return re.sub(r"[^\w\-\u4e00-\u9fa5><= ]+", "_", name)
 
 
+def annotation_output_path(src: Path, group_dir: Path) -> Path:
+    # 为避免重名冲突，加 annotated_ 前缀
+    return group_dir / ("annotated_" + Path(str(src)).name)
+
+
+def is_up_to_date(src: Path, dst: Path) -> bool:
+    """标注图已存在且不早于原图时无需重新生成。"""
+    try:
+        return dst.stat().st_mtime >= os.stat(str(src)).st_mtime
+    except OSError:
+        return False
+
+
+def _init_annotation_worker(threads: int) -> None:
+    """标注进程初始化：绘制标注框需要 ultralytics 后端。"""
+    from config import settings
+    from utils.inference_pool import _init_worker
+    settings.yolo_backend = "ultralytics"
+    _init_worker(threads)
+
+
+def _annotate_chunk(jobs: List[Tuple[str, str]]) -> int:
+    """在标注进程中批量生成一组标注图，先写临时文件再改名，中断时不会留下不完整的标注图。"""
+    from utils.yolo_image_classifier import yolo_classifier as classifier
+
+    partial_jobs = []
+    for src, dst in jobs:
+        dst_path = Path(dst)
+        partial_jobs.append((src, str(dst_path.with_name(f".{dst_path.stem}.partial{dst_path.suffix}"))))
+    success = 0
+    for (_, dst), (_, partial), ok in zip(jobs, partial_jobs, classifier.create_annotated_images(partial_jobs)):
+        if ok:
+            os.replace(partial, dst)
+            success += 1
+    return success
+
+
+_annotation_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_annotation_executor() -> Optional[ProcessPoolExecutor]:
+    """标注进程池，首次使用时启动并在各进程中加载模型；ANNOTATE_WORKERS=0 时在当前进程内标注。"""
+    global _annotation_executor
+    if ANNOTATE_WORKERS <= 0:
+        return None
+    if _annotation_executor is None:
+        threads = max(1, (os.cpu_count() or 1) // ANNOTATE_WORKERS)
+        _annotation_executor = ProcessPoolExecutor(
+            max_workers=ANNOTATE_WORKERS,
+            mp_context=get_context("spawn"),
+            initializer=_init_annotation_worker,
+            initargs=(threads,)
+        )
+    return _annotation_executor
+
+
+def shutdown_annotation_executor() -> None:
+    global _annotation_executor
+    if _annotation_executor is not None:
+        _annotation_executor.shutdown(cancel_futures=True)
+        _annotation_executor = None
+
+
+def run_annotation_jobs(jobs: List[Tuple[Path, Path]]) -> Tuple[int, int]:
+    """生成标注图，跳过已是最新的输出；返回 (成功生成数, 跳过数)。
+
+    按 ANNOTATE_CHUNK_SIZE 张一批提交到标注进程池，每批只做一次前向计算，并显示进度和剩余时间。
+    已生成的标注图保留，中断后重新运行会从未完成的部分继续。
+    """
+    pending: List[Tuple[str, str]] = []
+    seen: Dict[str, bool] = {}
+    skipped = 0
+    for src, dst in jobs:
+        if str(dst) in seen:
+            continue
+        seen[str(dst)] = True
+        if is_up_to_date(src, dst):
+            skipped += 1
+        else:
+            pending.append((str(src), str(dst)))
+    if not pending:
+        return 0, skipped
+
+    chunks = [pending[i:i + ANNOTATE_CHUNK_SIZE] for i in range(0, len(pending), ANNOTATE_CHUNK_SIZE)]
+    executor = get_annotation_executor()
+    success = done = 0
+    start = time.perf_counter()
+
+    def report(chunk_size: int, chunk_success: int) -> None:
+        nonlocal success, done
+        success += chunk_success
+        done += chunk_size
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed else 0.0
+        eta = (len(pending) - done) / rate if rate else 0.0
+        print(f"\r   进度 {done}/{len(pending)}  ({rate:.1f} 张/秒，剩余约 {eta / 60:.1f} 分钟)", end="", flush=True)
+
+    if executor is None:
+        for chunk in chunks:
+            report(len(chunk), _annotate_chunk(chunk))
+    else:
+        futures = {executor.submit(_annotate_chunk, chunk): len(chunk) for chunk in chunks}
+        try:
+            for future in as_completed(futures):
+                report(futures[future], future.result())
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("\n⏸️ 已中断，已生成的标注图会保留，重新运行将从未完成的部分继续")
+            raise
+    print()
+    return success, skipped
+
+
 def annotate_batch(paths: List[Path], group_key: str, base_dir: Path = RESULT_DIR) -> int:
     """使用 YOLO 对一批图片生成标注图，保存到 result/<group_key>/ 下。
-    返回成功生成的数量。
+    返回成功生成的数量（已是最新的标注图会跳过）。
     """
     if not paths:
         return 0
-    base_dir.mkdir(parents=True, exist_ok=True)
-    group_dir = base_dir / sanitize_group_dir_name(group_key)
-    group_dir.mkdir(parents=True, exist_ok=True)
-
     if yolo_classifier is None:
         print("❌ YOLO 分类器未可用，无法生成标注图")
         return 0
+    group_dir = base_dir / sanitize_group_dir_name(group_key)
+    group_dir.mkdir(parents=True, exist_ok=True)
 
-    success = 0
-    for p in paths:
-        try:
-            # 为避免重名冲突，加 annotated_ 前缀
-            outfile = group_dir / ("annotated_" + Path(str(p)).name)
-            ok = yolo_classifier.create_annotated_image(str(p), str(outfile))
-            if ok:
-                success += 1
-            else:
-                # 若失败，尝试直接复制原图以占位（可选）
-                pass
-        except Exception as e:
-            print(f"   ⚠️ 标注失败: {p} - {e}")
-    print(f"✅ 本批标注完成，共生成 {success}/{len(paths)} 张，输出目录: {group_dir}")
+    success, skipped = run_annotation_jobs([(p, annotation_output_path(p, group_dir)) for p in paths])
+    print(f"✅ 本批标注完成，共生成 {success}/{len(paths) - skipped} 张，跳过已是最新的 {skipped} 张，输出目录: {group_dir}")
     return success
 
 
 def annotate_all_groups(groups: Dict[str, List[Path]], dest_root: Path = RESULT_DIR) -> None:
+    """为所有分组生成标注图，全部分组的图片一起提交到标注进程池。"""
     if yolo_classifier is None:
         print("❌ YOLO 分类器未可用，无法生成标注图")
         return
     total_groups = len(groups)
-    print(f"🛠️ 开始为所有分组生成标注图，共 {total_groups} 组...")
-    done_groups = 0
     total_images = sum(len(v) for v in groups.values())
-    done_images = 0
+    print(f"🛠️ 开始为所有分组生成标注图，共 {total_groups} 组 {total_images} 张...")
+    jobs: List[Tuple[Path, Path]] = []
     for gk, gpaths in groups.items():
-        print(f"\n📂 分组: {gk}  图片数: {len(gpaths)}")
-        cnt = annotate_batch(gpaths, gk, base_dir=dest_root)
-        done_groups += 1
-        done_images += cnt
-        print(f"进度: 组 {done_groups}/{total_groups}  累计成功 {done_images}/{total_images}")
-    print(f"\n✅ 全部分组标注完成。输出根目录: {dest_root}")
+        group_dir = dest_root / sanitize_group_dir_name(gk)
+        group_dir.mkdir(parents=True, exist_ok=True)
+        jobs.extend((p, annotation_output_path(p, group_dir)) for p in gpaths)
+    success, skipped = run_annotation_jobs(jobs)
+    print(f"\n✅ 全部分组标注完成，生成 {success} 张，跳过已是最新的 {skipped} 张。输出根目录: {dest_root}")
 
 
 def main() -> None:
-    cases = load_error_cases_raw()
-    if not cases:
+    store = load_error_store()
+    if store is None or not store.count():
         print("❌ 未找到可用的误分类记录（请提供 campusphoto/backend/error_cases.json）")
         sys.exit(1)
 
-    print(f"✅ 已加载 {len(cases)} 条误分类记录（将直接尝试打开路径，打开失败即视为不存在）")
+    print(f"✅ 已加载 {store.count()} 条误分类记录（将直接尝试打开路径，打开失败即视为不存在）")
 
-    # 默认直接使用 expected_theme 与 predicted_theme 进行 gt->pred 分组
-    setattr(build_groups, "_gt_keys", ["expected_theme"])  # 若无则回退路径
-    setattr(build_groups, "_pred_keys", ["predicted_theme"])  # 若无再用默认候选
+    # 直接使用 expected_theme 与 predicted_theme 进行 gt->pred 分组
     mode = "gt_pred"
 
     # 构建分组，并按组内图片数量降序显示
-    groups = build_groups(cases, mode=mode)
+    groups = build_groups(store, mode=mode)
     if not groups:
         print("❌ 未能构建分组（请确认 JSON 中包含可用的路径，或提供预测字段）")
         sys.exit(1)
@@ -422,8 +516,9 @@ def main() -> None:
             print("👋 已退出")
             break
         if choice == "r":
-            cases = load_error_cases_raw()
-            groups = build_groups(cases)
+            # error_cases.json 有变化时重新导入
+            store.refresh()
+            groups = build_groups(store, mode=mode)
             sorted_groups = sorted(groups.items(), key=lambda kv: len(kv[1]), reverse=True)
             continue
         if choice == "x":
@@ -478,6 +573,9 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        shutdown_annotation_executor()
 
 
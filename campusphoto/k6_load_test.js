@@ -65,6 +65,8 @@ export default function() {
 }
 
 export function setup() {
+  // 清空事件循环延迟采样，teardown 时读取本次压测期间的数据
+  http.post(`${BASE_URL}/api/experiment/metrics/reset`);
   console.log('开始Redis缓存策略对比实验');
   console.log('测试策略:', STRATEGIES.join(', '));
   console.log('测试照片ID:', PHOTO_IDS.join(', '));
@@ -73,6 +75,8 @@ export function setup() {
 
 export function teardown(data) {
   console.log('实验完成');
+  const metrics = http.get(`${BASE_URL}/api/experiment/metrics`);
+  console.log('事件循环延迟:', JSON.stringify(metrics.json('event_loop')));
   console.log('总请求数:', data.iterations);
   console.log('平均响应时间:', data.avg_response_time + 'ms');
   console.log('错误率:', data.error_rate * 100 + '%');
@@ -0,0 +1,78 @@
+import http from 'k6/http';
+import { check, sleep } from 'k6';
+import { Rate, Trend } from 'k6/metrics';
+
+// 缓存击穿测试：大量并发请求同一个排行榜键，跨过多次缓存过期（排行榜 TTL 60 秒），
+// 每秒读取一次 /metrics 中的数据库加载次数，过期时刻的回源次数应保持平稳而不是突增
+
+// 自定义指标
+export let errorRate = new Rate('errors');
+export let responseTime = new Trend('response_time');
+export let dbLoadsPerSecond = new Trend('db_loads_per_second');
+
+const BASE_URL = 'http://localhost:8000';
+const STRATEGY = __ENV.STRATEGY || 'cache_aside';
+const DURATION = __ENV.DURATION || '3m30s';
+
+// 测试配置
+export let options = {
+  scenarios: {
+    readers: {
+      executor: 'constant-vus',
+      exec: 'readRankings',
+      vus: 100,
+      duration: DURATION,
+    },
+    monitor: {
+      executor: 'constant-vus',
+      exec: 'sampleLoads',
+      vus: 1,
+      duration: DURATION,
+    },
+  },
+  thresholds: {
+    http_req_duration: ['p(99)<300'],
+    errors: ['rate<0.01'],
+    // 每秒最多一次回源（刷新）加上一次余量
+    db_loads_per_second: ['max<=2'],
+  },
+};
+
+export function readRankings() {
+  const response = http.get(`${BASE_URL}/api/experiment/rankings/photos?strategy=${STRATEGY}&period=week&limit=20`);
+
+  const success = check(response, {
+    'status is 200': (r) => r.status === 200,
+    'has data': (r) => r.json('data') !== undefined,
+  });
+
+  errorRate.add(!success);
+  responseTime.add(response.timings.duration);
+  sleep(Math.random() * 0.1);
+}
+
+// 监测 VU 内保存上一次的加载次数
+let lastLoads = null;
+
+export function sampleLoads() {
+  const metrics = http.get(`${BASE_URL}/api/experiment/metrics`);
+  const loads = metrics.json('cache_stats.tiers.stampede.loads');
+  if (lastLoads !== null && loads !== undefined) {
+    dbLoadsPerSecond.add(loads - lastLoads);
+  }
+  lastLoads = loads;
+  sleep(1);
+}
+
+export function setup() {
+  // 从空缓存开始，第一次请求即为并发未命中
+  http.post(`${BASE_URL}/api/experiment/cache/clear`);
+  http.post(`${BASE_URL}/api/experiment/metrics/reset`);
+  console.log('开始缓存击穿测试，策略:', STRATEGY);
+}
+
+export function teardown() {
+  const metrics = http.get(`${BASE_URL}/api/experiment/metrics`);
+  console.log('防击穿统计:', JSON.stringify(metrics.json('cache_stats.tiers.stampede')));
+  console.log('事件循环延迟:', JSON.stringify(metrics.json('event_loop')));
+}